@@ -20,6 +20,9 @@ OUTPUT_FORMAT = "png"
 SIZE_SQUARE = "1024x1024"
 SIZE_STORY = "1024x1536"
 
+# Images API base URL: OpenAI() reads OPENAI_BASE_URL itself (기본: OpenAI).
+# 로컬 목 서버로 부하/지연 테스트: OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+
 OUT_DIR = Path("outputs")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -8,16 +8,17 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, Optional, Tuple
 
-import requests
 import streamlit as st
 
+from image_scheduler import images_endpoint, post_images
+
 
 # =========================
 # 기본 설정
 # =========================
 APP_TITLE = "🐼 알록이 & 달록이 앱"
 DEFAULT_MODEL = "gpt-image-1"  # OpenAI Image API (진짜 이미지 생성)
-OPENAI_IMAGE_ENDPOINT = "https://api.openai.com/v1/images/generations"
+OPENAI_IMAGE_ENDPOINT = images_endpoint()  # OPENAI_BASE_URL (기본 https://api.openai.com/v1), 목 서버 테스트 시 변경
 
 # 무료 제한(원하면 숫자 조절)
 FREE_DAILY_LIMIT = 3
@@ -150,9 +151,11 @@ def openai_generate_image(prompt: str, size: str = "1024x1024", quality: str = "
         "n": 1,
     }
 
-    r = requests.post(OPENAI_IMAGE_ENDPOINT, headers=headers, data=json.dumps(payload), timeout=120)
-    if r.status_code != 200:
-        raise RuntimeError(f"이미지 생성 실패: HTTP {r.status_code}\n{r.text}")
+    # CLI/서버와 같은 분당 한도(IMAGES_PER_MINUTE)를 공유 + 429/5xx 재시도
+    try:
+        r = post_images(OPENAI_IMAGE_ENDPOINT, headers, payload, timeout=120)
+    except RuntimeError as e:
+        raise RuntimeError(f"이미지 생성 실패: {e}")
 
     data = r.json()
     b64 = data["data"][0].get("b64_json")
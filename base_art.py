@@ -0,0 +1,88 @@
+"""
+base_art.py
+- Concurrent base-art stage for run_generate.py.
+- Every prompt of a run is submitted up front to a bounded thread pool (--gen_workers).
+- Identical prompts are grouped into one n=k request (--batch_n caps k); each card still gets
+  its own image out of the k returned.
+- The card loop still walks THUMB -> DAYxx -> CTA -> BONUSxx in order and only blocks on the
+  base image it needs next, so overlay/export overlaps with the remaining API round trips.
+- workers=0: no pool; result() fetches on the calling thread (one-card runs in a warm render
+  worker reuse that thread's keep-alive session, see image_scheduler.http_session()).
+"""
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import os
+
+DEFAULT_GEN_WORKERS = int(os.environ.get("GEN_WORKERS", "4"))
+DEFAULT_BATCH_N = int(os.environ.get("GEN_BATCH_N", "4"))  # gpt-image-1 accepts n<=10
+
+
+class BaseArtStage:
+    def __init__(self, fetch: Callable[[str, List[Path]], None], workers: int = DEFAULT_GEN_WORKERS, batch_n: int = DEFAULT_BATCH_N):
+        """
+        fetch(prompt, out_paths) must write one distinct PNG per path
+        (e.g. openai_img_batch bound to key/model/size).
+        """
+        self.fetch = fetch
+        self.workers = max(0, int(workers or 0))
+        self.batch_n = max(1, min(10, int(batch_n or 1)))
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="base_art") if self.workers else None
+        self.futures: Dict[Path, Future] = {}
+        self.deferred: Dict[Future, Tuple[str, List[Path]]] = {}  # workers=0: run by result()
+
+    def submit_group(self, prompt: str, out_paths: List[Path]) -> None:
+        paths = [Path(p) for p in out_paths if Path(p) not in self.futures]
+        for i in range(0, len(paths), self.batch_n):
+            chunk = paths[i:i+self.batch_n]
+            for p in chunk:
+                p.parent.mkdir(parents=True, exist_ok=True)
+            if self.pool is None:
+                fut = Future()
+                self.deferred[fut] = (prompt, chunk)
+            else:
+                fut = self.pool.submit(self.fetch, prompt, chunk)
+            for p in chunk:
+                self.futures[p] = fut
+
+    def submit(self, prompt: str, out_path: Path) -> None:
+        self.submit_group(prompt, [out_path])
+
+    def submit_all(self, jobs: Dict[Path, str]) -> None:
+        """Group jobs by identical prompt (first-occurrence order) and submit one request per group."""
+        groups: Dict[str, List[Path]] = {}
+        for out_path, prompt in jobs.items():
+            groups.setdefault(prompt, []).append(Path(out_path))
+        for prompt, paths in groups.items():
+            self.submit_group(prompt, paths)
+
+    def result(self, prompt: str, out_path: Path) -> Path:
+        """
+        Block until out_path is written. Paths that were not planned up front are submitted now,
+        so a call site can never be skipped by a planning mismatch.
+        On failure the queued (not yet started) requests are cancelled so no more API spend is wasted.
+        """
+        out_path = Path(out_path)
+        self.submit(prompt, out_path)
+        fut = self.futures[out_path]
+        job = self.deferred.pop(fut, None)
+        if job is not None:
+            try:
+                self.fetch(*job)
+                fut.set_result(None)
+            except Exception as e:
+                fut.set_exception(e)
+        try:
+            fut.result()
+        except Exception:
+            self.close(cancel=True)
+            raise
+        return out_path
+
+    def close(self, cancel: bool = False) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=not cancel, cancel_futures=cancel)
+        for fut in self.deferred:
+            fut.cancel()
+        self.deferred.clear()
@@ -0,0 +1,209 @@
+"""
+bench_pipeline.py
+- Offline benchmark for run_generate.py: no API key, no cost (IMAGE_BACKEND=stub, see image_backend.py).
+- Scenarios: D7 / D21 / SEASONPACK x free / paid.
+- Per scenario, in a fresh child process each (so peak RSS is per scenario):
+    stages : run_generate.generate() (the same run() the CLI and server use) with the stub
+             backend and --profile; the stage table is that run's timings.json
+             (openai_img, render_square_card, add_qr_price_cta_square, square_to_story, zip, ...)
+    e2e    : the whole run_generate.py CLI as a subprocess (--e2e), interpreter start-up included
+- Reports wall time, CPU time and peak RSS as JSON; --compare diffs two reports
+  (e.g. before/after a commit).
+- Exits 1 if any scenario fails (the report still lists it with its log tail).
+
+usage
+    python benchmarks/bench_pipeline.py --out bench_HEAD.json
+    python benchmarks/bench_pipeline.py --scenarios D7_free SEASONPACK_paid --e2e --out bench.json
+    python benchmarks/bench_pipeline.py --compare bench_main.json bench_HEAD.json
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+SCENARIOS = [f"{oc}_{mode}" for oc in ("D7", "D21", "SEASONPACK") for mode in ("free", "paid")]
+
+
+def _rss_mb(ru) -> float:
+    # ru_maxrss: KiB on Linux, bytes on macOS
+    return round(ru.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(cmd: List[str], env: Optional[Dict[str, str]] = None) -> dict:
+    """Run cmd, return wall/CPU/peak RSS of that child only (os.wait4)."""
+    t = time.perf_counter()
+    p = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    out = p.stdout.read()
+    _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "wall_s": round(time.perf_counter() - t, 3),
+        "cpu_s": round(ru.ru_utime + ru.ru_stime, 3),
+        "peak_rss_mb": _rss_mb(ru),
+        "returncode": p.returncode,
+        "log_tail": out.decode("utf-8", "replace")[-800:] if p.returncode else "",
+    }
+
+
+def make_cards_xlsx(path: Path, n: int) -> Path:
+    import openpyxl
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Cards"
+    ws.append(["day", "text", "color", "mood", "price", "cta"])
+    moods = ["포근한", "설레는", "차분한", "상큼한"]
+    colors = ["pink", "mint", "lavender", "peach"]
+    for i in range(1, n + 1):
+        ws.append([f"DAY{i:02d}", f"오늘의 알록달록 카드 {i}\n작은 습관이 쌓이는 중이에요", colors[i % 4], moods[i % 4], "", ""])
+    for j in range(1, 4):
+        ws.append([f"BONUS{j:02d}", f"보너스 카드 {j:02d} · 시즌팩 구매자 전용", "", "프리미엄", "", ""])
+    t = wb.create_sheet("ThumbCopy")
+    t.append(["variant", "copy"])
+    for v in "ABC":
+        t.append([v, f"21일 알록달록 루틴 {v}"])
+    wb.save(path)
+    return path
+
+
+def stages_child(scenario: str, work: Path, video_seconds: float) -> dict:
+    """
+    One scenario through run_generate's real pipeline (generate() -> run()), in this process
+    (a fresh child). Stage table = the run's own --profile timings.json.
+    """
+    from run_generate import GenerateConfig, generate
+
+    oc, mode = scenario.split("_")
+    options = {"no_cache": True, "profile": True,
+               "deadline": time.strftime("%Y-%m-%d", time.localtime(time.time() + 3 * 86400))}
+    if oc == "SEASONPACK" and video_seconds > 0:
+        options["cta_t1_video"] = True
+    t0_wall, t0_cpu = time.perf_counter(), time.process_time()
+    res = generate(GenerateConfig("winter", make_cards_xlsx(work / "cards.xlsx", 21), offer_code=oc, mode=mode,
+                                  export_story=True, out_dir=work / "out", image_backend="stub", options=options))
+    wall, cpu = time.perf_counter() - t0_wall, time.process_time() - t0_cpu
+    timings = json.loads((res.out_root / "timings.json").read_text(encoding="utf-8"))
+    return {
+        "cards": sum(1 for stages in res.outputs.values() if "square" in stages),
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "stages": timings["stages"],
+    }
+
+
+def e2e_cmd(scenario: str, work: Path, video: bool) -> List[str]:
+    oc, mode = scenario.split("_")
+    cmd = [sys.executable, str(ROOT / "run_generate.py"),
+           "--season", "winter", "--offer_code", oc, "--mode", mode, "--image_backend", "stub",
+           "--xlsx", str(make_cards_xlsx(work / "cards.xlsx", 21)), "--out_dir", str(work / "out"),
+           "--export_story", "--no_cache", "--profile", "--deadline", time.strftime("%Y-%m-%d", time.localtime(time.time() + 3 * 86400))]
+    if oc == "SEASONPACK" and video:
+        cmd.append("--cta_t1_video")
+    return cmd
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return ""
+
+
+def compare(a_path: str, b_path: str) -> None:
+    a, b = (json.loads(Path(p).read_text(encoding="utf-8")) for p in (a_path, b_path))
+    print(f"{a['meta'].get('git','?')} -> {b['meta'].get('git','?')}")
+    for sc in b["scenarios"]:
+        if sc not in a["scenarios"]:
+            continue
+        for kind in ("stages", "e2e"):
+            ra, rb = a["scenarios"][sc].get(kind), b["scenarios"][sc].get(kind)
+            if not ra or not rb:
+                continue
+            line = [f"{sc:16} {kind:6}"]
+            for m in ("wall_s", "cpu_s", "peak_rss_mb"):
+                x, y = ra.get(m), rb.get(m)
+                if x and y is not None:
+                    line.append(f"{m} {x}->{y} ({(y - x) / x * 100:+.0f}%)")
+            print("  ".join(line))
+            for st, sb in (rb.get("stages") or {}).items():
+                sa = (ra.get("stages") or {}).get(st)
+                x, y = (s.get("total_s") if s else None for s in (sa, sb))  # timings.json
+                if x and y is not None:
+                    print(f"    {st:10} {x}s -> {y}s ({(y - x) / x * 100:+.0f}%)")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=SCENARIOS)
+    ap.add_argument("--e2e", action="store_true", help="also run the full run_generate.py CLI per scenario")
+    ap.add_argument("--video_seconds", type=float, default=2.0, help="> 0: SEASONPACK renders its CTA_T1 video (run_generate's fixed 2 s); 0 = skip")
+    ap.add_argument("--out", default="", help="write JSON report here (default: stdout)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    ap.add_argument("--_child", default="", help=argparse.SUPPRESS)
+    ap.add_argument("--_work", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args._child:
+        res = stages_child(args._child, Path(args._work), args.video_seconds)
+        (Path(args._work) / "result.json").write_text(json.dumps(res), encoding="utf-8")
+        return
+
+    env = dict(os.environ, IMAGE_BACKEND="stub", STUB_IMAGE_LATENCY_MS="0",
+               IMAGE_SCHED_DB=str(Path(tempfile.gettempdir()) / "bench_image_scheduler.sqlite"))
+    report = {"meta": {"git": git_rev(), "python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "scenarios": {}}
+    failed = []
+    for sc in args.scenarios:
+        work = Path(tempfile.mkdtemp(prefix=f"bench_{sc}_"))
+        try:
+            r = run_child([sys.executable, __file__, "--_child", sc, "--_work", str(work),
+                           "--video_seconds", str(args.video_seconds)], env)
+            res = json.loads((work / "result.json").read_text(encoding="utf-8")) if r["returncode"] == 0 else {}
+            entry = {"stages": {**res, "peak_rss_mb": r["peak_rss_mb"], "returncode": r["returncode"], "log_tail": r["log_tail"]}}
+            if r["returncode"] != 0:
+                failed.append(f"{sc} (stages)")
+                print(f"{sc}: FAILED (exit {r['returncode']})\n{r['log_tail']}", file=sys.stderr)
+            else:
+                print(f"{sc}: {res['cards']} cards {res['wall_s']}s wall / {res['cpu_s']}s cpu / {r['peak_rss_mb']} MB", file=sys.stderr)
+            if args.e2e:
+                e2e_work = work / "e2e"
+                e2e_work.mkdir()
+                entry["e2e"] = run_child(e2e_cmd(sc, e2e_work, args.video_seconds > 0), env)
+                timings = sorted((e2e_work / "out").glob("*/timings.json"))  # run_generate.py --profile
+                if timings:
+                    entry["e2e"]["stages"] = json.loads(timings[0].read_text(encoding="utf-8"))["stages"]
+                if entry["e2e"]["returncode"] != 0:
+                    failed.append(f"{sc} (e2e)")
+                    print(f"{sc}: e2e FAILED (exit {entry['e2e']['returncode']})\n{entry['e2e']['log_tail']}", file=sys.stderr)
+            report["scenarios"][sc] = entry
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report["failed"] = failed
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if failed:
+        print("FAILED:", ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+mock_images_api.py
+- Local stand-in for POST /v1/images/generations (OpenAI Images API), stdlib only.
+- Returns {"created", "data": [{"b64_json", "revised_prompt"}, ...]} with n synthetic PNGs
+  (image_backend.stub_png: same prompt/size/slot -> same bytes, so caching is testable).
+- Configurable latency distribution, 5xx error rate, random 429s (with Retry-After) and a real
+  images-per-minute limit, all from one seed, to load-test the concurrency (base_art.py),
+  retry/backoff (image_scheduler.py) and cache (image_cache.py) paths offline.
+- GET /stats: request / status / image counters; POST /stats/reset clears them.
+
+usage
+    python benchmarks/mock_images_api.py --port 8089 --latency lognormal:1500,0.5 --error_rate 0.02 --rate_429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=mock python run_generate.py ...
+    (app.py / v60 run_generate.py read the same OPENAI_BASE_URL; run_generate.py also has --api_base_url)
+
+latency
+    fixed:MS | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA   (milliseconds, per request)
+"""
+from __future__ import annotations
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import argparse
+import base64
+import json
+import math
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from image_backend import stub_png  # noqa: E402
+
+MAX_N = 10
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'lognormal:1500,0.5' -> sampler(rnd) returning seconds (never negative)."""
+    kind, _, rest = (spec or "fixed:0").partition(":")
+    p = [float(x) for x in rest.split(",") if x.strip()] or [0.0]
+    if kind == "fixed":
+        return lambda rnd: p[0] / 1000.0
+    if kind == "uniform":
+        return lambda rnd: rnd.uniform(p[0], p[1]) / 1000.0
+    if kind == "normal":
+        return lambda rnd: max(0.0, rnd.gauss(p[0], p[1])) / 1000.0
+    if kind == "lognormal":
+        return lambda rnd: rnd.lognormvariate(math.log(max(p[0], 1e-3)), p[1]) / 1000.0
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+@lru_cache(maxsize=256)
+def _b64_png(prompt: str, size: str, slot: int) -> str:
+    return base64.b64encode(stub_png(prompt, size, slot)).decode("ascii")
+
+
+class MockImagesAPI:
+    """Shared state behind the handler: seeded RNG, fault injection, per-minute limit, counters."""
+
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, rate_429: float = 0.0,
+                 retry_after: float = 1.0, images_per_minute: float = 0.0, seed: int = 0):
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.images_per_minute = images_per_minute
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window: list = []  # (time, n) of accepted requests in the last 60s
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stats: Dict[str, float] = {"requests": 0, "images": 0, "in_flight": 0, "max_in_flight": 0,
+                                            "200": 0, "400": 0, "401": 0, "429": 0, "500": 0, "latency_s": 0.0}
+
+    def decide(self, n: int) -> tuple:
+        """-> (status, latency seconds, retry_after or None) for one request."""
+        with self.lock:
+            now = time.time()
+            self.window = [(t, k) for t, k in self.window if now - t < 60.0]
+            if self.images_per_minute and sum(k for _, k in self.window) + n > self.images_per_minute:
+                oldest = self.window[0][0] if self.window else now
+                return 429, 0.0, max(0.1, 60.0 - (now - oldest))
+            r = self.rnd.random()
+            latency = self.sample_latency(self.rnd)
+            if r < self.rate_429:
+                return 429, 0.0, self.retry_after
+            if r < self.rate_429 + self.error_rate:
+                return 500, latency, None
+            self.window.append((now, n))
+            return 200, latency, None
+
+    def count(self, key: str, delta: float = 1) -> None:
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + delta
+            if key == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+
+def make_handler(api: MockImagesAPI, quiet: bool = True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            if not quiet:
+                super().log_message(fmt, *args)
+
+        def _send(self, status: int, body: dict, headers: Optional[Dict[str, str]] = None) -> None:
+            raw = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(raw)
+            api.count(str(status))
+
+        def _error(self, status: int, message: str, kind: str, headers: Optional[Dict[str, str]] = None) -> None:
+            self._send(status, {"error": {"message": message, "type": kind, "code": None}}, headers)
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+                with api.lock:
+                    body = dict(api.stats)
+                return self._send(200, body)
+            if self.path.rstrip("/") in ("/healthz", ""):
+                return self._send(200, {"ok": True})
+            self._error(404, f"no route {self.path}", "invalid_request_error")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if self.path.rstrip("/") in ("/stats/reset", "/v1/stats/reset"):
+                api.reset()
+                return self._send(200, {"ok": True})
+            if self.path.rstrip("/") not in ("/v1/images/generations", "/images/generations"):
+                return self._error(404, f"no route {self.path}", "invalid_request_error")
+            api.count("requests")
+            if not (self.headers.get("Authorization") or "").startswith("Bearer "):
+                return self._error(401, "missing bearer token", "invalid_request_error")
+            try:
+                payload = json.loads(raw or b"{}")
+                prompt = str(payload["prompt"])
+                n = int(payload.get("n") or 1)
+                size = str(payload.get("size") or "1024x1024")
+                if size == "auto":
+                    size = "1024x1024"
+                if not 1 <= n <= MAX_N:
+                    raise ValueError(f"n must be 1..{MAX_N}")
+            except (KeyError, ValueError, TypeError) as e:
+                return self._error(400, f"bad request: {e}", "invalid_request_error")
+
+            status, latency, retry_after = api.decide(n)
+            api.count("in_flight")
+            try:
+                if latency:
+                    time.sleep(latency)
+                api.count("latency_s", latency)
+                if status == 429:
+                    return self._error(429, "Rate limit reached for images per min (mock)", "rate_limit_exceeded",
+                                       {"Retry-After": f"{retry_after:.0f}" if retry_after >= 1 else "1",
+                                        "retry-after-ms": str(int(retry_after * 1000))})
+                if status == 500:
+                    return self._error(500, "The server had an error while processing your request (mock)", "server_error")
+                data = [{"b64_json": _b64_png(prompt, size, i), "revised_prompt": prompt} for i in range(n)]
+                api.count("images", n)
+                self._send(200, {"created": int(time.time()), "data": data})
+            finally:
+                api.count("in_flight", -1)
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8089, quiet: bool = True, **opts) -> ThreadingHTTPServer:
+    """Start in a background thread (for scripts/benchmarks); call .shutdown() when done."""
+    httpd = ThreadingHTTPServer((host, port), make_handler(MockImagesAPI(**opts), quiet=quiet))
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Mock OpenAI Images API (/v1/images/generations)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency", default="lognormal:1500,0.5", help="fixed:MS | uniform:LO,HI | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    ap.add_argument("--error_rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    ap.add_argument("--rate_429", type=float, default=0.0, help="fraction of requests answered with 429 + Retry-After")
+    ap.add_argument("--retry_after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    ap.add_argument("--images_per_minute", type=float, default=0.0, help="real sliding-window limit (0 = unlimited)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--verbose", action="store_true", help="log every request")
+    args = ap.parse_args(argv)
+
+    api = MockImagesAPI(args.latency, args.error_rate, args.rate_429, args.retry_after, args.images_per_minute, args.seed)
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(api, quiet=not args.verbose))
+    httpd.daemon_threads = True
+    print(f"mock Images API on http://{args.host}:{args.port}/v1  (OPENAI_BASE_URL)", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+card_workbook.py
+- One parsed representation of the Cards workbook (Cards + ThumbCopy + any other sheet),
+  shared by run_generate.py (load_cards_xlsx / load_thumb_copy_xlsx) and server_v22.py
+  (override_cards_xlsx).
+- Parsed once with openpyxl read_only=True (streaming, values only).
+- Sidecar cache ".<name>.xlsx.parsed.json" next to the workbook, keyed by mtime/size and
+  sha1 of the file: an unchanged sheet costs one stat() (+ JSON read) instead of a parse.
+  A touched-but-identical file is re-validated by hash, not re-parsed.
+- write_workbook() writes with openpyxl write_only (no full load + save) and primes the
+  sidecar of the new file, so the generator started on it skips parsing too.
+"""
+from __future__ import annotations
+from datetime import date, datetime, time as dtime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import threading
+
+import openpyxl
+
+CACHE_VERSION = 1
+
+_MEM: Dict[str, Tuple[int, int, dict]] = {}
+_MEM_LOCK = threading.Lock()
+
+
+def sidecar_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(f".{path.name}.parsed.json")
+
+
+def _sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cell(v: Any) -> Any:
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    if isinstance(v, (datetime, date, dtime)):
+        return str(v)
+    return str(v)
+
+
+def parse_workbook(path: Path) -> dict:
+    """{"active": sheet name, "sheets": {name: [[cell, ...], ...]}} (read_only, values only)."""
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = {ws.title: [[_cell(v) for v in row] for row in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+        return {"active": wb.active.title if wb.active is not None else (wb.sheetnames[0] if wb.sheetnames else ""), "sheets": sheets}
+    finally:
+        wb.close()
+
+
+def _save_sidecar(path: Path, st: os.stat_result, digest: str, data: dict) -> None:
+    side = sidecar_path(path)
+    tmp = side.with_name(side.name + f".{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps({"v": CACHE_VERSION, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                                   "sha1": digest, "data": data}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, side)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+
+
+def read_workbook(path: Path) -> dict:
+    """Parsed workbook, from memory / sidecar when the file is unchanged. Callers must not mutate it."""
+    path = Path(path)
+    st = path.stat()
+    key = str(path.resolve())
+    with _MEM_LOCK:
+        hit = _MEM.get(key)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[2]
+
+    data = None
+    side = sidecar_path(path)
+    try:
+        meta = json.loads(side.read_text(encoding="utf-8"))
+        if meta.get("v") != CACHE_VERSION:
+            meta = None
+    except (OSError, ValueError):
+        meta = None
+    if meta:
+        if meta.get("mtime_ns") == st.st_mtime_ns and meta.get("size") == st.st_size:
+            data = meta["data"]
+        else:
+            digest = _sha1(path)
+            if digest == meta.get("sha1"):
+                data = meta["data"]
+                _save_sidecar(path, st, digest, data)  # same content, new mtime
+    if data is None:
+        digest = _sha1(path)
+        data = parse_workbook(path)
+        _save_sidecar(path, st, digest, data)
+
+    with _MEM_LOCK:
+        _MEM[key] = (st.st_mtime_ns, st.st_size, data)
+    return data
+
+
+def sheet_rows(data: dict, sheet: str, fallback_active: bool = True) -> Optional[List[list]]:
+    rows = data["sheets"].get(sheet)
+    if rows is None and fallback_active:
+        rows = data["sheets"].get(data.get("active", ""))
+    return rows
+
+
+def header_index(rows: List[list]) -> Dict[str, int]:
+    idx: Dict[str, int] = {}
+    if not rows:
+        return idx
+    for i, v in enumerate(rows[0]):
+        if v is None:
+            continue
+        idx[str(v).strip().lower()] = i
+    return idx
+
+
+def write_workbook(data: dict, out_path: Path) -> Path:
+    """Stream every sheet out with openpyxl write_only and prime the sidecar for the new file."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    wb = openpyxl.Workbook(write_only=True)
+    active = data.get("active", "")
+    names = sorted(data["sheets"], key=lambda n: n != active)  # active sheet first (= wb.active on read)
+    for name in names:
+        ws = wb.create_sheet(title=name)
+        for row in data["sheets"][name]:
+            ws.append(row)
+    wb.save(out_path)
+    st = out_path.stat()
+    _save_sidecar(out_path, st, _sha1(out_path), data)
+    with _MEM_LOCK:
+        _MEM[str(out_path.resolve())] = (st.st_mtime_ns, st.st_size, data)
+    return out_path
+
+
+def with_row_values(data: dict, sheet: str, key_col: str, key: str, values: Dict[str, Any],
+                    match=lambda cell, key: str(cell or "").strip() == key) -> dict:
+    """
+    Copy of data with sheet's row where match(row[key_col], key) updated (appended if missing).
+    Missing columns are added to the header row.
+    """
+    out = {"active": data.get("active", ""), "sheets": dict(data["sheets"])}
+    name = sheet if sheet in out["sheets"] else out["active"]
+    rows = copy.deepcopy(out["sheets"].get(name) or [[]])
+    hdr = rows[0]
+    idx = header_index(rows)
+    if key_col not in idx:
+        raise ValueError(f"{name} sheet must have '{key_col}' header")
+    for col in values:
+        if col not in idx:
+            hdr.append(col)
+            idx[col] = len(hdr) - 1
+    target = next((r for r in rows[1:] if idx[key_col] < len(r) and match(r[idx[key_col]], key)), None)
+    if target is None:
+        target = [None] * len(hdr)
+        target[idx[key_col]] = key
+        rows.append(target)
+    if len(target) < len(hdr):
+        target.extend([None] * (len(hdr) - len(target)))
+    for col, v in values.items():
+        target[idx[col]] = v
+    out["sheets"][name] = rows
+    return out
@@ -0,0 +1,41 @@
+"""
+font_cache.py
+- Process-wide font cache shared by every pick_font() (run_generate.py, server_v22.py).
+- ImageFont.truetype() re-parses the whole Korean TTF/OTF on each call; cards, badges, banners
+  and every video frame ask for the same few (path, size) pairs, so they are parsed once here.
+- Bounded LRU (FONT_CACHE_SIZE, default 64 entries).
+"""
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+import os
+
+from PIL import ImageFont
+
+FONT_CACHE_SIZE = int(os.environ.get("FONT_CACHE_SIZE", "64"))
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font(path: str, size: int):
+    if path and Path(path).exists():
+        return ImageFont.truetype(path, size=size)
+    return ImageFont.load_default()
+
+
+def get_font(path: Optional[str], size: int):
+    """Cached ImageFont for (path, size); falls back to PIL's default font if path is missing."""
+    return _load_font(str(path or ""), int(size))
+
+
+def preload_fonts(path: Optional[str], sizes: Iterable[int]) -> int:
+    """Warm the cache at startup (e.g. FONT_PATH / --font_path). Returns number of sizes loaded."""
+    n = 0
+    for s in sorted({int(x) for x in sizes if int(x) > 0}):
+        get_font(path, s)
+        n += 1
+    return n
+
+
+def font_cache_info():
+    return _load_font.cache_info()
@@ -0,0 +1,70 @@
+"""
+image_backend.py
+- Pluggable image backend behind run_generate.openai_img() / openai_img_batch().
+- "openai" (default): the real Images API (gpt-image-1) via image_scheduler.post_images.
+- "stub": deterministic local generator, no network, no cost. Returns a 1024x1024 PNG whose
+  content depends only on (prompt, slot), so runs are reproducible for benchmarking
+  (benchmarks/bench_pipeline.py) and offline testing.
+
+env
+- IMAGE_BACKEND          (default openai)  : openai | stub
+- STUB_IMAGE_LATENCY_MS  (default 0)       : simulated per-request latency for the stub
+"""
+from __future__ import annotations
+from io import BytesIO
+from typing import Callable, Dict, List
+import hashlib
+import os
+import random
+import time
+
+from PIL import Image, ImageDraw
+
+DEFAULT_IMAGE_BACKEND = os.environ.get("IMAGE_BACKEND", "openai")
+STUB_LATENCY_MS = float(os.environ.get("STUB_IMAGE_LATENCY_MS", "0"))
+
+
+def _parse_size(size: str) -> tuple:
+    try:
+        w, h = (int(x) for x in str(size).lower().split("x"))
+        return w, h
+    except ValueError:
+        return 1024, 1024
+
+
+def stub_png(prompt: str, size: str = "1024x1024", slot: int = 0) -> bytes:
+    """Deterministic pastel 'art' for (prompt, slot): gradient + blobs + light grain, PNG encoded."""
+    w, h = _parse_size(size)
+    seed = int.from_bytes(hashlib.sha256(f"{prompt}\x00{slot}".encode("utf-8")).digest()[:8], "big")
+    rnd = random.Random(seed)
+    c1 = tuple(rnd.randint(170, 255) for _ in range(3))
+    c2 = tuple(rnd.randint(120, 230) for _ in range(3))
+    grad = Image.linear_gradient("L").resize((w, h))
+    im = Image.composite(Image.new("RGB", (w, h), c1), Image.new("RGB", (w, h), c2), grad)
+    draw = ImageDraw.Draw(im)
+    for _ in range(12):
+        r = rnd.randint(w // 20, w // 5)
+        x, y = rnd.randint(0, w), rnd.randint(0, h)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=tuple(rnd.randint(180, 255) for _ in range(3)))
+    # grain keeps PNG encode/decode cost close to real generated art
+    noise = Image.frombytes("RGB", (w, h), rnd.randbytes(w * h * 3))
+    im = Image.blend(im, noise, 0.08)
+    buf = BytesIO()
+    im.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def stub_generate(prompt: str, size: str, slots: List[int]) -> List[bytes]:
+    if STUB_LATENCY_MS > 0:
+        time.sleep(STUB_LATENCY_MS / 1000.0)
+    return [stub_png(prompt, size, s) for s in slots]
+
+
+# name -> generate(prompt, size, slots) -> one PNG (bytes) per slot; "openai" is handled by run_generate
+BACKENDS: Dict[str, Callable[[str, str, List[int]], List[bytes]]] = {
+    "stub": stub_generate,
+}
+
+
+def backend_names() -> List[str]:
+    return ["openai", *BACKENDS]
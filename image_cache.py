@@ -0,0 +1,95 @@
+"""
+image_cache.py
+- Persistent content-addressed cache for generated base art.
+- Key = sha256(model, size, prompt, slot). slot separates cards that share an identical prompt
+  within one run (1st, 2nd, ... occurrence) so they keep distinct art on reruns.
+  Requests to another base URL (mock server / proxy) add it to the key (namespace).
+- Size-bounded LRU: a hit refreshes the file mtime; when the cache grows past max_bytes the
+  least recently used entries are deleted.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional
+import hashlib
+import os
+import shutil
+import threading
+
+DEFAULT_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "./.image_cache")
+DEFAULT_CACHE_MAX_MB = int(os.environ.get("IMAGE_CACHE_MAX_MB", "2048"))
+
+
+def cache_key(model: str, size: str, prompt: str, slot: int = 0, namespace: str = "") -> str:
+    h = hashlib.sha256()
+    for part in (model, size, prompt):
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\x00")
+    if slot:
+        h.update(f"slot={int(slot)}".encode("utf-8"))
+    if namespace:
+        h.update(f"ns={namespace}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class ImageCache:
+    def __init__(self, root: Path = Path(DEFAULT_CACHE_DIR), max_mb: int = DEFAULT_CACHE_MAX_MB):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max(0, int(max_mb)) * 1024 * 1024
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        # two-level fan-out keeps directories small
+        return self.root / key[:2] / f"{key}.png"
+
+    def get(self, key: str, out_path: Path) -> bool:
+        """Copy the cached image to out_path. Returns False on miss."""
+        src = self._path(key)
+        if not src.exists():
+            return False
+        try:
+            Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(src, out_path)
+            os.utime(src, None)  # LRU touch
+            return True
+        except OSError:
+            return False
+
+    def put(self, key: str, src_path: Path) -> Optional[Path]:
+        dst = self._path(key)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            shutil.copyfile(src_path, tmp)
+            os.replace(tmp, dst)  # atomic: concurrent readers never see a half-written PNG
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return None
+        self.evict()
+        return dst
+
+    def evict(self) -> int:
+        """Delete least recently used entries until the cache fits max_bytes. Returns files removed."""
+        if not self.max_bytes:
+            return 0
+        with self._lock:
+            entries = []
+            total = 0
+            for p in self.root.glob("*/*.png"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+            removed = 0
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    p.unlink()
+                    total -= size
+                    removed += 1
+                except OSError:
+                    pass
+            return removed
@@ -0,0 +1,107 @@
+"""
+image_export.py
+- Output codec for exported cards / stories / LOCK / CTA / bonus cards (run_generate.py).
+- --image_format png|webp|jpeg, --quality (webp/jpeg), --png_compress_level (0-9, PIL default 6).
+- Base art and cached API images stay PNG; only the deliverables follow the export setting.
+- The file suffix follows the format (.png / .webp / .jpg); save() always writes to the
+  suffixed path and returns it.
+
+benchmark: encode time + size per format for one card
+    python image_export.py [card.png]
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import sys
+import time
+
+from PIL import Image
+
+FORMATS: Dict[str, tuple] = {
+    # name: (suffix, PIL format)
+    "png":  (".png",  "PNG"),
+    "webp": (".webp", "WEBP"),
+    "jpeg": (".jpg",  "JPEG"),
+}
+
+
+@dataclass(frozen=True)
+class ImageExport:
+    format: str = "png"
+    quality: int = 90
+    png_compress_level: int = 6
+
+    @property
+    def suffix(self) -> str:
+        return FORMATS[self.format][0]
+
+    def path(self, p: Path) -> Path:
+        return Path(p).with_suffix(self.suffix)
+
+    def params(self) -> dict:
+        if self.format == "png":
+            return {"compress_level": max(0, min(9, int(self.png_compress_level)))}
+        if self.format == "webp":
+            return {"quality": int(self.quality), "method": 4}
+        return {"quality": int(self.quality), "optimize": True, "progressive": True}
+
+    def encode(self, im: Image.Image, fp, mode: str = "RGB") -> None:
+        if self.format == "jpeg":
+            mode = "RGB"  # no alpha in JPEG
+        (im.convert(mode) if im.mode != mode else im).save(fp, FORMATS[self.format][1], **self.params())
+
+    def save(self, im: Image.Image, out_path: Path, mode: str = "RGB") -> Path:
+        out_path = self.path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        self.encode(im, out_path, mode)
+        return out_path
+
+
+_CURRENT = ImageExport()
+
+
+def set_image_export(export: ImageExport) -> None:
+    global _CURRENT
+    _CURRENT = export
+
+
+def image_export() -> ImageExport:
+    return _CURRENT
+
+
+def benchmark(im: Image.Image, exports: Iterable[ImageExport], repeat: int = 3) -> List[dict]:
+    rows = []
+    for ex in exports:
+        best = None
+        for _ in range(repeat):
+            buf = BytesIO()
+            t = time.perf_counter()
+            ex.encode(im, buf)
+            dt = time.perf_counter() - t
+            best = dt if best is None else min(best, dt)
+        rows.append({"format": ex.format, "params": ex.params(), "encode_ms": round(best*1000, 1), "kb": round(buf.tell()/1024, 1)})
+    return rows
+
+
+DEFAULT_BENCH = [
+    ImageExport("png", png_compress_level=6), ImageExport("png", png_compress_level=1),
+    ImageExport("webp", quality=90), ImageExport("webp", quality=80),
+    ImageExport("jpeg", quality=90), ImageExport("jpeg", quality=80),
+]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        im = Image.open(argv[0]).convert("RGB")
+    else:
+        im = Image.effect_mandelbrot((1080, 1080), (-2, -1.5, 1, 1.5), 100).convert("RGB")
+    print(f"{'format':6} {'params':56} {'encode_ms':>9} {'KB':>8}")
+    for r in benchmark(im, DEFAULT_BENCH):
+        print(f"{r['format']:6} {str(r['params']):56} {r['encode_ms']:>9} {r['kb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
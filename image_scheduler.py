@@ -0,0 +1,204 @@
+"""
+image_scheduler.py
+- Shared rate-limit-aware scheduler for the OpenAI Images API.
+- Used by run_generate.openai_img_batch() and app.openai_generate_image(), so the CLI,
+  server_v22.py (via run_generate) and the Streamlit app draw from ONE budget.
+- Token bucket sized to the account's images-per-minute limit; state lives in a small SQLite
+  file so separate processes share it.
+- 429 / 5xx / network errors: exponential backoff with full jitter; Retry-After is honored and
+  also pauses every other process sharing the bucket.
+- One bucket per API namespace (api_namespace()): a mock / proxy base URL gets its own
+  "images@<base>" row, so its limits and injected 429s never pause real API traffic.
+- http_session(): keep-alive requests.Session per thread, so repeated calls from a long-lived
+  process (server_v22 render workers) reuse one TLS connection instead of reconnecting.
+
+env
+- IMAGES_PER_MINUTE   (default 5)  : account images/min limit (bucket size = 1 minute of budget)
+- IMAGE_SCHED_DB      (default ./image_scheduler.sqlite)
+- IMAGE_MAX_RETRIES   (default 5)
+- OPENAI_BASE_URL     (default https://api.openai.com/v1) : same variable the openai SDK reads;
+                       point it at benchmarks/mock_images_api.py for offline load tests
+"""
+from __future__ import annotations
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+
+IMAGES_PER_MINUTE = float(os.environ.get("IMAGES_PER_MINUTE", "5"))
+SCHED_DB = Path(os.environ.get("IMAGE_SCHED_DB", "./image_scheduler.sqlite"))
+MAX_RETRIES = int(os.environ.get("IMAGE_MAX_RETRIES", "5"))
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "").strip() or DEFAULT_OPENAI_BASE_URL
+BACKOFF_BASE = 2.0   # seconds
+BACKOFF_CAP = 60.0   # seconds
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def images_endpoint(base_url: str = "") -> str:
+    """.../v1/images/generations under base_url (default OPENAI_BASE_URL)."""
+    return (base_url or OPENAI_BASE_URL).rstrip("/") + "/images/generations"
+
+
+def api_namespace(base_url: str = "") -> str:
+    """"" for the real API, else the base URL: keeps mock/proxy images out of the paid-art cache keys."""
+    base = (base_url or OPENAI_BASE_URL).rstrip("/")
+    return "" if base == DEFAULT_OPENAI_BASE_URL else base
+
+
+class TokenBucket:
+    def __init__(self, db_path: Path = SCHED_DB, per_minute: float = IMAGES_PER_MINUTE, name: str = "images"):
+        self.db_path = Path(db_path)
+        self.rate = max(0.01, float(per_minute)) / 60.0   # tokens per second
+        self.capacity = max(1.0, float(per_minute))
+        self.name = name
+        con = self._db()
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS buckets(
+            name TEXT PRIMARY KEY,
+            tokens REAL,
+            updated_at REAL,
+            blocked_until REAL DEFAULT 0
+        )""")
+        con.execute("INSERT OR IGNORE INTO buckets(name,tokens,updated_at,blocked_until) VALUES(?,?,?,0)",
+                    (self.name, self.capacity, time.time()))
+        con.commit()
+        con.close()
+
+    def _db(self):
+        if self.db_path.parent and not self.db_path.parent.exists():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL;")
+        return con
+
+    def _try_take(self, n: float) -> float:
+        """Take n tokens if available. Returns 0 on success, else seconds to wait."""
+        con = self._db()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            tokens, updated, blocked = con.execute(
+                "SELECT tokens, updated_at, blocked_until FROM buckets WHERE name=?", (self.name,)).fetchone()
+            now = time.time()
+            if blocked and blocked > now:
+                con.execute("COMMIT")
+                return blocked - now
+            tokens = min(self.capacity, float(tokens) + (now - float(updated)) * self.rate)
+            if tokens >= n:
+                con.execute("UPDATE buckets SET tokens=?, updated_at=? WHERE name=?", (tokens - n, now, self.name))
+                con.execute("COMMIT")
+                return 0.0
+            con.execute("UPDATE buckets SET tokens=?, updated_at=? WHERE name=?", (tokens, now, self.name))
+            con.execute("COMMIT")
+            return (n - tokens) / self.rate
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+
+    def acquire(self, n: int = 1) -> None:
+        # a request for more than one bucket of images still has to go through eventually
+        need = min(float(n), self.capacity)
+        while True:
+            wait = self._try_take(need)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, BACKOFF_CAP) + random.uniform(0, 0.25))
+
+    def block_for(self, seconds: float) -> None:
+        """Pause every process sharing this bucket (server told us to back off)."""
+        con = self._db()
+        con.execute("UPDATE buckets SET blocked_until=MAX(blocked_until, ?) WHERE name=?",
+                    (time.time() + max(0.0, seconds), self.name))
+        con.close()
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+
+
+def bucket_name(base_url: str = "") -> str:
+    ns = api_namespace(base_url)
+    return f"images@{ns}" if ns else "images"
+
+
+def shared_bucket(base_url: str = "") -> TokenBucket:
+    """This process's bucket for base_url's API (default OPENAI_BASE_URL)."""
+    name = bucket_name(base_url)
+    if name not in _BUCKETS:
+        _BUCKETS[name] = TokenBucket(name=name)
+    return _BUCKETS[name]
+
+
+_LOCAL = threading.local()
+
+
+def http_session() -> requests.Session:
+    """This thread's keep-alive session (requests.Session is not safe to share across threads)."""
+    sess = getattr(_LOCAL, "session", None)
+    if sess is None:
+        sess = _LOCAL.session = requests.Session()
+    return sess
+
+
+def retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    v = (resp.headers.get("retry-after-ms") or "").strip()
+    if v:
+        try:
+            return float(v) / 1000.0
+        except ValueError:
+            pass
+    v = (resp.headers.get("Retry-After") or "").strip()
+    if not v:
+        return None
+    try:
+        return max(0.0, float(v))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(v).timestamp() - time.time())
+        except Exception:
+            return None
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def post_images(url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float = 180,
+                max_retries: int = MAX_RETRIES, bucket: Optional[TokenBucket] = None, base_url: str = "") -> requests.Response:
+    """
+    POST an Images API request through the shared budget of base_url's API (url is under it).
+    Returns the 200 response; raises RuntimeError once retries are exhausted or on a non-retryable status.
+    """
+    bucket = bucket or shared_bucket(base_url)
+    n = int(payload.get("n") or 1)
+    last = ""
+    for attempt in range(max_retries + 1):
+        bucket.acquire(n)
+        try:
+            r = http_session().post(url, headers=headers, json=payload, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last = f"{type(e).__name__}: {e}"
+            if attempt < max_retries:
+                time.sleep(backoff_delay(attempt))
+            continue
+        if r.status_code == 200:
+            return r
+        last = f"Images API error {r.status_code}: {r.text[:900]}"
+        if r.status_code not in RETRY_STATUS or attempt >= max_retries:
+            break
+        wait = retry_after_seconds(r)
+        if wait is not None:
+            if r.status_code == 429:
+                bucket.block_for(wait)
+            time.sleep(wait + random.uniform(0, 0.5))
+        else:
+            time.sleep(backoff_delay(attempt))
+    raise RuntimeError(last or "Images API request failed")
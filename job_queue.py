@@ -0,0 +1,298 @@
+"""
+job_queue.py
+- Persistent job queue (SQLite) + bounded worker threads for server_v22.py webhooks.
+- /webhook/purchase and /webhook/review only record the event and submit() a job, then answer
+  202 with the job id; generation / xlsx writes / upload run here, off the uvicorn event loop.
+- Jobs survive restarts: queued jobs stay queued. A running job records its owner
+  (host:pid:token) and a heartbeat; start() and every heartbeat put back to the queue only jobs
+  whose owner is gone (same host, pid no longer alive or reused by a new process) or has not
+  beaten for JOB_STALE_SECONDS, so several processes can share JOB_DB without stealing each
+  other's running jobs.
+- Status: get(job_id) (GET /jobs/{id}); optional callback_url gets POSTed
+  {"job_id", "kind", "status", "result" | "error"} when the job finishes.
+
+env
+- JOB_DB            (default ./bonus_jobs.sqlite)
+- JOB_WORKERS       (default 2)   : jobs running at the same time
+- JOB_QUEUE_MAX     (default 500) : queued jobs before submit() refuses (QueueFull -> 503)
+- JOB_MAX_ATTEMPTS  (default 2)   : a failing job is retried until this many attempts
+- JOB_HEARTBEAT_SECONDS (default 10) : how often running jobs are marked alive
+- JOB_STALE_SECONDS     (default 60) : a running job without a heartbeat this long is requeued
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+import requests
+
+JOB_DB = Path(os.environ.get("JOB_DB", "./bonus_jobs.sqlite"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "500"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "10"))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "60"))
+CALLBACK_RETRIES = 3
+POLL_SECONDS = 2.0  # also picks up jobs submitted by another process sharing JOB_DB
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class JobQueue:
+    def __init__(self, handlers: Dict[str, Callable[[dict], dict]], db_path: Path = JOB_DB,
+                 workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_MAX, max_attempts: int = JOB_MAX_ATTEMPTS):
+        """handlers: kind -> fn(payload) -> JSON-able result (raise to fail the job)."""
+        self.handlers = handlers
+        self.db_path = Path(db_path)
+        self.workers = max(1, int(workers))
+        self.max_queued = max_queued
+        self.max_attempts = max(1, int(max_attempts))
+        self._wake = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stop = False
+        self._host = socket.gethostname()
+        # the token tells a restarted process from its predecessor when the pid is reused (pid 1 in containers)
+        self.owner = f"{self._host}:{os.getpid()}:{secrets.token_hex(4)}"
+        con = self._db()
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS jobs(
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            payload TEXT,
+            status TEXT,
+            result TEXT,
+            error TEXT,
+            callback_url TEXT,
+            attempts INTEGER DEFAULT 0,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            owner TEXT,
+            heartbeat_at REAL
+        )""")
+        cols = {r[1] for r in con.execute("PRAGMA table_info(jobs)")}
+        for col, typ in (("owner", "TEXT"), ("heartbeat_at", "REAL")):  # databases from before owners
+            if col not in cols:
+                con.execute(f"ALTER TABLE jobs ADD COLUMN {col} {typ}")
+        con.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+        con.close()
+
+    def _db(self):
+        if self.db_path.parent and not self.db_path.parent.exists():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL;")
+        return con
+
+    # ---------- producer side ----------
+    def submit(self, kind: str, payload: Dict[str, Any], callback_url: str = "") -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        job_id = secrets.token_hex(8)
+        con = self._db()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            queued = con.execute("SELECT COUNT(*) FROM jobs WHERE status='queued'").fetchone()[0]
+            if self.max_queued and queued >= self.max_queued:
+                con.execute("ROLLBACK")
+                raise QueueFull(f"{queued} jobs queued")
+            con.execute("INSERT INTO jobs(id,kind,payload,status,callback_url,created_at) VALUES(?,?,?,?,?,?)",
+                        (job_id, kind, json.dumps(payload, ensure_ascii=False), "queued", callback_url or "", time.time()))
+            con.execute("COMMIT")
+        finally:
+            con.close()
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        con = self._db()
+        try:
+            con.row_factory = sqlite3.Row
+            row = con.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            if job["status"] == "queued":
+                job["queue_position"] = con.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status='queued' AND created_at<=?", (job["created_at"],)).fetchone()[0]
+        finally:
+            con.close()
+        return _public(job)
+
+    def stats(self) -> Dict[str, Any]:
+        con = self._db()
+        try:
+            counts = dict(con.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            con.close()
+        return {"workers": self.workers, "alive": sum(t.is_alive() for t in self._threads), **counts}
+
+    # ---------- worker side ----------
+    def start(self) -> None:
+        """Requeue jobs of dead owners and start the worker + heartbeat threads (idempotent)."""
+        if self._threads:
+            return
+        self.requeue_stale()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _owner_dead(self, owner: Optional[str], heartbeat_at: Optional[float], now: float) -> bool:
+        if owner == self.owner:
+            return False
+        host, _, rest = (owner or "").partition(":")
+        pid = rest.partition(":")[0]
+        if host == self._host and pid.isdigit() and os.name == "posix":  # os.kill(pid, 0) kills on Windows
+            if int(pid) == os.getpid():
+                return True  # our pid, another token: a previous process that had the same pid
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return True
+            except OSError:
+                pass  # exists, owned by another user
+        # other host (or no owner: a row from before owners): only the heartbeat tells
+        return heartbeat_at is None or now - heartbeat_at > JOB_STALE_SECONDS
+
+    def requeue_stale(self) -> int:
+        """Put running jobs whose owner is dead or silent back to the queue. Returns how many."""
+        now = time.time()
+        con = self._db()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            rows = con.execute("SELECT id, owner, COALESCE(heartbeat_at, started_at) FROM jobs WHERE status='running'").fetchall()
+            stale = [job_id for job_id, owner, beat in rows if self._owner_dead(owner, beat, now)]
+            con.executemany("UPDATE jobs SET status='queued', owner=NULL WHERE id=? AND status='running'", [(j,) for j in stale])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+        for job_id in stale:
+            print(f"job {job_id}: owner gone, requeued", file=sys.stderr)
+        if stale:
+            with self._wake:
+                self._wake.notify_all()
+        return len(stale)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop:
+            try:
+                con = self._db()
+                try:
+                    con.execute("UPDATE jobs SET heartbeat_at=? WHERE status='running' AND owner=?", (time.time(), self.owner))
+                finally:
+                    con.close()
+                self.requeue_stale()
+            except Exception as e:
+                print("job heartbeat failed:", e, file=sys.stderr)
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+
+    def stop(self) -> None:
+        self._stop = True
+        with self._wake:
+            self._wake.notify_all()
+
+    def _claim(self) -> Optional[dict]:
+        con = self._db()
+        try:
+            con.row_factory = sqlite3.Row
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                con.execute("COMMIT")
+                return None
+            now = time.time()
+            con.execute("UPDATE jobs SET status='running', started_at=?, heartbeat_at=?, owner=?, attempts=attempts+1 WHERE id=?",
+                        (now, now, self.owner, row["id"]))
+            con.execute("COMMIT")
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            con.close()
+
+    def _finish(self, job: dict, status: str, result: Any = None, error: str = "") -> bool:
+        """False if the job was requeued from under us (heartbeat missed): its new owner reports it."""
+        con = self._db()
+        try:
+            cur = con.execute("UPDATE jobs SET status=?, result=?, error=?, finished_at=?, owner=NULL WHERE id=? AND owner=? AND status='running'",
+                              (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(),
+                               job["id"], self.owner))
+            return cur.rowcount == 1
+        finally:
+            con.close()
+
+    def _loop(self) -> None:
+        while not self._stop:
+            job = self._claim()
+            if job is None:
+                with self._wake:
+                    self._wake.wait(POLL_SECONDS)
+                continue
+            try:
+                result = self.handlers[job["kind"]](json.loads(job["payload"] or "{}"))
+            except Exception as e:
+                print(f"job {job['id']} ({job['kind']}) failed:", e, file=sys.stderr)
+                if job["attempts"] < self.max_attempts:
+                    self._finish(job, "queued", error=f"{type(e).__name__}: {e}")
+                    continue
+                finished = self._finish(job, "failed", error="".join(traceback.format_exception_only(type(e), e)).strip())
+            else:
+                finished = self._finish(job, "done", result=result)
+            if finished:
+                self._callback(job["id"])
+
+    def _callback(self, job_id: str) -> None:
+        job = self.get(job_id)
+        url = (job or {}).get("callback_url")
+        if not url:
+            return
+        body = {k: job.get(k) for k in ("job_id", "kind", "status", "result", "error")}
+        for attempt in range(CALLBACK_RETRIES):
+            try:
+                r = requests.post(url, json=body, timeout=10)
+                if r.status_code < 500:
+                    return
+            except requests.RequestException as e:
+                print(f"job {job_id} callback failed:", e, file=sys.stderr)
+            time.sleep(2 ** attempt)
+
+
+def _public(job: dict) -> dict:
+    out = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "callback_url": job["callback_url"],
+    }
+    if "queue_position" in job:
+        out["queue_position"] = job["queue_position"]
+    if job.get("result"):
+        out["result"] = json.loads(job["result"])
+    if job.get("error"):
+        out["error"] = job["error"]
+    return out
@@ -0,0 +1,45 @@
+"""
+qr_cache.py
+- Memoized QR tiles for run_generate.py (locked free-mode cards, CTA cuts, bonus teaser QR).
+- A run only has a handful of UTM URLs, but every card used to rebuild a qrcode.QRCode,
+  run make(fit=True) and resize it. Tiles are now rendered once per (url, size, colors).
+- Bounded LRU (QR_CACHE_SIZE, default 256 tiles). Callers get a copy, so pasting/drawing
+  on the returned tile can never corrupt the cached one.
+- precompute_qr(): render the whole UTM set of a run up front.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Iterable, Tuple, Union
+import os
+
+import qrcode
+from PIL import Image
+
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "256"))
+
+Color = Union[str, Tuple[int, int, int]]
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _render_qr(url: str, size: int, fill: Color, back: Color) -> Image.Image:
+    qr = qrcode.QRCode(box_size=6, border=2)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr.make_image(fill_color=fill, back_color=back).convert("RGB").resize((size, size), Image.NEAREST)
+
+
+def qr_tile(url: str, size: int, fill: Color = "black", back: Color = "white") -> Image.Image:
+    """RGB QR tile of size x size for url (cached)."""
+    return _render_qr(url, int(size), fill, back).copy()
+
+
+def precompute_qr(urls: Iterable[str], sizes: Iterable[int], fill: Color = "black", back: Color = "white") -> int:
+    """Render every (url, size) pair of a run into the cache. Returns number of tiles."""
+    pairs = sorted({(u, int(s)) for u in urls if u for s in sizes})
+    for u, s in pairs:
+        _render_qr(u, s, fill, back)
+    return len(pairs)
+
+
+def qr_cache_info():
+    return _render_qr.cache_info()
@@ -0,0 +1,73 @@
+"""
+render_stage.py
+- Process-pool render stage for run_generate.py.
+- Once a card's base art exists, its PIL work (text wrap, LOCK overlay with QR, story blur,
+  PNG encode) is CPU-bound; running it in worker processes sidesteps the GIL.
+- Jobs are picklable card specs (run_generate.CardSpec) handed to a top-level render function
+  (run_generate.render_card). Results come back in submission order, so output names and
+  manifest records stay deterministic regardless of which worker finishes first.
+- workers <= 1 renders inline in the calling process (no pool start-up cost).
+- Workers start with forkserver (spawn where unavailable), like worker_pool.WorkerPool: forking a
+  parent that already runs threads (image fetchers, ZIP writer) can copy a held lock into the child.
+
+env
+- RENDER_WORKERS        (default: available CPUs)
+- RENDER_START_METHOD   (default forkserver, or spawn where forkserver is unavailable)
+"""
+from __future__ import annotations
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+import multiprocessing
+import os
+
+
+def available_cpus() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+DEFAULT_RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "0")) or available_cpus()
+RENDER_START_METHOD = os.environ.get("RENDER_START_METHOD") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+class RenderStage:
+    def __init__(self, render: Callable[[Any], Any], workers: int = DEFAULT_RENDER_WORKERS,
+                 start_method: str = RENDER_START_METHOD):
+        """render(spec) must be a module-level function (picklable by reference)."""
+        self.render = render
+        self.workers = max(1, int(workers or 1))
+        self.pool: Optional[ProcessPoolExecutor] = None
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(start_method))
+        self.jobs: List[Tuple[Any, Future]] = []
+
+    def submit(self, spec: Any, on_done: Optional[Callable[[Any], None]] = None) -> Future:
+        """on_done(spec) runs as soon as this card succeeds (e.g. append its files to the run ZIP)."""
+        if self.pool is not None:
+            fut = self.pool.submit(self.render, spec)
+        else:
+            fut = Future()
+            try:
+                fut.set_result(self.render(spec))
+            except Exception as e:
+                fut.set_exception(e)
+        if on_done is not None:
+            fut.add_done_callback(lambda f: on_done(spec) if not f.cancelled() and f.exception() is None else None)
+        self.jobs.append((spec, fut))
+        return fut
+
+    def results(self) -> Iterator[Tuple[Any, Any]]:
+        """(spec, result) in submission order; re-raises the first failure."""
+        try:
+            for spec, fut in self.jobs:
+                yield spec, fut.result()
+        finally:
+            self.jobs = []
+
+    def close(self, cancel: bool = False) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=not cancel, cancel_futures=cancel)
+            self.pool = None
@@ -0,0 +1,78 @@
+"""
+run_archive.py
+- Streaming ZIP for run_generate.py output.
+- PNG / JPEG / WebP / MP4 are already compressed, so they go in as ZIP_STORED (deflating them
+  burns CPU for ~0% size gain); text/JSON/HTML/CSV stay ZIP_DEFLATED.
+- Card outputs are appended as each card finishes (RenderStage done callback); close() adds
+  whatever else is under the run folder (thumbnails, CTA cuts, videos) and moves
+  the finished archive into place, so the ZIP is ready right after the last card.
+- The archive is written to <name>.zip.part and renamed on close: a crashed run never
+  leaves a ZIP that looks complete; abort() removes the .part.
+- add_tree() skips hidden files/folders and run bookkeeping (INTERNAL_NAMES: manifest with
+  input hashes and absolute paths, timings, profiles): the ZIP is the customer deliverable.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Optional, Set
+import os
+import threading
+import zipfile
+
+INTERNAL_NAMES = {"run_manifest.json", "timings.json", "render.prof"}
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".mp4", ".mov", ".webm", ".m4a", ".mp3", ".zip", ".gz"}
+
+
+def compress_type_for(path: Path) -> int:
+    return zipfile.ZIP_STORED if Path(path).suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+
+def is_deliverable(rel: Path) -> bool:
+    """False for hidden files / anything under a hidden folder and run bookkeeping files."""
+    return rel.name not in INTERNAL_NAMES and not any(part.startswith(".") for part in rel.parts)
+
+
+class RunArchive:
+    def __init__(self, zip_path: Path, root: Path):
+        self.zip_path = Path(zip_path)
+        self.root = Path(root)
+        self.tmp_path = self.zip_path.with_name(self.zip_path.name + ".part")
+        self.zip_path.parent.mkdir(parents=True, exist_ok=True)
+        self.zf: Optional[zipfile.ZipFile] = zipfile.ZipFile(self.tmp_path, "w", zipfile.ZIP_DEFLATED)
+        self.added: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add(self, path: Path) -> bool:
+        """Append one file under the run folder (once). Returns False if missing / already added."""
+        path = Path(path)
+        if not path.is_file():
+            return False
+        arcname = path.relative_to(self.root).as_posix()
+        with self._lock:
+            if self.zf is None or arcname in self.added:
+                return False
+            self.zf.write(path, arcname=arcname, compress_type=compress_type_for(path))
+            self.added.add(arcname)
+        return True
+
+    def add_many(self, paths: Iterable[Path]) -> int:
+        return sum(1 for p in paths if self.add(p))
+
+    def add_tree(self) -> int:
+        return self.add_many(sorted(p for p in self.root.rglob("*") if p.is_file() and is_deliverable(p.relative_to(self.root))))
+
+    def close(self) -> Path:
+        """Add the remaining deliverable run files, finish the central directory and publish the ZIP."""
+        self.add_tree()
+        with self._lock:
+            if self.zf is not None:
+                self.zf.close()
+                self.zf = None
+        os.replace(self.tmp_path, self.zip_path)
+        return self.zip_path
+
+    def abort(self) -> None:
+        with self._lock:
+            if self.zf is not None:
+                self.zf.close()
+                self.zf = None
+        self.tmp_path.unlink(missing_ok=True)
@@ -10,21 +10,41 @@ Alloki & Dalloki Generator (v31)
 """
 
 from __future__ import annotations
-import argparse, os, sys, zipfile
-from dataclasses import dataclass
+import argparse, json, os, secrets, shutil, sys, tempfile, threading, time
+from contextlib import ExitStack
+from dataclasses import dataclass, field, fields
 from datetime import date, datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
 
-import requests
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
-import qrcode
-import openpyxl
+
+from base_art import BaseArtStage, DEFAULT_GEN_WORKERS, DEFAULT_BATCH_N
+from image_cache import ImageCache, cache_key, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB
+from run_manifest import RunManifest
+from image_scheduler import OPENAI_BASE_URL, api_namespace, http_session, images_endpoint, post_images
+from font_cache import get_font, preload_fonts
+from qr_cache import qr_tile, precompute_qr
+from render_stage import RenderStage, DEFAULT_RENDER_WORKERS
+from run_archive import RunArchive
+from image_export import FORMATS, ImageExport, image_export, set_image_export
+from stage_timer import Sample, StageTimer, merge_profiles, set_stage_timer, stage_timer
+from text_wrap import wrap_text
+from card_workbook import read_workbook, sheet_rows, header_index
+from image_backend import BACKENDS as IMAGE_BACKENDS, DEFAULT_IMAGE_BACKEND, backend_names
+from send_dispatch import dispatch_send
+from log_to_sheet import append_send_log_xlsx, now_kst_iso
+from funnel_tools import build_comment_reply_payload, build_landing_payload, write_json, write_landing_html_variants
+from uploaders import upload_bonus_assets, upload_landing_variants_s3
 
 OUT_SQUARE = (1080, 1080)
 OUT_STORY  = (1080, 1920)
+CTA_QR_SIZE = 240     # locked card / CTA cut
+TEASER_QR_SIZE = 260  # bonus teaser
 API_SIZE   = "1024x1024"
 MODEL      = "gpt-image-1"
+DEFAULT_FONT = os.environ.get("FONT_PATH") or None  # badges/banners/video overlays (was referenced but never defined)
 
 BASE_PROMPT = (
     "Two adorable pastel rainbow baby poodles, Alloki and Dalloki, "
@@ -40,6 +60,7 @@ SEASON_ADDONS = {
     "winter": "Ivory and light gray-blue background, soft winter light.",
     "yearend_bundle": "Four-season subtle gradient ring, premium calm feeling.",
 }
+SEASON_KR = {"spring": "봄", "summer": "여름", "autumn": "가을", "winter": "겨울"}
 THUMB_COPY_DEFAULT = {
     "A": "오늘의 마음을 꺼내보세요",
     "B": "지금 안 보면 놓쳐요",
@@ -64,19 +85,13 @@ def offer_plan(offer_code: str, season: str, days_arg: int, bonus_arg: int) -> T
 
 def thumb_copy_for_offer(offer_code: str, season: str) -> Dict[str,str]:
     oc = (offer_code or "").upper()
-  if oc == "SEASONPACK":
-    season_kr = {
-        "spring": "봄",
-        "summer": "여름",
-        "autumn": "가을",
-        "winter": "겨울",
-    }.get(season, season)
-
-    return {
-        "A": f"{season_kr} 시즌팩 21+3 오늘의 마음을 꺼내요",
-        "B": f"{season_kr} 시즌팩 21+3 지금 안 사면 늦겠어요",
-        "C": f"{season_kr} 시즌팩 21+3 프리미엄 한정",
-    }
+    if oc == "SEASONPACK":
+        season_kr = SEASON_KR.get(season, season)
+        return {
+            "A": f"{season_kr} 시즌팩 21+3 오늘의 마음을 꺼내요",
+            "B": f"{season_kr} 시즌팩 21+3 지금 안 사면 늦겠어요",
+            "C": f"{season_kr} 시즌팩 21+3 프리미엄 한정",
+        }
     if oc == "D7":
         return {"A":"7일 카드 · 오늘의 마음", "B":"7일 카드 · 지금 시작", "C":"7일 카드 · 가볍게 힐링"}
     if oc == "D14":
@@ -107,6 +122,20 @@ def compute_countdown(deadline: str, fallback_days: int) -> int:
         return int(fallback_days)
 
 
+def compute_deadline_info(deadline: str, fallback_days: int) -> Tuple[int, Optional[int], bool]:
+    """
+    (countdown, raw_delta, expired) for a YYYY-MM-DD deadline: countdown as compute_countdown(),
+    raw_delta = days until the deadline (negative once passed, None without a valid deadline).
+    """
+    if deadline:
+        try:
+            delta = (datetime.strptime(deadline, "%Y-%m-%d").date() - date.today()).days
+            return max(0, delta), delta, delta < 0
+        except ValueError:
+            pass
+    return int(fallback_days), None, False
+
+
 def seasonpack_stage_labels(days_left: int) -> tuple[str,str]:
     """
     returns (urgency_tag, headline_suffix)
@@ -133,6 +162,14 @@ def seasonpack_cta_body_by_stage(days_left: int, segment: str) -> str:
         return "이번 주 마감!\n3주 루틴 + 보너스 3장"
     return "3주 루틴 완성!\n보너스 3장까지 바로 받기"
 
+def seasonpack_cta_copy(platform: str, season: str, days_left: int, segment: str) -> Tuple[str, str, str, str]:
+    """SEASONPACK CTA_T2 (conversion cut) copy by deadline stage: (title, body, price, cta)."""
+    tag, headline = seasonpack_stage_labels(days_left)
+    title = " · ".join(x for x in (f"{SEASON_KR.get(season, season)} 시즌팩 21+3", tag, headline) if x)
+    body = seasonpack_cta_body_by_stage(days_left, segment)
+    cta = "즉시 다운로드" if (platform or "").lower() == "instagram" else "지금 안 사면 놓쳐요"
+    return title, body, "12,900원 · 시즌팩", cta
+
 def seasonpack_cta_t1_teaser_by_stage(days_left: int, platform: str, segment: str) -> str:
     seg = (segment or "new").lower()
     if days_left <= 0:
@@ -146,24 +183,24 @@ def seasonpack_cta_t1_teaser_by_stage(days_left: int, platform: str, segment: st
     # default
     return cta_t1_teaser_copy(platform, "", segment)
 
-def add_countdown_label(im_path, out_path, days_left: int = 3):
-    """Overlay D-N countdown near top-left."""
-    from PIL import Image, ImageDraw, ImageFont
-    im = Image.open(im_path).convert("RGBA")
+def draw_countdown_label(im: Image.Image, days_left: int = 3) -> Image.Image:
+    """Overlay D-N countdown near top-left (in place)."""
     w,h = im.size
     draw = ImageDraw.Draw(im)
     label = f"D-{int(days_left)}"
-    try:
-        font = ImageFont.truetype(DEFAULT_FONT, int(h*0.07))
-    except:
-        font = ImageFont.load_default()
+    font = pick_font(DEFAULT_FONT, int(h*0.07))
     pad = int(h*0.025)
     # background pill
-    tw, th = draw.textsize(label, font=font)
+    l, t, r, b = draw.textbbox((0,0), label, font=font)
+    tw, th = r-l, b-t
     x0, y0 = pad, pad
     draw.rounded_rectangle([x0-pad, y0-pad, x0+tw+pad, y0+th+pad], radius=int(pad*1.2), fill=(0,0,0,170))
     draw.text((x0,y0), label, fill=(255,255,255,255), font=font)
-    im.save(out_path, "PNG")
+    return im
+
+def add_countdown_label(im_path, out_path, days_left: int = 3):
+    """Overlay D-N countdown near top-left."""
+    save_image(draw_countdown_label(load_rgba(im_path), days_left), out_path, mode="RGBA")
 
 def cta_t1_teaser_copy(platform: str, season: str, segment: str) -> str:
     """Return teaser body for CTA_T1. Segment-based split."""
@@ -175,6 +212,182 @@ def cta_t1_teaser_copy(platform: str, season: str, segment: str) -> str:
         return "처음이면 지금이 기회!\n21일 + 보너스 3장 공개"
     return "처음이라면 가볍게 시작!\n21일 + 보너스 3장 공개"
 
+CTA_X264_PRESET = os.environ.get("CTA_X264_PRESET", "veryfast")  # 2s promo clip: ~30% faster than medium, similar size
+
+def _cta_zoom_boxes(w: int, h: int, n: int, zoom: float = 0.06) -> list:
+    """
+    Source crop box per frame. Resizing the (w/z, h/z) centre crop to (w, h) is the same
+    picture as upscaling by z and centre-cropping, without building the zw x zh image.
+    """
+    boxes = []
+    for t in range(n):
+        z = 1.0 + zoom * (t / max(1, n-1))
+        cw, ch = w / z, h / z
+        left, top = (w - cw) / 2, (h - ch) / 2
+        boxes.append((left, top, left + cw, top + ch))
+    return boxes
+
+def _cta_shake_offsets(n: int, shake_intensity: int) -> list:
+    amp = max(2, int(shake_intensity))
+    return [(int(((-1)**t) * (amp + (t % 4))), int(((-1)**(t+1)) * (amp + ((t+1) % 4)))) for t in range(n)]
+
+def _shift_frame(a, dx: int, dy: int):
+    """Paste a at (dx, dy) on black (same as Image.paste onto a blank canvas)."""
+    import numpy as np
+    h, w = a.shape[:2]
+    out = np.zeros_like(a)
+    out[max(0,dy):h+min(0,dy), max(0,dx):w+min(0,dx)] = a[max(0,-dy):h-max(0,dy), max(0,-dx):w-max(0,dx)]
+    return out
+
+_SPARKLE_MASKS: dict = {}
+
+def _sparkle_stamps(w: int, h: int, t: int) -> list:
+    """14 white dots moving per frame as (y0, x0, disk mask); computed once per frame, stamped on every variant."""
+    import numpy as np
+    stamps = []
+    for k in range(14):
+        x = int((w*(k+1)/15) + (t*9 + k*31) % 27 - 13)
+        y = int((h*(k+1)/15) + (t*13 + k*17) % 31 - 15)
+        r = 2 + ((t + k) % 3)
+        m = _SPARKLE_MASKS.get(r)
+        if m is None:
+            yy, xx = np.ogrid[-r:r+1, -r:r+1]
+            m = _SPARKLE_MASKS[r] = (xx*xx + yy*yy) <= r*r
+        y0, x0 = y - r, x - r
+        if y0 < 0 or x0 < 0 or y0 + 2*r >= h or x0 + 2*r >= w:
+            continue
+        stamps.append((y0, x0, m))
+    return stamps
+
+def _draw_sparkles(a, stamps: list) -> None:
+    """ImageDraw.ellipse equivalent for the precomputed stamps."""
+    for y0, x0, m in stamps:
+        n = m.shape[0]
+        a[y0:y0+n, x0:x0+n][m] = 255
+
+def _cta_static_layer(w: int, h: int, red_border: bool = False, banner_text: str = "",
+                      banner_color: tuple = (255,0,0), graph_bins: Optional[list] = None):
+    """
+    Banner, mini purchase graph and border rendered ONCE as RGBA and split into opaque
+    tiles (plain copy per frame) and the few anti-aliased edge pixels (alpha blend).
+    None if nothing is drawn.
+    """
+    import numpy as np
+    if not (red_border or banner_text or graph_bins):
+        return None
+    layer = Image.new("RGBA", (w, h), (0,0,0,0))
+    draw = ImageDraw.Draw(layer)
+
+    # warning banner
+    if banner_text:
+        banner_h = int(h*0.12)
+        draw.rectangle([0,0,w,banner_h], fill=(*banner_color, 255))
+        f = pick_font(DEFAULT_FONT, int(banner_h*0.45))
+        draw.text((int(w*0.05), int(banner_h*0.25)), banner_text, font=f, fill=(255,255,255,255))
+
+    # mini purchase graph (simple polyline)
+    bins = graph_bins or []
+    if bins:
+        g_w, g_h = int(w*0.34), int(h*0.16)
+        g_x, g_y = int(w*0.06), int(h*0.74)
+        draw.rounded_rectangle([g_x-10, g_y-10, g_x+g_w+10, g_y+g_h+10], radius=18, fill=(0,0,0,255))
+        mx = max(1, max(bins))
+        pts = []
+        for i, v in enumerate(bins):
+            px = g_x + int(i*(g_w/(max(1,len(bins)-1))))
+            py = g_y + g_h - int((v/mx)*g_h)
+            pts.append((px,py))
+        if len(pts) >= 2:
+            draw.line(pts, fill=(255,255,255,255), width=4)
+        f2 = pick_font(DEFAULT_FONT, int(h*0.03))
+        draw.text((g_x, g_y-34), "실시간 구매 그래프", font=f2, fill=(255,255,255,255))
+
+    # border
+    if red_border:
+        draw.rectangle([0,0,w-1,h-1], outline=(255,0,0,255), width=22)
+
+    arr = np.asarray(layer)
+    rgb, al = arr[..., :3], arr[..., 3]
+    # opaque pixels as 64x64 tiles: full tiles are a slice copy, partial ones a masked copy
+    tiles = []
+    T = 64
+    for y in range(0, h, T):
+        for x in range(0, w, T):
+            m = al[y:y+T, x:x+T] == 255
+            if not m.any():
+                continue
+            sl = (slice(y, y+T), slice(x, x+T))
+            tiles.append((sl, rgb[sl].copy(), None if m.all() else m[..., None].copy()))
+    edge = np.nonzero((al > 0) & (al < 255))   # anti-aliased text/line edges: few pixels
+    edge_alpha = (al[edge].astype(np.float32) / 255.0)[:, None]
+    return tiles, edge, rgb[edge].astype(np.float32), edge_alpha
+
+def _blend_static(a, static) -> None:
+    if static is None:
+        return
+    import numpy as np
+    tiles, edge, edge_rgb, edge_alpha = static
+    for sl, rgb, m in tiles:
+        if m is None:
+            a[sl] = rgb
+        else:
+            np.copyto(a[sl], rgb, where=m)
+    a[edge] = (a[edge] * (1.0 - edge_alpha) + edge_rgb * edge_alpha + 0.5).astype(a.dtype)
+
+# CTA_T1 video per urgency stage (see urgency_stage); all of them come from one decode pass
+URGENCY_VIDEO_VARIANTS: Dict[str, dict] = {
+    "NORMAL": {},
+    "H6":  {"banner_text": "마감 6시간 전", "banner_color": (255,140,0)},
+    "H3":  {"banner_text": "마감 3시간 전", "banner_color": (255,90,0)},
+    "H1":  {"banner_text": "마감 1시간 전", "banner_color": (230,0,0)},
+    "M10": {"shake": True, "red_border": True, "banner_text": "10분 후 마감", "banner_color": (230,0,0)},
+    "M1":  {"shake": True, "red_border": True, "shake_intensity": 5, "banner_text": "1분 후 마감", "banner_color": (230,0,0)},
+}
+
+def make_cta_t1_variants(story_png_path: Path, outputs: Dict[Path, dict], seconds: float = 2.0, fps: int = 30) -> List[Path]:
+    """
+    Render several CTA_T1 MP4 variants (plain / banner / shake+red border ...) from one decoded
+    story frame sequence. outputs maps mp4 path -> make_cta_t1_mp4() style options
+    (shake, red_border, shake_intensity, banner_text, banner_color, graph_bins).
+    Zoom and sparkles are computed once per frame and shared by every variant; each variant
+    streams into its own encoder.
+    Requires imageio + imageio-ffmpeg + numpy.
+    """
+    import numpy as np
+    import imageio.v2 as imageio
+    im0 = Image.open(story_png_path).convert("RGB")
+    w,h = im0.size
+    n = int(seconds * fps)
+    boxes = _cta_zoom_boxes(w, h, n)
+
+    variants = []
+    for mp4_path, o in outputs.items():
+        mp4_path = Path(mp4_path)
+        mp4_path.parent.mkdir(parents=True, exist_ok=True)
+        offsets = _cta_shake_offsets(n, o.get("shake_intensity", 3)) if o.get("shake") else None
+        static = _cta_static_layer(w, h, o.get("red_border", False), o.get("banner_text", ""),
+                                   o.get("banner_color", (255,0,0)), o.get("graph_bins"))
+        writer = imageio.get_writer(mp4_path, format="FFMPEG", fps=fps, codec="libx264", pixelformat="yuv420p",
+                                    macro_block_size=1, ffmpeg_params=["-preset", CTA_X264_PRESET])
+        variants.append((writer, offsets, static))
+    try:
+        for t in range(n):
+            base = np.array(im0.resize((w, h), Image.BICUBIC, box=boxes[t]))
+            stamps = _sparkle_stamps(w, h, t)
+            for i, (writer, offsets, static) in enumerate(variants):
+                if offsets:
+                    a = _shift_frame(base, *offsets[t])
+                else:
+                    # the last plain variant may draw on the shared frame itself
+                    a = base if i == len(variants)-1 else base.copy()
+                _draw_sparkles(a, stamps)
+                _blend_static(a, static)
+                writer.append_data(a)
+    finally:
+        for writer, _, _ in variants:
+            writer.close()
+    return [Path(p) for p in outputs]
+
 def make_cta_t1_mp4(
     story_png_path: Path,
     mp4_path: Path,
@@ -189,91 +402,22 @@ def make_cta_t1_mp4(
 ):
     """
     2s MP4: subtle zoom-in + sparkle dots, optional shake + red border + warning banner + mini graph.
+    Frames are streamed into the encoder one at a time (flat memory); zoom is a single
+    box-resize per frame, shake/sparkles are NumPy ops, static layers are rendered once.
     Requires imageio + imageio-ffmpeg + numpy.
     """
-    import numpy as np
-    import imageio.v3 as iio
-    im0 = Image.open(story_png_path).convert("RGB")
-    w,h = im0.size
-    n = int(seconds * fps)
-    frames = []
-    border = 22 if red_border else 0
-
-    # graph config
-    bins = graph_bins or []
-    g_w = int(w*0.34)
-    g_h = int(h*0.16)
-    g_x = int(w*0.06)
-    g_y = int(h*0.74)
-
-    for t in range(n):
-        z = 1.0 + 0.06 * (t / max(1, n-1))
-        zw, zh = int(w*z), int(h*z)
-        imz = im0.resize((zw, zh), Image.BICUBIC)
-        left = (zw - w)//2
-        top = (zh - h)//2
-        imc = imz.crop((left, top, left+w, top+h)).copy()
-
-        if shake:
-            amp = max(2, int(shake_intensity))
-            dx = int(((-1)**t) * (amp + (t % 4)))
-            dy = int(((-1)**(t+1)) * (amp + ((t+1) % 4)))
-            tmp = Image.new("RGB",(w,h),(0,0,0))
-            tmp.paste(imc, (dx,dy))
-            imc = tmp
-
-        draw = ImageDraw.Draw(imc)
-
-        # sparkle dots
-        for k in range(14):
-            x = int((w*(k+1)/15) + (t*9 + k*31) % 27 - 13)
-            y = int((h*(k+1)/15) + (t*13 + k*17) % 31 - 15)
-            r = 2 + ((t + k) % 3)
-            draw.ellipse([x-r,y-r,x+r,y+r], fill=(255,255,255))
-
-        # warning banner
-        if banner_text:
-            banner_h = int(h*0.12)
-            draw.rectangle([0,0,w,banner_h], fill=banner_color)
-            f = pick_font(DEFAULT_FONT, int(banner_h*0.45))
-            draw.text((int(w*0.05), int(banner_h*0.25)), banner_text, font=f, fill=(255,255,255))
-
-        # mini purchase graph (simple polyline)
-        if bins:
-            draw.rounded_rectangle([g_x-10, g_y-10, g_x+g_w+10, g_y+g_h+10], radius=18, fill=(0,0,0,140))
-            mx = max(1, max(bins))
-            pts = []
-            for i, v in enumerate(bins):
-                px = g_x + int(i*(g_w/(max(1,len(bins)-1))))
-                py = g_y + g_h - int((v/mx)*g_h)
-                pts.append((px,py))
-            if len(pts) >= 2:
-                draw.line(pts, fill=(255,255,255), width=4)
-            # label
-            f2 = pick_font(DEFAULT_FONT, int(h*0.03))
-            draw.text((g_x, g_y-34), "실시간 구매 그래프", font=f2, fill=(255,255,255))
-
-        # border
-        if red_border:
-            draw.rectangle([0,0,w-1,h-1], outline=(255,0,0), width=max(10,border))
-
-        frames.append(np.array(imc))
-
-    mp4_path.parent.mkdir(parents=True, exist_ok=True)
-    iio.imwrite(mp4_path, frames, fps=fps, codec="libx264", pixelformat="yuv420p")
+    make_cta_t1_variants(story_png_path, {mp4_path: dict(
+        shake=shake, red_border=red_border, shake_intensity=shake_intensity,
+        banner_text=banner_text, banner_color=banner_color, graph_bins=graph_bins,
+    )}, seconds=seconds, fps=fps)
 
 def pick_font(path: Optional[str], size: int):
-    if path and Path(path).exists():
-        return ImageFont.truetype(path, size=size)
-    return ImageFont.load_default()
-
-def header_index(ws):
-    hdr = [c.value for c in ws[1]]
-    idx = {}
-    for i,v in enumerate(hdr):
-        if v is None: continue
-        idx[str(v).strip().lower()] = i
-    return idx
+    # cached per (path, size): the TTF/OTF is parsed once per process, not per card/frame
+    return get_font(path, size)
+
+# sizes used by the card/badge/banner renderers at OUT_SQUARE / OUT_STORY
+RENDER_FONT_SIZES = (28, 30, 32, 48, 54, int(OUT_SQUARE[1]*0.04), int(OUT_SQUARE[1]*0.07), int(OUT_SQUARE[1]*0.09*0.42),
+                     int(OUT_STORY[1]*0.03), int(OUT_STORY[1]*0.045), int(OUT_STORY[1]*0.07), int(OUT_STORY[1]*0.12*0.45))
 
 def normalize_day(val) -> str:
     s = str(val).strip().upper()
@@ -283,9 +427,8 @@ def normalize_day(val) -> str:
     return f"DAY{int(s):02d}" if s else ""
 
 def load_cards_xlsx(path: Path, sheet: str) -> Dict[str, dict]:
-    wb = openpyxl.load_workbook(path)
-    ws = wb[sheet] if sheet in wb.sheetnames else wb.active
-    idx = header_index(ws)
+    rows = sheet_rows(read_workbook(path), sheet) or []
+    idx = header_index(rows)
     if "day" not in idx or "text" not in idx:
         raise ValueError("Cards sheet must include headers: day, text (optional: color,mood,price,cta)")
     def get(row, key):
@@ -294,7 +437,8 @@ def load_cards_xlsx(path: Path, sheet: str) -> Dict[str, dict]:
         v = row[j]
         return "" if v is None else str(v).strip()
     out = {}
-    for row in ws.iter_rows(min_row=2, values_only=True):
+    for row in rows[1:]:
+        if idx["day"] >= len(row): continue
         day = normalize_day(row[idx["day"]])
         if not day: continue
         out[day] = {
@@ -308,17 +452,17 @@ def load_cards_xlsx(path: Path, sheet: str) -> Dict[str, dict]:
 
 def load_thumb_copy_xlsx(path: Path, sheet: str) -> Dict[str,str]:
     try:
-        wb = openpyxl.load_workbook(path)
+        rows = sheet_rows(read_workbook(path), sheet, fallback_active=False)
     except Exception:
         return {}
-    if sheet not in wb.sheetnames:
+    if rows is None:
         return {}
-    ws = wb[sheet]
-    idx = header_index(ws)
+    idx = header_index(rows)
     if "variant" not in idx or "copy" not in idx:
         return {}
     out = {}
-    for row in ws.iter_rows(min_row=2, values_only=True):
+    for row in rows[1:]:
+        if max(idx["variant"], idx["copy"]) >= len(row): continue
         v = row[idx["variant"]]
         c = row[idx["copy"]]
         if not v or not c: continue
@@ -327,21 +471,55 @@ def load_thumb_copy_xlsx(path: Path, sheet: str) -> Dict[str,str]:
             out[v] = str(c).strip()
     return out
 
-def openai_img(prompt: str, out_path: Path, api_key: str, model: str, size: str):
-    url = "https://api.openai.com/v1/images/generations"
-    r = requests.post(url, headers={"Authorization": f"Bearer {api_key}"},
-                      json={"model": model, "prompt": prompt, "size": size},
-                      timeout=180)
-    if r.status_code != 200:
-        raise RuntimeError(f"Images API error {r.status_code}: {r.text[:900]}")
-    item = r.json()["data"][0]
-    if "b64_json" in item:
-        import base64
-        out_path.write_bytes(base64.b64decode(item["b64_json"]))
-    elif "url" in item:
-        out_path.write_bytes(requests.get(item["url"], timeout=180).content)
-    else:
-        raise RuntimeError("Unexpected response format")
+def openai_img(prompt: str, out_path: Path, api_key: str, model: str, size: str, cache: Optional[ImageCache] = None, slot: int = 0,
+               backend: str = DEFAULT_IMAGE_BACKEND, base_url: str = ""):
+    """
+    Generate one base image into out_path.
+    cache: content-addressed ImageCache checked before calling the API (slot = n-th card sharing this prompt).
+    backend: "openai" or a local image_backend.BACKENDS entry (e.g. "stub" for offline benchmarks).
+    base_url: Images API base (default OPENAI_BASE_URL), e.g. benchmarks/mock_images_api.py.
+    """
+    openai_img_batch(prompt, [out_path], api_key, model, size, cache=cache, slots=[slot], backend=backend, base_url=base_url)
+
+def openai_img_batch(prompt: str, out_paths: List[Path], api_key: str, model: str, size: str, cache: Optional[ImageCache] = None, slots: Optional[List[int]] = None,
+                     backend: str = DEFAULT_IMAGE_BACKEND, base_url: str = ""):
+    """
+    Generate len(out_paths) distinct images for one prompt with a single n=k request.
+    Cache hits are served first; only the misses are requested from the API.
+    """
+    slots = list(slots) if slots else list(range(len(out_paths)))
+    todo = []
+    for out_path, slot in zip(out_paths, slots):
+        key = cache_key(model, size, prompt, slot, namespace=api_namespace(base_url)) if cache else ""
+        if cache and cache.get(key, out_path):
+            continue
+        todo.append((out_path, key, slot))
+    if not todo:
+        return
+    if backend != "openai":
+        # local backend (benchmarks/offline): never written to the paid-art cache
+        for (out_path, _, _), png in zip(todo, IMAGE_BACKENDS[backend](prompt, size, [t[2] for t in todo])):
+            out_path.write_bytes(png)
+        return
+    url = images_endpoint(base_url)
+    payload = {"model": model, "prompt": prompt, "size": size}
+    if len(todo) > 1:
+        payload["n"] = len(todo)
+    # shared token bucket + backoff/Retry-After (raises RuntimeError when retries run out)
+    r = post_images(url, {"Authorization": f"Bearer {api_key}"}, payload, timeout=180, base_url=base_url)
+    items = r.json()["data"]
+    if len(items) < len(todo):
+        raise RuntimeError(f"Images API returned {len(items)} images, expected {len(todo)}")
+    for (out_path, key, _), item in zip(todo, items):
+        if "b64_json" in item:
+            import base64
+            out_path.write_bytes(base64.b64decode(item["b64_json"]))
+        elif "url" in item:
+            out_path.write_bytes(http_session().get(item["url"], timeout=180).content)
+        else:
+            raise RuntimeError("Unexpected response format")
+        if cache:
+            cache.put(key, out_path)
 
 def build_prompt(season: str, kind: str, variant: str="A", mood: str="", color: str="", price: str="", offer_code: str="") -> str:
     addon = SEASON_ADDONS.get(season,"")
@@ -402,34 +580,104 @@ def build_prompt(season: str, kind: str, variant: str="A", mood: str="", color:
         return f"{BASE_PROMPT} {addon} Conversion-focused clean layout, extra empty space. {offer_hint} {mood_extra} {color_hint} {premium_hint} {light_hint}"
     return f"{BASE_PROMPT} {addon} Card layout, extra empty space. {offer_hint} {mood_extra} {color_hint} {premium_hint} {light_hint}"
 
-def wrap_lines(draw, text, font, max_w):
-    text = (text or "").strip()
-    if not text: return []
-    if " " in text:
-        words = text.split()
-        lines, cur = [], ""
-        for w in words:
-            test = (cur + " " + w).strip()
-            if draw.textlength(test, font=font) <= max_w:
-                cur = test
+def plan_base_art(args, cards: Dict[str, dict], days: int, bonus_n: int, base_dir: Path) -> Dict[Path, str]:
+    """
+    Every base-art prompt of a run, keyed by output path, in the order main() consumes them.
+    Mirrors the thumbnail / DAYxx / CTA / BONUSxx branches of main() so the whole batch
+    can be submitted to BaseArtStage before the first card is rendered.
+    """
+    jobs: Dict[Path, str] = {}
+    oc = args.offer_code.upper()
+    variants = ["A","B","C"] if args.thumb_pick=="ALL" else [args.thumb_pick]
+    for v in variants:
+        jobs[base_dir/f"THUMB_{v}_BASE.png"] = build_prompt(args.season,"thumbnail",v, offer_code=args.offer_code)
+
+    empty = {"text":"","color":"","mood":"","price":"","cta":""}
+    for i in range(1, days+1):
+        day = f"DAY{i:02d}"
+        info = cards.get(day, empty)
+        hints = (info.get("mood",""), info.get("color",""), info.get("price",""))
+        jobs[base_dir/f"{day}_BASE.png"] = build_prompt(args.season,"card","A", *hints, offer_code=args.offer_code)
+        if args.export_story and i == days:
+            if oc == "SEASONPACK":
+                suffix = f"_{info.get('color','')}" if info.get("color","") else ""
+                for step in ("T1", "T2"):
+                    jobs[base_dir/f"{day}{suffix}_CTA_{step}_BASE.png"] = build_prompt(args.season,"cta_last_seasonpack","A", *hints, offer_code=args.offer_code)
             else:
-                if cur: lines.append(cur)
-                cur = w
-        if cur: lines.append(cur)
-        return lines
-    lines, cur = [], ""
-    for ch in text:
-        test = cur + ch
-        if draw.textlength(test, font=font) <= max_w:
-            cur = test
-        else:
-            if cur: lines.append(cur)
-            cur = ch
-    if cur: lines.append(cur)
-    return lines
+                jobs[base_dir/f"{day}_CTA_BASE.png"] = build_prompt(args.season, "cta_last", "A", *hints, offer_code=args.offer_code)
+
+    if oc == "SEASONPACK" and bonus_n > 0:
+        for j in range(1, bonus_n+1):
+            bkey = f"BONUS{j:02d}"
+            info = cards.get(bkey, {"text":"", "color":"", "mood":"프리미엄", "price":"", "cta":""})
+            jobs[base_dir/f"{bkey}_BASE.png"] = build_prompt(args.season,"card","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code)
+    return jobs
+
+def card_key(s: str) -> str:
+    """'day9' / 'DAY09' / '9' -> 'DAY09', 'bonus1' -> 'BONUS01' ('' stays '')."""
+    s = (s or "").strip().upper().replace(" ", "")
+    digits = "".join(ch for ch in s if ch.isdigit())
+    if not digits:
+        return s
+    return f"{'BONUS' if s.startswith('BONUS') else 'DAY'}{int(digits):02d}"
+
+def card_qr_url(args, key: str) -> str:
+    utm = urlencode({
+        "utm_source": args.platform,
+        "utm_medium": "social",
+        "utm_campaign": args.utm_campaign,
+        "utm_content": f"{args.mode}_{key.lower()}",
+    })
+    return f"{args.base_url}?{utm}"
+
+def plan_qr_urls(args, days: int, bonus_n: int) -> List[str]:
+    """The run's UTM set (DAYxx + BONUSxx), so every QR tile can be rendered once up front."""
+    keys = [f"DAY{i:02d}" for i in range(1, days+1)]
+    if args.offer_code.upper() == "SEASONPACK":
+        keys += [f"BONUS{j:02d}" for j in range(1, bonus_n+1)]
+    return [card_qr_url(args, k) for k in keys]
+
+def prompt_slots(jobs: Dict[Path, str]) -> Dict[Path, int]:
+    """n-th occurrence of each identical prompt (0,1,2...) -> stable cache slot per card."""
+    seen: Dict[str, int] = {}
+    slots: Dict[Path, int] = {}
+    for p, prompt in jobs.items():
+        slots[p] = seen.get(prompt, 0)
+        seen[prompt] = slots[p] + 1
+    return slots
 
-def render_square_card(base_path: Path, out_path: Path, title: str, body: str, mood: str, color: str, font_path: Optional[str]):
-    im = Image.open(base_path).convert("RGBA").resize(OUT_SQUARE, Image.LANCZOS)
+def wrap_lines(draw, text, font, max_w):
+    # words if the copy has spaces, else per character (Hangul); cached advances + binary search
+    return wrap_text(text, font, max_w)
+
+# ---------- in-memory compositing ----------
+# Every overlay has a draw_*(im, ...) form that mutates/returns one RGBA image, and the
+# historical add_*(in_path, out_path, ...) form as a thin load -> draw -> save wrapper.
+# Multi-step cards (CTA_T1/T2) go through composite() and are encoded once with save_image().
+
+def load_rgba(src, size: Optional[Tuple[int,int]] = None) -> Image.Image:
+    """Path or PIL image -> RGBA copy (optionally resized with LANCZOS)."""
+    im = src.convert("RGBA") if isinstance(src, Image.Image) else Image.open(src).convert("RGBA")
+    if size and im.size != tuple(size):
+        im = im.resize(size, Image.LANCZOS)
+    return im
+
+def composite(src, ops, size: Optional[Tuple[int,int]] = None) -> Image.Image:
+    """Pass one RGBA image through a list of overlay ops (callables im -> im). No disk I/O."""
+    im = load_rgba(src, size)
+    for op in ops:
+        im = op(im) or im
+    return im
+
+def save_image(im: Image.Image, out_path: Path, mode: str = "RGB") -> Path:
+    """Encode an exported card with the run's --image_format/--quality/--png_compress_level."""
+    return image_export().save(im, out_path, mode)
+
+def out_image(p: Path) -> Path:
+    """Deliverable path with the export suffix (.png/.webp/.jpg); base art stays PNG."""
+    return image_export().path(p)
+
+def draw_square_card(im: Image.Image, title: str, body: str, mood: str, color: str, font_path: Optional[str]) -> Image.Image:
     draw = ImageDraw.Draw(im)
     c = (50,44,40,255)
     f_title = pick_font(font_path, 48)
@@ -450,9 +698,93 @@ def render_square_card(base_path: Path, out_path: Path, title: str, body: str, m
         for ln in wrap_lines(draw, para, f_body, max_w):
             draw.text((x,y), ln, font=f_body, fill=c)
             y += f_body.size + 10
+    return im
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    im.convert("RGB").save(out_path, "PNG")
+def render_square_card(base_path: Path, out_path: Path, title: str, body: str, mood: str, color: str, font_path: Optional[str]):
+    im = draw_square_card(load_rgba(base_path, OUT_SQUARE), title, body, mood, color, font_path)
+    save_image(im, out_path)
+
+@dataclass
+class CardSpec:
+    """One DAYxx/BONUSxx render job for RenderStage (picklable; built from the Cards row, offer plan and mode)."""
+    key: str
+    base: Path
+    square: Path
+    text: str = ""
+    mood: str = ""
+    color: str = ""
+    font_path: Optional[str] = None
+    lock: Optional[Path] = None     # free mode: QR + price/CTA overlay
+    qr_url: str = ""
+    price: str = ""
+    cta: str = ""
+    story: Optional[Path] = None    # --export_story
+    story_preset: str = "center"
+    stages: Tuple[str, ...] = ()    # stages to (re)render; the rest are reused from disk
+    export: ImageExport = ImageExport()
+    profile: bool = False           # --profile: time stages, return the samples
+    cprofile: Optional[Path] = None # --profile_render: cProfile dump for this card
+
+def card_stages(spec: CardSpec) -> Dict[str, Tuple[List[Path], tuple]]:
+    """stage -> (outputs, manifest inputs), in render order square -> lock -> story."""
+    st = {"square": ([spec.square], (spec.base, spec.key, spec.text, spec.mood, spec.color, spec.font_path, spec.export))}
+    if spec.lock:
+        st["lock"] = ([spec.lock], (spec.square, spec.qr_url, spec.price, spec.cta, spec.font_path, spec.export))
+    if spec.story:
+        st["story"] = ([spec.story], (spec.lock or spec.square, spec.story_preset, spec.export))
+    return st
+
+def plan_card_stages(manifest: RunManifest, spec: CardSpec) -> Tuple[str, ...]:
+    """Stages the manifest says must run; everything downstream of a re-rendered stage runs too."""
+    run: List[str] = []
+    for stage, (outputs, inputs) in card_stages(spec).items():
+        if run or manifest.need(spec.key, stage, outputs, *inputs):
+            run.append(stage)
+    return tuple(run)
+
+def card_outputs(spec: CardSpec) -> List[Path]:
+    return [p for outputs, _ in card_stages(spec).values() for p in outputs]
+
+def record_card_stages(manifest: RunManifest, spec: CardSpec) -> None:
+    stages = card_stages(spec)
+    for stage in spec.stages:
+        outputs, inputs = stages[stage]
+        manifest.record(spec.key, stage, outputs, *inputs)
+
+def render_card(spec: CardSpec) -> List[Sample]:
+    """
+    RenderStage worker: square -> LOCK -> 9:16 story of one card in memory, each output encoded once.
+    Module-level so ProcessPoolExecutor can pickle it by reference.
+    Returns the card's stage timings when spec.profile is set (workers can't write main()'s timer).
+    """
+    set_image_export(spec.export)  # worker processes don't see main()'s setting
+    timer = StageTimer(enabled=spec.profile)
+    prof = None
+    if spec.cprofile is not None:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+    try:
+        sq = lk = None
+        if "square" in spec.stages:
+            with timer.stage("render_square_card", spec.key):
+                sq = draw_square_card(load_rgba(spec.base, OUT_SQUARE), spec.key, spec.text, spec.mood, spec.color, spec.font_path)
+                save_image(sq, spec.square)
+        if spec.lock and "lock" in spec.stages:
+            with timer.stage("add_qr_price_cta_square", spec.key):
+                lk = draw_qr_price_cta(sq.copy() if sq is not None else load_rgba(spec.square), spec.qr_url, spec.price, spec.cta, spec.font_path)
+                save_image(lk, spec.lock)
+        if spec.story and "story" in spec.stages:
+            with timer.stage("square_to_story", spec.key):
+                src = lk if spec.lock else sq
+                if src is None:
+                    src = load_rgba(spec.lock or spec.square)
+                save_image(square_to_story(src, spec.story_preset), spec.story)
+    finally:
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(str(spec.cprofile))
+    return timer.samples
 
 
 def _load_json(path: str) -> dict:
@@ -499,101 +831,21 @@ def make_bonus_card(out_dir: Path, bonus_key: str, theme: str, font_path: str |
         body = "VIP 혜택 오픈!\n오늘의 마음을 더 예쁘게 채워드릴게요."
     # background
     bg = Image.new("RGB", OUT_SQUARE, (252, 249, 244))
-    sq = out_dir/f"{bonus_key.replace(' ','_')}.png"
-    render_square_card(bg, sq, title, body, "", "", font_path)
+    sq = out_image(out_dir/f"{bonus_key.replace(' ','_')}.png")
+    ops = [lambda im: draw_square_card(im, title, body, "", "", font_path)]
     if theme == "gold":
-        add_ribbon_badge(sq, sq, "VIP BONUS", theme="gold")
+        ops.append(lambda im: draw_ribbon_badge(im, "VIP BONUS", theme="gold"))
     if qr_url:
         # reuse teaser QR helper (label adjusted)
-        add_teaser_qr(sq, sq, qr_url, label="다운로드")
-    st = square_to_story(Image.open(sq).convert("RGB"), preset_story)
-    st_path = out_dir/f"{bonus_key.replace(' ','_')}_9x16.png"
-    st.save(st_path, "PNG")
+        ops.append(lambda im: draw_teaser_qr(im, qr_url, label="다운로드"))
+    im = composite(bg, ops, size=OUT_SQUARE)
+    save_image(im, sq)
+    st_path = save_image(square_to_story(im, preset_story), out_dir/f"{bonus_key.replace(' ','_')}_9x16.png")
     return {"square": str(sq), "story": str(st_path)}
 
-def write_message_payload(out_dir: Path, filename: str, platform: str, tier: str, coupon_code: str, bonus_link: str, bonus_story_link: str, segment: str):
+def write_message_payload(out_dir: Path, filename: str, platform: str, tier: str, coupon_code: str, bonus_link: str, bonus_story_link: str, segment: str,
+                          profile_link_url: str = "", profile_link_map: Optional[Dict[str, str]] = None):
     """
-# optional: send via API (Kakao AlimTalk / SMS / IG DM)
-try:
-    if args.send_messages and args.sender != "off":
-        
-# IG/TikTok: use comment+landing funnel instead of DM (more stable)
-if args.funnel_mode == "comment_landing" and args.platform.lower() in ["instagram","tiktok"]:
-    out_dir = Path(args.out_dir)
-    payload_path = out_dir/args.message_out
-    pl = json.loads(payload_path.read_text(encoding="utf-8"))
-    # comment reply + pinned comment templates
-    comment = build_comment_reply_payload(pl, args.platform)
-    write_json(out_dir/"comment_reply_payload.json", comment)
-    # landing redirect (optional)
-    if args.landing_destination_url:
-        landing = build_landing_payload(pl, args.landing_destination_url)
-        write_json(out_dir/"landing_payload.json", landing)
-        
-
-# generate landing variants with coupon copy + optional tracking
-coupon_code = pl.get("coupon_code","")
-landing_files = write_landing_html_variants(
-    out_dir,
-    args.landing_destination_url,
-    coupon_code=coupon_code,
-    variants=args.landing_variants,
-    track_url=args.landing_track_url,
-)
-profile_link_url = ""
-profile_link_map = {}
-if args.upload_landing:
-    try:
-        profile_link_map = upload_landing_variants_s3(
-            landing_files,
-            bucket=args.s3_bucket,
-            prefix=args.landing_s3_prefix,
-            public_url_base=args.s3_public_url_base,
-        )
-        # choose A as default profile link
-        profile_link_url = profile_link_map.get("landing_A.html","")
-    except Exception:
-        profile_link_url = ""
-        profile_link_map = {}
-    send_res = {"channel":"comment_landing", "success": True, "result": {"comment_reply_payload":"comment_reply_payload.json", "landing_variants": [p.name for p in landing_files]}}
-                                # write A/B report placeholder (actual comparison computed by server)
-                                try:
-                                    (out_dir/"landing_ab_report.json").write_text(json.dumps({"variants": list(profile_link_map.keys()), "note": "Run server_loyalty.py /report to compute conversion by variant."}, ensure_ascii=False, indent=2), encoding="utf-8")
-                                except Exception:
-                                    pass
-else:
-    send_res = dispatch_send(
-        sender=args.sender,
-        payload_path=Path(args.out_dir)/args.message_out,
-        config_path=Path(args.sender_config),
-        dry_run=args.dry_run,
-        fallback_sms_on_fail=args.fallback_sms_on_fail,
-    )
-# log to xlsx
-try:
-    append_send_log_xlsx(
-        Path(args.log_xlsx),
-        {
-            "ts": now_kst_iso(),
-            "platform": args.platform,
-            "segment": args.segment,
-            "offer": args.offer_code,
-            "tier": (bonus_info.get("tier","") if "bonus_info" in locals() else ""),
-            "sender": args.sender,
-            "funnel_mode": args.funnel_mode,
-            "success": bool(send_res.get("success", False)),
-            "channel_used": send_res.get("channel",""),
-            "bonus_link": json.loads((Path(args.out_dir)/args.message_out).read_text(encoding="utf-8")).get("bonus_link",""),
-            "coupon_code": json.loads((Path(args.out_dir)/args.message_out).read_text(encoding="utf-8")).get("coupon_code",""),
-            "raw": json.dumps(send_res, ensure_ascii=False)[:30000],
-        },
-        sheet_name=args.log_sheet
-    )
-except Exception:
-    pass
-except Exception:
-    pass
-
     Writes a JSON with message templates (for DM/알림톡/문자/메일 등 외부 발송 시스템에 그대로 전달).
     """
     # platform-specific wording
@@ -610,11 +862,93 @@ except Exception:
         "bonus_link": bonus_link,
         "bonus_story_link": bonus_story_link,
         "profile_link_url": profile_link_url,
-        "profile_link_map": profile_link_map,
+        "profile_link_map": profile_link_map or {},
         "message_ko": f"{hook}\n보너스 카드: {bonus_link}\n스토리용: {bonus_story_link}\n쿠폰코드: {coupon_code}",
     }
     (out_dir/filename).write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
 
+def send_bonus_messages(args, tier: str) -> dict:
+    """
+    Deliver the message payload (--message_out) and log the attempt to --log_xlsx.
+    IG/TikTok with --funnel_mode comment_landing: comment reply + landing pages instead of a DM
+    (more stable); otherwise dispatch_send() through --sender.
+    """
+    out_dir = Path(args.out_dir)
+    payload_path = out_dir/args.message_out
+    pl = json.loads(payload_path.read_text(encoding="utf-8"))
+    # IG/TikTok: use comment+landing funnel instead of DM (more stable)
+    if args.funnel_mode == "comment_landing" and args.platform.lower() in ["instagram","tiktok"]:
+        # comment reply + pinned comment templates
+        comment = build_comment_reply_payload(pl, args.platform)
+        write_json(out_dir/"comment_reply_payload.json", comment)
+        # landing redirect (optional)
+        if args.landing_destination_url:
+            landing = build_landing_payload(pl, args.landing_destination_url)
+            write_json(out_dir/"landing_payload.json", landing)
+
+        # generate landing variants with coupon copy + optional tracking
+        landing_files = write_landing_html_variants(
+            out_dir,
+            args.landing_destination_url,
+            coupon_code=pl.get("coupon_code",""),
+            variants=args.landing_variants,
+            track_url=args.landing_track_url,
+        )
+        profile_link_url = ""
+        profile_link_map = {}
+        if args.upload_landing:
+            try:
+                profile_link_map = upload_landing_variants_s3(
+                    landing_files,
+                    bucket=args.s3_bucket,
+                    prefix=args.landing_s3_prefix,
+                    public_url_base=args.s3_public_url_base,
+                )
+                # choose A as default profile link
+                profile_link_url = profile_link_map.get("landing_A.html","")
+            except Exception:
+                profile_link_url = ""
+                profile_link_map = {}
+        pl.update(profile_link_url=profile_link_url, profile_link_map=profile_link_map)
+        payload_path.write_text(json.dumps(pl, ensure_ascii=False, indent=2), encoding="utf-8")
+        # write A/B report placeholder (actual comparison computed by server)
+        try:
+            (out_dir/"landing_ab_report.json").write_text(json.dumps({"variants": list(profile_link_map.keys()), "note": "Run server_loyalty.py /report to compute conversion by variant."}, ensure_ascii=False, indent=2), encoding="utf-8")
+        except Exception:
+            pass
+        send_res = {"channel":"comment_landing", "success": True, "result": {"comment_reply_payload":"comment_reply_payload.json", "landing_variants": [p.name for p in landing_files]}}
+    else:
+        send_res = dispatch_send(
+            sender=args.sender,
+            payload_path=payload_path,
+            config_path=Path(args.sender_config),
+            dry_run=args.dry_run,
+            fallback_sms_on_fail=args.fallback_sms_on_fail,
+        )
+    # log to xlsx
+    try:
+        append_send_log_xlsx(
+            Path(args.log_xlsx),
+            {
+                "ts": now_kst_iso(),
+                "platform": args.platform,
+                "segment": args.segment,
+                "offer": args.offer_code,
+                "tier": tier,
+                "sender": args.sender,
+                "funnel_mode": args.funnel_mode,
+                "success": bool(send_res.get("success", False)),
+                "channel_used": send_res.get("channel",""),
+                "bonus_link": pl.get("bonus_link",""),
+                "coupon_code": pl.get("coupon_code",""),
+                "raw": json.dumps(send_res, ensure_ascii=False)[:30000],
+            },
+            sheet_name=args.log_sheet
+        )
+    except Exception as e:
+        print("WARN: send log not written:", e, file=sys.stderr)
+    return send_res
+
 def compute_time_left(deadline_date: str, deadline_time: str) -> tuple[int, float, float, bool]:
     """
     Returns (raw_days, hours_left, minutes_left, expired)
@@ -744,12 +1078,11 @@ def price_scale_from_counter(n: int) -> float:
     # 1.00 ~ 1.70
     return min(1.70, 1.00 + max(0, n-10) / 80.0)
 
-def add_ribbon_badge(im_path: Path, out_path: Path, text: str, theme: str="normal"):
+def draw_ribbon_badge(im: Image.Image, text: str, theme: str="normal") -> Image.Image:
     """
-    Add a commerce-style ribbon/badge at top-right.
+    Commerce-style ribbon/badge at top-right.
     theme: normal=black, gold=gold.
     """
-    im = Image.open(im_path).convert("RGBA")
     draw = ImageDraw.Draw(im)
     w,h = im.size
     bg = (0,0,0,180) if theme=="normal" else (212,175,55,220)  # gold
@@ -762,33 +1095,58 @@ def add_ribbon_badge(im_path: Path, out_path: Path, text: str, theme: str="norma
     draw.rounded_rectangle([x1,y1,x1+bw,y1+bh], radius=24, fill=bg)
     f = pick_font(DEFAULT_FONT, int(bh*0.42))
     draw.text((x1+24, y1+int(bh*0.22)), text, font=f, fill=fg)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    im.save(out_path, "PNG")
+    return im
 
-def add_teaser_qr(im_path: Path, out_path: Path, url: str, label: str = "알림 신청"):
-    im = Image.open(im_path).convert("RGBA")
+def add_ribbon_badge(im_path: Path, out_path: Path, text: str, theme: str="normal"):
+    """
+    Add a commerce-style ribbon/badge at top-right.
+    theme: normal=black, gold=gold.
+    """
+    save_image(draw_ribbon_badge(load_rgba(im_path), text, theme), out_path, mode="RGBA")
+
+def draw_commerce_badge(im: Image.Image, text: str, ribbon: bool=True) -> Image.Image:
+    """
+    SEASONPACK CTA badge (LIMITED / 오늘 마감 / BEST VALUE ...).
+    ribbon=True: full-width strip under the top badges, else a pill at top-center.
+    """
+    draw = ImageDraw.Draw(im)
+    w,h = im.size
+    f = pick_font(DEFAULT_FONT, int(h*0.04))
+    if ribbon:
+        y0 = int(h*0.12)
+        bh = int(h*0.065)
+        draw.rectangle([0, y0, w, y0+bh], fill=(200,30,60,220))
+        tw = draw.textlength(text, font=f)
+        draw.text((int((w-tw)/2), y0+int(bh*0.18)), text, font=f, fill=(255,255,255,255))
+    else:
+        tw = int(draw.textlength(text, font=f))
+        x0 = (w - tw)//2 - 24
+        y0 = int(h*0.12)
+        draw.rounded_rectangle([x0, y0, x0+tw+48, y0+int(h*0.065)], radius=24, fill=(200,30,60,220))
+        draw.text((x0+24, y0+int(h*0.012)), text, font=f, fill=(255,255,255,255))
+    return im
+
+def add_commerce_badge(im_path: Path, out_path: Path, text: str, ribbon: bool=True):
+    save_image(draw_commerce_badge(load_rgba(im_path), text, ribbon), out_path)
+
+def draw_teaser_qr(im: Image.Image, url: str, label: str = "알림 신청") -> Image.Image:
     draw = ImageDraw.Draw(im)
     if url:
-        qr = qrcode.QRCode(box_size=6, border=2)
-        qr.add_data(url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB").resize((260,260), Image.NEAREST)
+        qr_img = qr_tile(url, TEASER_QR_SIZE)
         xy = (OUT_SQUARE[0]-260-60, OUT_SQUARE[1]-260-80)
         im.paste(qr_img, xy)
         f = pick_font(DEFAULT_FONT, 30)
         draw.rounded_rectangle([xy[0]-20, xy[1]-60, xy[0]+260+20, xy[1]-12], radius=18, fill=(0,0,0,160))
         draw.text((xy[0]+70, xy[1]-55), label, font=f, fill=(255,255,255,255))
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    im.convert("RGB").save(out_path, "PNG")
+    return im
 
-def add_qr_price_cta_square(square_path: Path, out_path: Path, qr_url: str, price_text: str, cta_text: str, font_path: Optional[str], price_scale: float=1.0):
-    im = Image.open(square_path).convert("RGBA")
+def add_teaser_qr(im_path: Path, out_path: Path, url: str, label: str = "알림 신청"):
+    save_image(draw_teaser_qr(load_rgba(im_path), url, label), out_path)
+
+def draw_qr_price_cta(im: Image.Image, qr_url: str, price_text: str, cta_text: str, font_path: Optional[str], price_scale: float=1.0) -> Image.Image:
     draw = ImageDraw.Draw(im)
 
-    qr = qrcode.QRCode(box_size=6, border=2)
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB").resize((240,240), Image.NEAREST)
+    qr_img = qr_tile(qr_url, CTA_QR_SIZE)
     qr_xy = (720, 700)
     im.paste(qr_img, qr_xy)
 
@@ -797,14 +1155,38 @@ def add_qr_price_cta_square(square_path: Path, out_path: Path, qr_url: str, pric
     tx, ty = qr_xy[0]-380, qr_xy[1]+30
     if price_text: draw.text((tx,ty), price_text, font=f, fill=c)
     if cta_text:   draw.text((tx,ty+44), cta_text, font=f, fill=c)
+    return im
+
+def add_qr_price_cta_square(square_path: Path, out_path: Path, qr_url: str, price_text: str, cta_text: str, font_path: Optional[str], price_scale: float=1.0):
+    save_image(draw_qr_price_cta(load_rgba(square_path), qr_url, price_text, cta_text, font_path, price_scale), out_path)
+
+def draw_live_counter(im: Image.Image, msg: str) -> Image.Image:
+    """'최근 5분 N명 · 30분 M명 구매 중' pill at the bottom of a 9:16 story."""
+    w,h = im.size
+    draw = ImageDraw.Draw(im)
+    fnt = pick_font(DEFAULT_FONT, int(h*0.045))
+    draw.rounded_rectangle([60, h-170, w-60, h-90], radius=26, fill=(0,0,0,180))
+    draw.text((90, h-160), msg, font=fnt, fill=(255,255,255,255))
+    return im
 
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    im.convert("RGB").save(out_path, "PNG")
+STORY_BG_SCALE = 4        # blur at 1/4 resolution: GaussianBlur(18) at 1080x1920 ~= GaussianBlur(4.5) at 270x480
+
+def story_background(square_rgb: Image.Image) -> Image.Image:
+    """
+    Blurred 9:16 backdrop: downscale -> blur -> bicubic upscale.
+    vs. the old full-res LANCZOS + GaussianBlur(18): mean |diff| ~0.3-0.4/255, max ~20/255 on
+    high-frequency art (not visible under the card).
+    """
+    small = (OUT_STORY[0]//STORY_BG_SCALE, OUT_STORY[1]//STORY_BG_SCALE)
+    bg = square_rgb.convert("RGB").resize(small, Image.BILINEAR, reducing_gap=2.0)
+    bg = bg.filter(ImageFilter.GaussianBlur(18/STORY_BG_SCALE))
+    return bg.resize(OUT_STORY, Image.BICUBIC)
 
 def square_to_story(square_rgb: Image.Image, preset: str) -> Image.Image:
-    fg = square_rgb.resize((1080,1080), Image.LANCZOS)
-    bg = fg.resize(OUT_STORY, Image.LANCZOS).filter(ImageFilter.GaussianBlur(18))
-    canvas = bg.copy()
+    fg = square_rgb.convert("RGB")
+    if fg.size != (1080,1080):
+        fg = fg.resize((1080,1080), Image.LANCZOS)
+    canvas = story_background(fg)
     if preset == "top":
         y = 90
     elif preset == "bottom":
@@ -814,7 +1196,97 @@ def square_to_story(square_rgb: Image.Image, preset: str) -> Image.Image:
     canvas.paste(fg, (0,y))
     return canvas
 
-def main():
+class GenerateError(RuntimeError):
+    """Bad configuration / environment (no API key, ...): the CLI prints it and exits 1."""
+
+
+@dataclass
+class GenerateConfig:
+    """
+    Typed input of generate(): the common run_generate.py flags by name; any other flag goes
+    in options by its argparse dest (e.g. {"cta_t1_video": True, "story_preset": "top"}).
+    """
+    season: str
+    xlsx: Path
+    platform: str = "instagram"
+    format: str = "reels"
+    mode: str = "paid"
+    offer_code: str = "D21"
+    days: int = 21
+    bonus: int = 0
+    segment: str = "new"
+    sheet: str = "Cards"
+    thumb_pick: str = "ALL"
+    export_story: bool = False
+    base_url: str = "https://example.com/buy"
+    utm_campaign: str = "winter_teaser"
+    font_path: str = ""
+    out_dir: Path = Path("outputs")
+    base_dir: str = ""
+    only: str = ""                 # "DAY09": just that card
+    image_backend: str = DEFAULT_IMAGE_BACKEND
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    def namespace(self) -> argparse.Namespace:
+        """Parser defaults overlaid with this config; choices are validated like the CLI does."""
+        ap = build_parser()
+        choices = {a.dest: a.choices for a in ap._actions if a.choices}
+        # argparse reports bad values with SystemExit(2): never let that out of a library call
+        if self.season not in choices["season"]:
+            raise GenerateError(f"season={self.season!r} not in {list(choices['season'])}")
+        try:
+            args = ap.parse_args([f"--season={self.season}", f"--xlsx={self.xlsx}"])  # "=": an xlsx path may start with "-"
+        except SystemExit as e:
+            raise GenerateError(f"invalid season/xlsx: {self.season!r}, {str(self.xlsx)!r}") from e
+        values = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "options"}
+        values.update(self.options)
+        for k, v in values.items():
+            if not hasattr(args, k):
+                raise GenerateError(f"unknown run_generate option: {k}")
+            if k in choices and v not in choices[k]:
+                raise GenerateError(f"{k}={v!r} not in {list(choices[k])}")
+            setattr(args, k, str(v) if isinstance(v, Path) else v)
+        return args
+
+
+@dataclass
+class GenerateResult:
+    out_root: Path
+    zip_path: Optional[Path]
+    outputs: Dict[str, Dict[str, List[Path]]]  # card (DAY09, THUMBNAIL_A, ...) -> stage -> files (run manifest)
+    files: List[Path]                          # every file of the run (= ZIP members)
+
+    def find(self, card: str, stage: str = "square") -> Optional[Path]:
+        """First output of card/stage, e.g. find("DAY09") -> the DAY09 square card."""
+        paths = self.outputs.get(card, {}).get(stage) or []
+        return paths[0] if paths else None
+
+
+_GENERATE_LOCK = threading.Lock()
+
+
+def generate(config: GenerateConfig) -> GenerateResult:
+    """
+    Library entry point: one run in this process, no subprocess / argv / output scraping.
+    Not re-entrant: the export codec and stage timer are process-wide, so run one at a time
+    per process. Calls from several threads are serialized here; for parallel runs use
+    separate worker processes.
+    """
+    args = config.namespace()
+    with _GENERATE_LOCK:
+        return run(args)
+
+
+def main(argv: Optional[List[str]] = None) -> GenerateResult:
+    """CLI (argv=None reads sys.argv): a thin wrapper around run()."""
+    try:
+        return run(build_parser().parse_args(argv))
+    except GenerateError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def build_parser() -> argparse.ArgumentParser:
     ap = argparse.ArgumentParser()
     ap.add_argument("--season", choices=list(SEASON_ADDONS.keys()), required=True)
     ap.add_argument("--platform", choices=["instagram","tiktok"], default="instagram")
@@ -829,6 +1301,7 @@ def main():
     ap.add_argument("--deadline_time", type=str, default="23:59", help="HH:MM local time; used for hour/min countdown")
     ap.add_argument("--urgency_video", action="store_true", help="swap CTA_T1 video at 6h/3h/1h before deadline")
     ap.add_argument("--shock_10min", action="store_true", help="if <=10min left, make red border + shake CTA_T1 video")
+    ap.add_argument("--urgency_video_all", action="store_true", help="render CTA_T1 video for every urgency stage (NORMAL/H6/H3/H1/M10/M1) in one pass")
     ap.add_argument("--live_counter", action="store_true", help="at <=30min left show buying-now counter & enlarge price")
     ap.add_argument("--live_counter_source", choices=["pseudo","webhook"], default="pseudo", help="pseudo=time-based, webhook=real order count from server_webhook.py")
     ap.add_argument("--webhook_state_file", type=str, default=os.environ.get("WEBHOOK_STATE_FILE","./live_counter_state.json"), help="state json file written by webhook server")
@@ -885,186 +1358,221 @@ def main():
     ap.add_argument("--utm_campaign", default="winter_teaser")
     ap.add_argument("--font_path", default="")
     ap.add_argument("--out_dir", default="outputs")
-    args = ap.parse_args()
+    ap.add_argument("--only", default="", help="render just this card (DAY09 / BONUS01): its base art + square card, no LOCK/story variants, thumbnails, CTA or other days")
+    ap.add_argument("--base_dir", default="", help="shared base-art folder (default: <run>/base_art); art already there for the same prompt is reused, not regenerated")
+    ap.add_argument("--image_backend", choices=backend_names(), default=DEFAULT_IMAGE_BACKEND, help="base art source: openai (paid API) or stub (deterministic local images, no network)")
+    ap.add_argument("--api_base_url", default=OPENAI_BASE_URL, help="Images API base URL (env OPENAI_BASE_URL); e.g. http://127.0.0.1:8089/v1 for benchmarks/mock_images_api.py")
+    ap.add_argument("--gen_workers", type=int, default=DEFAULT_GEN_WORKERS, help="parallel Images API requests for base art (1 = serial, 0 = on the card loop's own thread)")
+    ap.add_argument("--image_format", choices=list(FORMATS), default="png", help="codec for exported cards/stories/LOCK/CTA/bonus (base art stays PNG)")
+    ap.add_argument("--quality", type=int, default=90, help="webp/jpeg quality")
+    ap.add_argument("--png_compress_level", type=int, default=6, help="PNG zlib level 0-9 (lower = faster encode, bigger files)")
+    ap.add_argument("--render_workers", type=int, default=DEFAULT_RENDER_WORKERS, help="processes for per-card PIL rendering (default: available cores, 1 = inline)")
+    ap.add_argument("--cache_dir", default=DEFAULT_CACHE_DIR, help="content-addressed base art cache (model+size+prompt)")
+    ap.add_argument("--cache_max_mb", type=int, default=DEFAULT_CACHE_MAX_MB, help="LRU size bound for --cache_dir")
+    ap.add_argument("--no_cache", action="store_true", help="always call the Images API (cache neither read nor written)")
+    ap.add_argument("--batch_n", type=int, default=DEFAULT_BATCH_N, help="max images per request when cards share a prompt (n=k; 1 = no grouping)")
+    ap.add_argument("--profile", action="store_true", help="time every stage (API, render, LOCK, story, video, upload, zip) -> timings.json in the run folder")
+    ap.add_argument("--profile_render", action="store_true", help="cProfile the card render phase -> render.prof in the run folder (python -m pstats)")
+    ap.add_argument("--resume", action="store_true", help="skip stages recorded in run_manifest.json whose outputs exist and inputs are unchanged")
+    return ap
+
+
+def run(args: argparse.Namespace) -> GenerateResult:
+    """
+    One generator run for parsed args (main() / generate()).
+    On any failure the render pool and base-art threads are shut down and the partial
+    <run>.zip.part is removed, so a failed server job leaks nothing into the next one.
+    """
+    with ExitStack() as cleanup:
+        return _run(args, cleanup)
+
 
-raw_days_t, h_left, m_left, expired_time = compute_time_left(args.deadline, args.deadline_time)
-# keep day-based expired from existing logic too; expired_time is more precise
+def _run(args: argparse.Namespace, cleanup: ExitStack) -> GenerateResult:
+    set_image_export(ImageExport(args.image_format, args.quality, args.png_compress_level))
+    set_stage_timer(StageTimer(enabled=args.profile))
+
+    raw_days_t, h_left, m_left, expired_time = compute_time_left(args.deadline, args.deadline_time)
 
     api_key = os.environ.get("OPENAI_API_KEY","").strip()
-    if not api_key:
-        print("ERROR: Please set OPENAI_API_KEY", file=sys.stderr)
-        sys.exit(1)
+    if not api_key and args.image_backend == "openai":
+        raise GenerateError("Please set OPENAI_API_KEY")
 
-    
-# compute countdown (D-N)
-cd, raw_delta, expired = compute_deadline_info(args.deadline, args.countdown_days)
-cards = load_cards_xlsx(Path(args.xlsx), args.sheet)
+    # compute countdown (D-N)
+    cd, raw_delta, expired = compute_deadline_info(args.deadline, args.countdown_days)
+    # keep day-based expired from existing logic too; expired_time is more precise
+    expired = expired or expired_time
+    cards = load_cards_xlsx(Path(args.xlsx), args.sheet)
 
     # offer plan
     days, bonus_n, offer_label = offer_plan(args.offer_code, args.season, args.days, args.bonus)
 
-# auto hide / switch seasonpack if expired
-
-if args.offer_code.upper() == "SEASONPACK" and expired:
-    # After deadline: optionally generate next-season teaser immediately (no CTA)
-    if args.auto_teaser and args.next_season:
-        season_kr = {"spring":"봄","summer":"여름","autumn":"가을","winter":"겨울"}.get(args.next_season, args.next_season)
-        teaser_sq = Path(args.out_dir)/"TEASER_SQ.png"
-        teaser_st = Path(args.out_dir)/"TEASER_9x16.png"
-        # simple clean teaser background
-        base = Image.new("RGB", OUT_SQUARE, (250,247,242))
-        render_square_card(base, teaser_sq, f"{season_kr} 시즌팩 예고", "곧 공개됩니다\n알림 받고 가장 먼저 받기", "", "", args.font)
-        if args.teaser_url:
-            add_teaser_qr(teaser_sq, teaser_sq, args.teaser_url, label="알림 신청")
-        # story teaser (center)
-        st = square_to_story(Image.open(teaser_sq).convert("RGB"), args.story_last_preset_seasonpack)
-        st.save(teaser_st, "PNG")
-        return
-
-    if args.next_season:
-        args.season = args.next_season
-        if args.next_deadline:
-            args.deadline = args.next_deadline
-        # recompute countdown for next season
-        cd, raw_delta, expired = compute_deadline_info(args.deadline, args.countdown_days)
-    else:
-        # hide season pack: downgrade to D21 (no bonus)
-        args.offer_code = "D21"
-        days, bonus_n, offer_label = offer_plan(args.offer_code, args.season, args.days, args.bonus)
+    # live purchase state (server webhook) -> bonus / coupon tier
+    state = read_webhook_state_ext(args.webhook_state_file) if args.live_counter_source=='webhook' else {}
+    bonus_info = {"tier":"light","bonus":"","coupon":"","benefit_line":"","theme":"normal"}
+    if args.dynamic_offer and args.live_counter and args.live_counter_source=='webhook':
+        bonus_info = decide_bonus_coupon(state)
+
+    # auto hide / switch seasonpack if expired
+    if args.offer_code.upper() == "SEASONPACK" and expired:
+        # After deadline: optionally generate next-season teaser immediately (no CTA)
+        if args.auto_teaser and args.next_season:
+            season_kr = SEASON_KR.get(args.next_season, args.next_season)
+            ensure_dir(Path(args.out_dir))
+            teaser_sq = out_image(Path(args.out_dir)/"TEASER_SQ.png")
+            teaser_st = out_image(Path(args.out_dir)/"TEASER_9x16.png")
+            # simple clean teaser background
+            base = Image.new("RGB", OUT_SQUARE, (250,247,242))
+            render_square_card(base, teaser_sq, f"{season_kr} 시즌팩 예고", "곧 공개됩니다\n알림 받고 가장 먼저 받기", "", "", args.font_path or None)
+            if args.teaser_url:
+                add_teaser_qr(teaser_sq, teaser_sq, args.teaser_url, label="알림 신청")
+            # story teaser (center)
+            save_image(square_to_story(Image.open(teaser_sq).convert("RGB"), args.story_last_preset_seasonpack), teaser_st)
+            print("DONE:", teaser_sq)
+            return GenerateResult(Path(args.out_dir), None, {"TEASER": {"square": [teaser_sq], "story": [teaser_st]}}, [teaser_sq, teaser_st])
+
+        if args.next_season:
+            args.season = args.next_season
+            if args.next_deadline:
+                args.deadline = args.next_deadline
+            # recompute countdown for next season
+            cd, raw_delta, expired = compute_deadline_info(args.deadline, args.countdown_days)
+        else:
+            # hide season pack: downgrade to D21 (no bonus)
+            args.offer_code = "D21"
+            days, bonus_n, offer_label = offer_plan(args.offer_code, args.season, args.days, args.bonus)
 
     thumb_copy = thumb_copy_for_offer(args.offer_code, args.season)
     # allow spreadsheet override (optional)
     thumb_copy.update(load_thumb_copy_xlsx(Path(args.xlsx), args.thumb_sheet))
 
+    # --only DAY09: one card (1 image request instead of thumbnail + every day)
+    only = card_key(args.only)
+    valid = {f"DAY{i:02d}" for i in range(1, days+1)}
+    if args.offer_code.upper() == "SEASONPACK":
+        valid |= {f"BONUS{j:02d}" for j in range(1, bonus_n+1)}
+    if only and only not in valid:
+        raise GenerateError(f"--only {args.only}: not a card of {args.offer_code} ({days} days, {bonus_n} bonus)")
+
     out_root = Path(args.out_dir)/f"{date.today().isoformat()}_{args.season}_{args.platform}_{args.mode}_{args.offer_code}"
     ensure_dir(out_root)
-    base_dir = out_root/"base_art"
+    base_dir = Path(args.base_dir) if args.base_dir else out_root/"base_art"
     ensure_dir(base_dir)
 
+    # write bonus/coupon decision snapshot
+    if args.export_story and args.dynamic_offer and args.live_counter_source=='webhook' and not only:
+        try:
+            (Path(args.out_dir)/"BONUS_RULES.txt").write_text(
+                f"tier={bonus_info.get('tier')}\nbonus={bonus_info.get('bonus')}\ncoupon={bonus_info.get('coupon')}\ntheme={bonus_info.get('theme')}\n",
+                encoding='utf-8'
+            )
+        except Exception:
+            pass
+
     font_path = args.font_path if args.font_path else None
+    preload_fonts(font_path, RENDER_FONT_SIZES)
+
+    # Base art: submit every prompt up front; cards below block only on the image they need next
+    manifest = RunManifest(out_root, resume=args.resume)
+    # a shared --base_dir keeps its own manifest, always checked: art made by an earlier run
+    # (other platform/segment, same prompt) is reused; per-run bases stay in the run manifest
+    base_manifest = RunManifest(base_dir, resume=True) if args.base_dir else manifest
+    base_manifest_for = lambda p: base_manifest if p.parent == base_dir else manifest
+    # the cache only holds paid-for API art; local backends are never cached
+    cache = None if (args.no_cache or args.image_backend != "openai") else ImageCache(Path(args.cache_dir), args.cache_max_mb)
+    jobs = plan_base_art(args, cards, days, bonus_n, base_dir)
+    if only:
+        jobs = {p: prompt for p, prompt in jobs.items() if p.stem == f"{only}_BASE"}
+    slots = prompt_slots(jobs)
+
+    def fetch_base(prompt: str, paths: List[Path]):
+        todo = [p for p in paths if base_manifest_for(p).need(p.stem.replace("_BASE",""), "base", [p], MODEL, API_SIZE, prompt)]
+        if todo:
+            t = time.perf_counter()
+            openai_img_batch(prompt, todo, api_key, MODEL, API_SIZE, cache=cache, slots=[slots.get(p, 0) for p in todo], backend=args.image_backend, base_url=args.api_base_url)
+            for p in todo:  # one request may carry several cards (n=k): split its time evenly
+                stage_timer().add("openai_img", p.stem.replace("_BASE",""), (time.perf_counter() - t) / len(todo))
+        for p in todo:
+            base_manifest_for(p).record(p.stem.replace("_BASE",""), "base", [p])
+
+    # cleanup callbacks are no-ops once the normal path below has closed / published them
+    art_stage = BaseArtStage(fetch_base, workers=args.gen_workers, batch_n=args.batch_n)
+    cleanup.callback(art_stage.close, cancel=True)
+    art_stage.submit_all(jobs)
+    render_stage = RenderStage(render_card, workers=args.render_workers)
+    cleanup.callback(render_stage.close, cancel=True)
+    archive = RunArchive(out_root.with_suffix(".zip"), out_root)
+    cleanup.callback(archive.abort)
+    # per-card cProfile dumps live outside the run folder (never in the ZIP); merged into render.prof
+    prof_dir = Path(tempfile.mkdtemp(prefix="render_prof_")) if args.profile_render else None
+    if prof_dir is not None:
+        cleanup.callback(shutil.rmtree, prof_dir, ignore_errors=True)
+    def add_to_zip(spec: CardSpec):
+        with stage_timer().stage("zip", spec.key):
+            archive.add_many(card_outputs(spec))
+    precompute_qr([card_qr_url(args, only)] if only else plan_qr_urls(args, days, bonus_n), [CTA_QR_SIZE])
 
     # Thumbnails (pick)
     variants = ["A","B","C"] if args.thumb_pick=="ALL" else [args.thumb_pick]
+    if only:
+        variants = []
     for v in variants:
         base = base_dir/f"THUMB_{v}_BASE.png"
-        openai_img(build_prompt(args.season,"thumbnail",v, offer_code=args.offer_code), base, api_key, MODEL, API_SIZE)
-        sq = Image.open(base).convert("RGB").resize(OUT_SQUARE, Image.LANCZOS)
-        draw = ImageDraw.Draw(sq)
-        f = pick_font(font_path, 54)
-        draw.text((80,120), thumb_copy.get(v,""), font=f, fill=(50,44,40))
-        sq_path = out_root/f"THUMBNAIL_{v}.png"
-        sq.save(sq_path, "PNG")
+        art_stage.result(build_prompt(args.season,"thumbnail",v, offer_code=args.offer_code), base)
+        sq_path = out_image(out_root/f"THUMBNAIL_{v}.png")
+        if manifest.need(f"THUMBNAIL_{v}", "square", [sq_path], base, thumb_copy.get(v,""), font_path, image_export()):
+            sq = Image.open(base).convert("RGB").resize(OUT_SQUARE, Image.LANCZOS)
+            draw = ImageDraw.Draw(sq)
+            f = pick_font(font_path, 54)
+            draw.text((80,120), thumb_copy.get(v,""), font=f, fill=(50,44,40))
+            save_image(sq, sq_path)
+            manifest.record(f"THUMBNAIL_{v}", "square", [sq_path])
         if args.export_story:
-            # write bonus/coupon decision snapshot
-            try:
-                if args.dynamic_offer and args.live_counter_source=='webhook':
-                    info_txt = Path(args.out_dir)/"BONUS_RULES.txt"
-                    info_txt.write_text(
-                        f"tier={bonus_info.get('tier')}\nbonus={bonus_info.get('bonus')}\ncoupon={bonus_info.get('coupon')}\ntheme={bonus_info.get('theme')}\n",
-                        encoding='utf-8'
-                    )
-            except Exception:
-                pass
-# generate actual bonus card assets + message payload (tier-based)
-try:
-    if args.generate_bonus_cards:
-        tier = bonus_info.get("tier","light")
-        theme = bonus_info.get("theme","normal")
-        coupon_code = ""
-        if args.coupon_mode == "local_random":
-            coupon_code = issue_coupon_local(args.coupon_state_file, tier)
-        # decide which bonus to generate
-        bonus_key = bonus_info.get("bonus","")
-        bonus_link = ""
-        if bonus_key in ["BONUS DAY10","BONUS DAY11"]:
-            bonus_assets = make_bonus_card(Path(args.out_dir), bonus_key, theme, args.font, args.story_last_preset_seasonpack, qr_url="")
-            # link placeholder (replace with S3/Drive URL in your sender)
-            
-# upload bonus assets and inject real URL
-local_files = [Path(bonus_assets["square"]), Path(bonus_assets["story"])]
-url_map = upload_bonus_assets(
-    args.upload_backend,
-    local_files,
-    bucket=args.s3_bucket,
-    prefix=args.s3_prefix,
-    public_url_base=args.s3_public_url_base,
-    presign_seconds=args.s3_presign_seconds,
-    folder_id=args.gdrive_folder_id,
-    sa_json_path=args.gdrive_service_account_json,
-)
-bonus_link = url_map.get(Path(bonus_assets["square"]).name, bonus_assets["square"])
-        write_message_payload(Path(args.out_dir), args.message_out, args.platform, tier, coupon_code, bonus_link, url_map.get(Path(bonus_assets['story']).name, bonus_assets['story']) if 'bonus_assets' in locals() else '', args.segment)
-except Exception:
-    pass
-
-
-            square_to_story(sq, args.story_preset).save(out_root/f"THUMBNAIL_{v}_9x16.png","PNG")
+            st_path = out_image(out_root/f"THUMBNAIL_{v}_9x16.png")
+            if manifest.need(f"THUMBNAIL_{v}", "story", [st_path], sq_path, args.story_preset, image_export()):
+                save_image(square_to_story(Image.open(sq_path).convert("RGB"), args.story_preset), st_path)
+                manifest.record(f"THUMBNAIL_{v}", "story", [st_path])
 
     # Day cards
-    from urllib.parse import urlencode
     cards_dir = out_root/args.season.upper()
     ensure_dir(cards_dir)
     last_day = f"DAY{days:02d}"
 
     for i in range(1, days+1):
         day = f"DAY{i:02d}"
+        if only and day != only:
+            continue
         info = cards.get(day, {"text":"","color":"","mood":"","price":"","cta":""})
         suffix = f"_{info.get('color','')}" if info.get("color","") else ""
         base = base_dir/f"{day}_BASE.png"
-        openai_img(build_prompt(args.season,"card", "A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code), base, api_key, MODEL, API_SIZE)
-
-        square_path = cards_dir/f"{day}{suffix}.png"
-        render_square_card(base, square_path, day, info.get("text",""), info.get("mood",""), info.get("color",""), font_path)
+        art_stage.result(build_prompt(args.season,"card", "A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code), base)
 
-        utm = urlencode({
-            "utm_source": args.platform,
-            "utm_medium": "social",
-            "utm_campaign": args.utm_campaign,
-            "utm_content": f"{args.mode}_{day.lower()}",
-        })
-        qr_url = f"{args.base_url}?{utm}"
+        square_path = out_image(cards_dir/f"{day}{suffix}.png")
+        qr_url = card_qr_url(args, day)
+        spec = CardSpec(day, base, square_path, info.get("text",""), info.get("mood",""), info.get("color",""), font_path, qr_url=qr_url, export=image_export(),
+                        profile=args.profile, cprofile=prof_dir/f"{day}.prof" if prof_dir else None)
 
         square_to_export = square_path
-        if args.mode=="free" and i!=1:
-            locked = cards_dir/f"{day}{suffix}_LOCK.png"
+        if args.mode=="free" and i!=1 and not only:
+            locked = out_image(cards_dir/f"{day}{suffix}_LOCK.png")
             price = info.get("price","") or "3,900원 · 오늘만"
             cta = info.get("cta","") or ("즉시 다운로드" if args.platform=="instagram" else "지금 안 사면 놓쳐요")
-            add_qr_price_cta_square(square_path, locked, qr_url, price, cta, font_path)
+            spec.lock, spec.price, spec.cta = locked, price, cta
             square_to_export = locked
 
-        if args.export_story:
-            # write bonus/coupon decision snapshot
-            try:
-                if args.dynamic_offer and args.live_counter_source=='webhook':
-                    info_txt = Path(args.out_dir)/"BONUS_RULES.txt"
-                    info_txt.write_text(
-                        f"tier={bonus_info.get('tier')}\nbonus={bonus_info.get('bonus')}\ncoupon={bonus_info.get('coupon')}\ntheme={bonus_info.get('theme')}\n",
-                        encoding='utf-8'
-                    )
-            except Exception:
-                pass
-
-            sq_img = Image.open(square_to_export).convert("RGB")
+        if args.export_story and not only:
             preset = args.story_last_preset if day==last_day else args.story_preset
-            story = square_to_story(sq_img, preset)
-            story.save(cards_dir/square_to_export.name.replace(".png","_9x16.png"), "PNG")
-
-            if day==last_day:
-                # Dedicated CTA cut
-                cta_base = base_dir/f"{day}_CTA_BASE.png"
-                cta_kind = "cta_last_seasonpack" if args.offer_code.upper()=="SEASONPACK" else "cta_last"
-                openai_img(build_prompt(args.season, cta_kind, "A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code), cta_base, api_key, MODEL, API_SIZE)
-                cta_sq = cards_dir/f"{day}{suffix}_CTA.png"
-                
-
-# CTA (story last cut) – SEASONPACK 2-step CTA
-if args.offer_code.upper() == "SEASONPACK":
-    title, body, price, cta = seasonpack_cta_copy(args.platform, args.season, cd, args.segment)
-            benefit_line = ""
-
-bonus_info = {"tier":"light","bonus":"","coupon":"","benefit_line":"","theme":"normal"}
-if args.dynamic_offer and args.live_counter and args.live_counter_source=='webhook':
-    bonus_info = decide_bonus_coupon(state)
+            spec.story = out_image(cards_dir/f"{square_to_export.stem}_9x16.png")
+            spec.story_preset = preset
+
+        spec.stages = plan_card_stages(manifest, spec)
+        render_stage.submit(spec, on_done=add_to_zip)
+
+        if not (args.export_story and day==last_day and not only):
+            continue
+
+        # CTA (story last cut) – SEASONPACK 2-step CTA
+        if args.offer_code.upper() == "SEASONPACK":
+            title, body, price, cta = seasonpack_cta_copy(args.platform, args.season, cd, args.segment)
             if args.dynamic_offer and args.live_counter and args.live_counter_source=='webhook':
                 price, benefit_line = decide_dynamic_offer(state, price)
                 if benefit_line:
@@ -1072,142 +1580,193 @@ if args.dynamic_offer and args.live_counter and args.live_counter_source=='webho
                 if bonus_info.get('benefit_line'):
                     body = body + "\n" + bonus_info['benefit_line']
 
-    # CTA Step 1: Teaser
-    cta1_base = cards_dir/f"{day}{suffix}_CTA_T1_BASE.png"
-    openai_img(build_prompt(args.season,"cta_last_seasonpack","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code),
-              cta1_base, api_key, MODEL, API_SIZE)
-    cta1_sq = cards_dir/f"{day}{suffix}_CTA_T1.png"
-    render_square_card(cta1_base, cta1_sq, title, seasonpack_cta_t1_teaser_by_stage(cd, args.platform, args.segment), info.get("mood",""), info.get("color",""), font_path)
-    badge1 = "오늘 마감" if cd <= 0 else ("내일 마감" if cd <= 1 else "LIMITED")
-            add_commerce_badge(cta1_sq, cta1_sq, badge1, ribbon=True)
-    square_to_story(Image.open(cta1_sq).convert("RGB"), args.story_last_preset_seasonpack)                .save(cards_dir/f"{day}{suffix}_CTA_T1_9x16.png","PNG")
-
-    # CTA Step 2: Conversion
-    cta2_base = cards_dir/f"{day}{suffix}_CTA_T2_BASE.png"
-    openai_img(build_prompt(args.season,"cta_last_seasonpack","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code),
-              cta2_base, api_key, MODEL, API_SIZE)
-    cta2_sq = cards_dir/f"{day}{suffix}_CTA_T2.png"
-    render_square_card(cta2_base, cta2_sq, title, body, info.get("mood",""), info.get("color",""), font_path)
-    
-live_n = None
-scale = 1.0
-if args.live_counter and m_left <= 30:
-    
-state = read_webhook_state_ext(args.webhook_state_file) if args.live_counter_source=='webhook' else {}
-live_30 = int(state.get("count_30min", -1))
-live_5 = int(state.get("count_5min", -1))
-high_hit = bool(state.get("high_amount_hit", False))
-            high_recent = bool(state.get("high_amount_recent", False))
-            bins30 = state.get("bins_30min", [])
-if live_30 < 0:
-    live_30 = buying_now_counter()
-if live_5 < 0:
-    live_5 = max(1, live_30//3)
-live_n = live_30
-                if live_n < 0:
-                    live_n = buying_now_counter()
-    scale = price_scale_from_counter(live_n)
-add_qr_price_cta_square(cta2_sq, cta2_sq, qr_url, price, cta, font_path, price_scale=scale)
+            # CTA Step 1: Teaser
+            cta1_base = base_dir/f"{day}{suffix}_CTA_T1_BASE.png"
+            art_stage.result(build_prompt(args.season,"cta_last_seasonpack","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code),
+                      cta1_base)
+            cta1_sq = out_image(cards_dir/f"{day}{suffix}_CTA_T1.png")
+            cta1_story = out_image(cards_dir/f"{day}{suffix}_CTA_T1_9x16.png")
+            teaser = seasonpack_cta_t1_teaser_by_stage(cd, args.platform, args.segment)
+            badge1 = "오늘 마감" if cd <= 0 else ("내일 마감" if cd <= 1 else "LIMITED")
+            if manifest.need(f"{day}_CTA_T1", "cta", [cta1_sq, cta1_story], cta1_base, title, teaser, badge1, info, font_path, args.story_last_preset_seasonpack, image_export()):
+                # single in-memory pass: base -> copy -> badge, encoded once per output
+                im1 = composite(cta1_base, [
+                    lambda im: draw_square_card(im, title, teaser, info.get("mood",""), info.get("color",""), font_path),
+                    lambda im: draw_commerce_badge(im, badge1, ribbon=True),
+                ], size=OUT_SQUARE)
+                save_image(im1, cta1_sq)
+                save_image(square_to_story(im1, args.story_last_preset_seasonpack), cta1_story)
+                manifest.record(f"{day}_CTA_T1", "cta", [cta1_sq, cta1_story])
+
+            # CTA Step 2: Conversion
+            cta2_base = base_dir/f"{day}{suffix}_CTA_T2_BASE.png"
+            art_stage.result(build_prompt(args.season,"cta_last_seasonpack","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code),
+                      cta2_base)
+            cta2_sq = out_image(cards_dir/f"{day}{suffix}_CTA_T2.png")
+            cta2_story = out_image(cards_dir/f"{day}{suffix}_CTA_T2_9x16.png")
+
+            live_n = live_5 = live_30 = None
+            scale = 1.0
+            show_live = args.live_counter and m_left <= 30
+            if show_live:
+                live_30 = int(state.get("count_30min", -1))
+                live_5 = int(state.get("count_5min", -1))
+                if live_30 < 0:
+                    live_30 = buying_now_counter()
+                if live_5 < 0:
+                    live_5 = max(1, live_30//3)
+                live_n = live_30
+                scale = price_scale_from_counter(live_n)
+
             # ribbon badge (coupon/bonus)
+            coupon_ops = []
             if bonus_info.get('coupon'):
-                add_ribbon_badge(cta2_sq, cta2_sq, f"쿠폰 {bonus_info['coupon']}", theme=bonus_info.get('theme','normal'))
-    badge2 = "마지막 기회" if cd <= 0 else ("곧 마감" if cd <= 3 else "BEST VALUE")
-            add_commerce_badge(cta2_sq, cta2_sq, badge2, ribbon=True)
-    square_to_story(Image.open(cta2_sq).convert("RGB"), args.story_last_preset_seasonpack)                .save(cards_dir/f"{day}{suffix}_CTA_T2_9x16.png","PNG")
-
-            # countdown label on CTA_T2 square + story
-            add_countdown_label(cta2_sq, cta2_sq, cd)
-            add_countdown_label(cards_dir/f"{day}{suffix}_CTA_T2_9x16.png", cards_dir/f"{day}{suffix}_CTA_T2_9x16.png", cd)
-
-# live counter overlay (<=30min)
-if args.live_counter and m_left <= 30:
-    n2 = live_n if live_n is not None else (read_webhook_counter(args.webhook_state_file) if args.live_counter_source=='webhook' else buying_now_counter())
-                if n2 < 0:
-                    n2 = buying_now_counter()
-    imx = Image.open(cards_dir/f"{day}{suffix}_CTA_T2_9x16.png").convert("RGBA")
-    drawx = ImageDraw.Draw(imx)
-    msg = f"최근 5분 {live_5}명 · 30분 {live_30}명 구매 중"
-    fnt = pick_font(DEFAULT_FONT, int(OUT_STORY[1]*0.045))
-    drawx.rounded_rectangle([60, OUT_STORY[1]-170, OUT_STORY[0]-60, OUT_STORY[1]-90], radius=26, fill=(0,0,0,180))
-    drawx.text((90, OUT_STORY[1]-160), msg, font=fnt, fill=(255,255,255,255))
-    imx.save(cards_dir/f"{day}{suffix}_CTA_T2_9x16.png","PNG")
-            if bonus_info.get('coupon'):
-                add_ribbon_badge(cards_dir/f"{day}{suffix}_CTA_T2_9x16.png", cards_dir/f"{day}{suffix}_CTA_T2_9x16.png", f"쿠폰 {bonus_info['coupon']}", theme=bonus_info.get('theme','normal'))
+                coupon_ops.append(lambda im: draw_ribbon_badge(im, f"쿠폰 {bonus_info['coupon']}", theme=bonus_info.get('theme','normal')))
+            badge2 = "마지막 기회" if cd <= 0 else ("곧 마감" if cd <= 3 else "BEST VALUE")
+
+            if manifest.need(f"{day}_CTA_T2", "cta", [cta2_sq, cta2_story], cta2_base, title, body, info, price, cta, qr_url, scale, live_5, live_30,
+                             bonus_info.get('coupon'), bonus_info.get('theme'), badge2, cd, font_path, args.story_last_preset_seasonpack, image_export()):
+                # render -> QR/price -> ribbon -> commerce badge, all in memory
+                sq2 = composite(cta2_base, [
+                    lambda im: draw_square_card(im, title, body, info.get("mood",""), info.get("color",""), font_path),
+                    lambda im: draw_qr_price_cta(im, qr_url, price, cta, font_path, price_scale=scale),
+                    *coupon_ops,
+                    lambda im: draw_commerce_badge(im, badge2, ribbon=True),
+                ], size=OUT_SQUARE)
+
+                # story: countdown label + live counter overlay (<=30min), then encode once
+                story_ops = [lambda im: draw_countdown_label(im, cd)]
+                if show_live:
+                    story_ops.append(lambda im: draw_live_counter(im, f"최근 5분 {live_5}명 · 30분 {live_30}명 구매 중"))
+                    story_ops += coupon_ops
+                save_image(composite(square_to_story(sq2, args.story_last_preset_seasonpack), story_ops), cta2_story)
+                # countdown label on CTA_T2 square
+                save_image(draw_countdown_label(sq2, cd), cta2_sq)
+                manifest.record(f"{day}_CTA_T2", "cta", [cta2_sq, cta2_story])
 
             # CTA_T1 mp4 (optional)
-            
-if args.cta_t1_video:
-    stage = urgency_stage(m_left, h_left, args.urgency_video, args.shock_10min)
-    mp4_path = cards_dir/f"{day}{suffix}_CTA_T1_9x16_{stage}.mp4"
-    make_cta_t1_mp4(
-        cards_dir/f"{day}{suffix}_CTA_T1_9x16.png",
-        mp4_path,
-        seconds=2.0,
-        fps=30,
-        shake=(stage=="M10"),
-        red_border=(stage=="M10"),
-    )
-
-else:
-    pass(cards_dir/f"{day}{suffix}_CTA_9x16.png","PNG")
-
-
-# Bonus cards (SEASONPACK)
-if args.offer_code.upper() == "SEASONPACK" and bonus_n > 0:
-    for j in range(1, bonus_n+1):
-        bkey = f"BONUS{j:02d}"
-        info = cards.get(bkey, {"text": f"보너스 카드 {j:02d} · 시즌팩 구매자 전용", "color":"", "mood":"프리미엄", "price":"", "cta":""})
-        suffix = f"_{info.get('color','')}" if info.get("color","") else ""
-        base = base_dir/f"{bkey}_BASE.png"
-        openai_img(build_prompt(args.season,"card","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code),
-                  base, api_key, MODEL, API_SIZE)
-
-        square_path = cards_dir/f"{bkey}{suffix}.png"
-        render_square_card(base, square_path, bkey, info.get("text",""), info.get("mood",""), info.get("color",""), font_path)
-
-        utm = urlencode({
-            "utm_source": args.platform,
-            "utm_medium": "social",
-            "utm_campaign": args.utm_campaign,
-            "utm_content": f"{args.mode}_{bkey.lower()}",
-        })
-        qr_url = f"{args.base_url}?{utm}"
-
-        square_to_export = square_path
-        if args.mode=="free":
-            locked = cards_dir/f"{bkey}{suffix}_LOCK.png"
-            price = info.get("price","") or "12,900원 · 시즌팩"
+            if args.cta_t1_video:
+                stage = urgency_stage(m_left, h_left, args.urgency_video, args.shock_10min)
+                # --urgency_video_all: every stage at once, so the scheduler only swaps files as the deadline nears
+                stages = list(URGENCY_VIDEO_VARIANTS) if args.urgency_video_all else [stage]
+                videos = {cards_dir/f"{day}{suffix}_CTA_T1_9x16_{s}.mp4": URGENCY_VIDEO_VARIANTS[s] for s in stages}
+                if manifest.need(f"{day}_CTA_T1", "video", list(videos), cta1_story, stages, URGENCY_VIDEO_VARIANTS):
+                    with stage_timer().stage("make_cta_t1_mp4", f"{day}_CTA_T1"):
+                        make_cta_t1_variants(cta1_story, videos, seconds=2.0, fps=30)
+                    manifest.record(f"{day}_CTA_T1", "video", list(videos))
+        else:
+            # Dedicated CTA cut
+            cta_base = base_dir/f"{day}_CTA_BASE.png"
+            art_stage.result(build_prompt(args.season, "cta_last", "A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code), cta_base)
+            cta_sq = out_image(cards_dir/f"{day}{suffix}_CTA.png")
+            cta_story = out_image(cards_dir/f"{day}{suffix}_CTA_9x16.png")
+            title = f"{offer_label} 카드 · 지금 시작"
+            price = info.get("price","") or "3,900원 · 오늘만"
             cta = info.get("cta","") or ("즉시 다운로드" if args.platform=="instagram" else "지금 안 사면 놓쳐요")
-            add_qr_price_cta_square(square_path, locked, qr_url, price, cta, font_path)
-            square_to_export = locked
-
-        if args.export_story:
-            # write bonus/coupon decision snapshot
-            try:
-                if args.dynamic_offer and args.live_counter_source=='webhook':
-                    info_txt = Path(args.out_dir)/"BONUS_RULES.txt"
-                    info_txt.write_text(
-                        f"tier={bonus_info.get('tier')}\nbonus={bonus_info.get('bonus')}\ncoupon={bonus_info.get('coupon')}\ntheme={bonus_info.get('theme')}\n",
-                        encoding='utf-8'
+            if manifest.need(f"{day}_CTA", "cta", [cta_sq, cta_story], cta_base, title, info, qr_url, price, cta, font_path, args.story_last_preset, image_export()):
+                im = composite(cta_base, [
+                    lambda im: draw_square_card(im, title, info.get("text",""), info.get("mood",""), info.get("color",""), font_path),
+                    lambda im: draw_qr_price_cta(im, qr_url, price, cta, font_path),
+                ], size=OUT_SQUARE)
+                save_image(im, cta_sq)
+                save_image(square_to_story(im, args.story_last_preset), cta_story)
+                manifest.record(f"{day}_CTA", "cta", [cta_sq, cta_story])
+
+    # Bonus cards (SEASONPACK)
+    if args.offer_code.upper() == "SEASONPACK" and bonus_n > 0:
+        for j in range(1, bonus_n+1):
+            bkey = f"BONUS{j:02d}"
+            if only and bkey != only:
+                continue
+            info = cards.get(bkey, {"text": f"보너스 카드 {j:02d} · 시즌팩 구매자 전용", "color":"", "mood":"프리미엄", "price":"", "cta":""})
+            suffix = f"_{info.get('color','')}" if info.get("color","") else ""
+            base = base_dir/f"{bkey}_BASE.png"
+            art_stage.result(build_prompt(args.season,"card","A", info.get("mood",""), info.get("color",""), info.get("price",""), offer_code=args.offer_code),
+                      base)
+
+            square_path = out_image(cards_dir/f"{bkey}{suffix}.png")
+            qr_url = card_qr_url(args, bkey)
+            spec = CardSpec(bkey, base, square_path, info.get("text",""), info.get("mood",""), info.get("color",""), font_path, qr_url=qr_url, export=image_export(),
+                            profile=args.profile, cprofile=prof_dir/f"{bkey}.prof" if prof_dir else None)
+
+            square_to_export = square_path
+            if args.mode=="free" and not only:
+                locked = out_image(cards_dir/f"{bkey}{suffix}_LOCK.png")
+                price = info.get("price","") or "12,900원 · 시즌팩"
+                cta = info.get("cta","") or ("즉시 다운로드" if args.platform=="instagram" else "지금 안 사면 놓쳐요")
+                spec.lock, spec.price, spec.cta = locked, price, cta
+                square_to_export = locked
+
+            if args.export_story and not only:
+                spec.story = out_image(cards_dir/f"{square_to_export.stem}_9x16.png")
+                spec.story_preset = args.story_preset
+
+            spec.stages = plan_card_stages(manifest, spec)
+            render_stage.submit(spec, on_done=add_to_zip)
+
+    # generate actual bonus card assets + message payload (tier-based)
+    if args.generate_bonus_cards and not only:
+        try:
+            tier = bonus_info.get("tier","light")
+            theme = bonus_info.get("theme","normal")
+            coupon_code = ""
+            if args.coupon_mode == "local_random":
+                coupon_code = issue_coupon_local(args.coupon_state_file, tier)
+            # decide which bonus to generate
+            bonus_key = bonus_info.get("bonus","")
+            bonus_link = bonus_story_link = ""
+            if bonus_key in ["BONUS DAY10","BONUS DAY11"]:
+                bonus_assets = make_bonus_card(Path(args.out_dir), bonus_key, theme, font_path, args.story_last_preset_seasonpack, qr_url="")
+                # upload bonus assets and inject real URL (local path when --upload_backend off)
+                local_files = [Path(bonus_assets["square"]), Path(bonus_assets["story"])]
+                with stage_timer().stage("upload", bonus_key):
+                    url_map = upload_bonus_assets(
+                        args.upload_backend,
+                        local_files,
+                        require_stable_urls=args.require_stable_urls,
+                        bucket=args.s3_bucket,
+                        prefix=args.s3_prefix,
+                        public_url_base=args.s3_public_url_base,
+                        presign_seconds=args.s3_presign_seconds,
+                        folder_id=args.gdrive_folder_id,
+                        sa_json_path=args.gdrive_service_account_json,
                     )
-            except Exception:
-                pass
-
-            sq_img = Image.open(square_to_export).convert("RGB")
-            story = square_to_story(sq_img, args.story_preset)
-            story.save(cards_dir/square_to_export.name.replace(".png","_9x16.png"), "PNG")
-
-    # ZIP
-    zip_path = out_root.with_suffix(".zip")
-    with zipfile.ZipFile(zip_path,"w",zipfile.ZIP_DEFLATED) as z:
-        for p in sorted(out_root.rglob("*")):
-            if p.is_file():
-                z.write(p, arcname=str(p.relative_to(out_root)))
+                bonus_link = url_map.get(local_files[0].name, bonus_assets["square"])
+                bonus_story_link = url_map.get(local_files[1].name, bonus_assets["story"])
+            write_message_payload(Path(args.out_dir), args.message_out, args.platform, tier, coupon_code, bonus_link, bonus_story_link, args.segment)
+            # optional: send via API (Kakao AlimTalk / SMS / IG DM)
+            if args.send_messages and args.sender != "off":
+                send_bonus_messages(args, tier)
+        except Exception as e:
+            print("WARN: bonus cards / messages skipped:", e, file=sys.stderr)
+
+    # collect card renders in submission order (deterministic manifest)
+    for spec, samples in render_stage.results():
+        record_card_stages(manifest, spec)
+        stage_timer().extend(samples)
+    render_stage.close()
+    art_stage.close()
+
+    # ZIP: card files are already in; add the rest (thumbnails, CTA cuts, videos, manifest) and publish
+    with stage_timer().stage("zip"):
+        zip_path = archive.close()
+    if prof_dir is not None:
+        print("PROFILE:", merge_profiles(sorted(prof_dir.glob("*.prof")), out_root/"render.prof"))
+    if args.profile:
+        print("TIMINGS:", stage_timer().write(out_root/"timings.json"))
     print("DONE:", zip_path)
+    outputs = {card: {stage: [Path(p) for p in e.get("outputs", [])] for stage, e in stages.items()}
+               for card, stages in manifest.data["cards"].items()}
+    for p in jobs:  # base art (may live in a shared --base_dir outside the run folder)
+        outputs.setdefault(p.stem.replace("_BASE",""), {})["base"] = [p]
+    result = GenerateResult(out_root, zip_path, outputs, [out_root/a for a in sorted(archive.added)])
+    if only:
+        card = result.find(only)
+        if card is None:
+            raise GenerateError(f"--only {only}: no such card in this run (check --days/--bonus)")
+        print("CARD:", card)
+    return result
 
 if __name__ == "__main__":
-    main()from send_dispatch import dispatch_send
-from log_to_sheet import append_send_log_xlsx, now_kst_iso
-from funnel_tools import build_comment_reply_payload, build_landing_payload, write_json, write_landing_html, write_landing_html_variants
-from uploaders import upload_bonus_assets, upload_landing_html_s3, upload_landing_variants_s3
+    main()
 
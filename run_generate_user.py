@@ -5,17 +5,20 @@ run_generate_user.py
 Safe wrapper around run_generate.py.
 - Reads user assets dir from --assets_dir (wrapper-only) and exposes it as env vars.
 - Collects wrapper-only outputs: zip_out, preview_html, hook_tone, cta_tone.
+- run_inprocess(argv): same, but run_generate.main() in the calling process (user_app generate_week).
 """
 import os
 import sys
 import subprocess
+import traceback
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent
 
-def main(argv=None):
-    argv = list(sys.argv[1:] if argv is None else argv)
-    env = dict(os.environ)
+def split_args(argv):
+    """wrapper-only flags -> ALLOKI_* env vars; returns (env vars, argv for run_generate.py)."""
+    argv = list(argv)
+    env = {}
 
     def pop_arg(flag, takes_value=True):
         nonlocal argv
@@ -48,7 +51,41 @@ def main(argv=None):
         env["ALLOKI_HOOK_TONE"] = str(hook_tone)
     if cta_tone:
         env["ALLOKI_CTA_TONE"] = str(cta_tone)
+    return env, argv
+
+def run_inprocess(argv):
+    """
+    Same as main() but calls run_generate.main() in this process (no interpreter per run):
+    fonts, QR tiles, the parsed Cards sheet and story backgrounds stay warm across calls.
+    """
+    env, argv = split_args(argv)
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    cwd = os.getcwd()
+    os.chdir(ROOT)  # relative paths resolve like the subprocess (cwd=ROOT)
+    try:
+        if str(ROOT) not in sys.path:
+            sys.path.insert(0, str(ROOT))
+        import run_generate
+        run_generate.main(argv)
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception:
+        # same contract as the subprocess: one failed run is a non-zero rc, not a crash of the caller
+        traceback.print_exc()
+        return 1
+    finally:
+        os.chdir(cwd)
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
 
+def main(argv=None):
+    extra, argv = split_args(sys.argv[1:] if argv is None else argv)
+    env = dict(os.environ, **extra)
     cmd = [sys.executable, str(ROOT/"run_generate.py")] + argv
     p = subprocess.run(cmd, cwd=str(ROOT), env=env)
     return int(p.returncode)
@@ -0,0 +1,134 @@
+"""
+run_manifest.py
+- run_manifest.json for run_generate.py: records each finished stage per card
+  (base / square / lock / story / cta / video) with its output files and an inputs hash.
+- With --resume a stage is skipped only when every recorded output still exists AND the
+  inputs hash is unchanged, so a run that died at request 17/28 picks up at 17.
+- Safe to share between processes (a shared --base_dir): record() holds an exclusive lock
+  on .run_manifest.json.lock, re-reads the file and merges its entry, so concurrent runs never
+  drop each other's records.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST_NAME = "run_manifest.json"
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock on path (created if missing) across processes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def inputs_hash(*inputs: Any) -> str:
+    """Paths hash by file content (missing file -> 'missing'); everything else by its JSON/str form."""
+    h = hashlib.sha1()
+    for x in inputs:
+        if isinstance(x, Path):
+            x = file_digest(x) if x.exists() else f"missing:{x}"
+        try:
+            s = json.dumps(x, ensure_ascii=False, sort_keys=True, default=str)
+        except Exception:
+            s = str(x)
+        h.update(s.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class RunManifest:
+    def __init__(self, out_root: Path, resume: bool = False):
+        self.path = Path(out_root) / MANIFEST_NAME
+        self.lock_path = self.path.with_name(f".{MANIFEST_NAME}.lock")  # hidden: never packaged
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, str] = {}
+        self.data: Dict[str, Any] = self._load() or {"cards": {}}
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            data.setdefault("cards", {})
+            return data
+        except Exception:
+            return None
+
+    def _entry(self, card: str, stage: str) -> Optional[dict]:
+        return self.data["cards"].get(card, {}).get(stage)
+
+    def need(self, card: str, stage: str, outputs: List[Path], *inputs: Any) -> bool:
+        """
+        True if the stage has to run. Remembers the inputs hash for the following record().
+        Without --resume every stage runs (the manifest is still written).
+        """
+        h = inputs_hash(*inputs)
+        self._pending[(card, stage)] = h
+        if not self.resume:
+            return True
+        e = self._entry(card, stage)
+        if not e or e.get("inputs") != h:
+            return True
+        return not all(Path(p).exists() for p in outputs)
+
+    def record(self, card: str, stage: str, outputs: List[Path], *inputs: Any) -> None:
+        """
+        Mark the stage done. Inputs given here are hashed now (for stages rendered elsewhere,
+        e.g. in a worker process, whose inputs only exist afterwards); otherwise the hash
+        remembered by need() is used.
+        """
+        h = self._pending.pop((card, stage), "")
+        if inputs:
+            h = inputs_hash(*inputs)
+        entry = {
+            "outputs": [str(p) for p in outputs],
+            "inputs": h,
+            "done_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock, file_lock(self.lock_path):
+            # another process sharing this folder may have recorded since we last read it
+            data = self._load() or self.data
+            data["cards"].setdefault(card, {})[stage] = entry
+            self.data = data
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -5,10 +5,12 @@ v16 – 요일·플랫폼 최적 mood/color 자동 + price A/B 분기 + 프롬
 
 ✅ 구현 방식(안전/확실)
 1) 서버가 구매자별로 mood/color/price를 결정
-2) CARDS_XLSX를 임시 복사 → DAY09/DAY10 행의 (mood,color,price,cta) 값을 buyer용으로 overwrite
+2) CARDS_XLSX를 임시 복사 → DAY09/DAY10 행의 (mood,color,price,cta) 값을 overwrite
 3) patched run_generate.py가 그 값을 읽어서
    - 이미지 생성 프롬프트(build_prompt)에 mood/color/price 힌트까지 포함
 4) 생성된 베이스 이미지가 이미 '분위기'가 바뀐 상태에서 카드가 만들어짐
+   - 베이스는 (season, day, mood, color, 가격 톤)으로만 달라지므로 template_pool.py가
+     Segment_Recommendations 조합을 미리 만들어 두고, 구매자는 그중 하나를 골라 씀
 5) 그 위에 프리셋(top/middle/bottom) 텍스트/배지 오버레이까지 적용
 
 필수 env
@@ -19,13 +21,15 @@ v16 – 요일·플랫폼 최적 mood/color 자동 + price A/B 분기 + 프롬
 선택 env
 - BONUS_FONT_PATH (한글 폰트 권장)
 - RUN_GENERATE_PATH (기본: 같은 폴더 run_generate.py)
+- BONUS_POOL_WORKERS (기본 2: 미리 데워 둔 렌더 워커 프로세스 수, 0 = 작업 스레드에서 직접)
+- TEMPLATE_DIR / TEMPLATE_REFILL_SECONDS / TEMPLATE_MAX_AGE_DAYS (template_pool.py)
 """
 
 from __future__ import annotations
-import argparse, json, os, secrets, time, sqlite3, subprocess, sys, shutil, threading
+import argparse, json, os, secrets, time, sqlite3, subprocess, sys, shutil, tempfile, threading
 from datetime import datetime, date
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import FastAPI, Request
 from fastapi.responses import RedirectResponse, JSONResponse
@@ -33,6 +37,16 @@ import uvicorn
 import openpyxl
 from PIL import Image, ImageDraw, ImageFont
 
+from font_cache import get_font, preload_fonts
+from text_wrap import wrap_chars
+from card_workbook import read_workbook, with_row_values, write_workbook
+from image_export import FORMATS
+from job_queue import JobQueue, QueueFull
+from worker_pool import WorkerPool
+from image_scheduler import OPENAI_BASE_URL, http_session
+from qr_cache import qr_tile
+from template_pool import TemplateKey, TemplatePool, price_tone as price_tone_of
+
 APP = FastAPI()
 
 DB_PATH = Path(os.environ.get("PROFILE_DB", "buyer_profile.sqlite"))
@@ -40,6 +54,7 @@ TRACKER_XLSX = Path(os.environ.get("TRACKER_XLSX", "Alloki_Dalloki_Performance_T
 CARDS_XLSX = Path(os.environ.get("CARDS_XLSX", "day_texts.xlsx"))
 
 RUN_GENERATE = Path(os.environ.get("RUN_GENERATE_PATH", "run_generate.py"))
+BUNDLED_RUN_GENERATE = (Path(__file__).resolve().parent / "run_generate.py").resolve()  # called in-process (run_generate.generate)
 BONUS_SEASON = os.environ.get("BONUS_SEASON", "winter")
 BONUS_OUT_DIR = Path(os.environ.get("BONUS_OUT_DIR", "bonus_out"))
 FONT_PATH = os.environ.get("BONUS_FONT_PATH", "")
@@ -241,6 +256,17 @@ def init_db():
         ua TEXT,
         ref TEXT
     )""")
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS ab_price_assign(
+        buyer_id TEXT,
+        platform TEXT,
+        weekday TEXT,
+        segment TEXT,
+        variant TEXT,
+        price INTEGER,
+        assigned_at REAL,
+        PRIMARY KEY(buyer_id, platform, weekday, segment)
+    )""")
 
     # Schema evolution (safe ALTER)
     for stmt in [
@@ -287,8 +313,10 @@ def make_personalized_copy(day: str, buyer_id: str) -> str:
 def weekday_kor(d: date) -> str:
     return "월화수목금토일"[d.weekday()]
 
+RECO_DEFAULT = {"mood":"힐링", "color":"민트", "price":"3900", "cta":"즉시 다운로드"}
+
 def find_reco(tracker: Path, segment: str, platform: str, wday: str) -> Dict[str, str]:
-    out = {"mood":"힐링", "color":"민트", "price":"3900", "cta":"즉시 다운로드"}
+    out = dict(RECO_DEFAULT)
     if not tracker.exists():
         return out
     try:
@@ -403,28 +431,21 @@ def get_or_assign_price_variant(buyer_id: str, segment: str, platform: str, wday
 
     cur.execute("INSERT OR REPLACE INTO ab_price_assign(buyer_id,platform,weekday,segment,variant,price,assigned_at) VALUES(?,?,?,?,?,?,?)",
                 (buyer_id, platform, wday, segment, v, p, time.time()))
-
-    # Schema evolution (safe ALTER)
-    for stmt in [
-        "ALTER TABLE bonus_links ADD COLUMN season TEXT",
-        "ALTER TABLE bonus_links ADD COLUMN offer_days INTEGER",
-        "ALTER TABLE bonus_links ADD COLUMN price_variant TEXT",
-        "ALTER TABLE bonus_links ADD COLUMN offer_code TEXT",
-    ]:
-        try:
-            con.execute(stmt)
-        except Exception:
-            pass
-
     con.commit()
     con.close()
     tone = "premium" if p >= 4900 else "light"
     return v, p, tone
 # ---------- Preset overlay (same as v14) ----------
 def pick_font(size: int):
-    if FONT_PATH and Path(FONT_PATH).exists():
-        return ImageFont.truetype(FONT_PATH, size=size)
-    return ImageFont.load_default()
+    return get_font(FONT_PATH, size)
+
+def preload_preset_fonts() -> int:
+    """Warm the font cache with every size overlay_with_preset() can ask for."""
+    sizes = []
+    for p in PRESETS.values():
+        fs = int(p.get("font_size", 44))
+        sizes += [fs, int(fs*0.72)]
+    return preload_fonts(FONT_PATH, sizes or [44, 31])
 
 def color_to_rgb(name: str):
     m = {"민트": (140,226,210),"핑크": (255,182,193),"하늘": (164,211,255),"라벤더": (205,180,219),
@@ -450,22 +471,14 @@ def overlay_with_preset(in_png: Path, out_png: Path, main_text: str, preset_name
     text_rgba = tuple(preset.get("text_rgba", [40,35,32,255]))
     font = pick_font(font_size)
 
-    # wrap
+    # wrap (per character, shared width-cached engine)
     lines = []
     for raw in (main_text or "").split("\n"):
         raw = raw.strip()
         if not raw:
             lines.append("")
             continue
-        cur = ""
-        for ch in raw:
-            test = cur + ch
-            if draw.textlength(test, font=font) <= (box_w - pad*2):
-                cur = test
-            else:
-                lines.append(cur)
-                cur = ch
-        if cur: lines.append(cur)
+        lines += wrap_chars(raw, font, box_w - pad*2)
     if len(lines) < 2: lines.append("")
     box_h = pad*2 + line_h*len(lines)
 
@@ -508,57 +521,56 @@ def overlay_with_preset(in_png: Path, out_png: Path, main_text: str, preset_name
 
 # ---------- XLSX override (핵심) ----------
 def override_cards_xlsx(src_xlsx: Path, out_xlsx: Path, sheet: str, day: str, mood: str, color: str, price: str, cta: str):
-    wb = openpyxl.load_workbook(src_xlsx)
-    ws = wb[sheet] if sheet in wb.sheetnames else wb.active
-    headers = [safe_str(c.value).lower() for c in ws[1]]
-    col = {h:i+1 for i,h in enumerate(headers) if h}
-    # ensure optional columns exist
-    def ensure_col(name: str):
-        if name not in col:
-            ws.cell(row=1, column=ws.max_column+1, value=name)
-            col[name] = ws.max_column
-    for k in ["mood","color","price","cta"]:
-        ensure_col(k)
-    day_col = col.get("day", None)
-    if not day_col:
-        raise ValueError("Cards sheet must have 'day' header")
-    target_row = None
-    for r in range(2, ws.max_row+1):
-        v = safe_str(ws.cell(row=r, column=day_col).value).upper()
-        if v.startswith("DAY"):
-            v = v
+    # parsed once (cached by mtime/hash), one row patched in memory, streamed out write-only
+    def same_day(v, day):
+        v = safe_str(v).upper()
         if v == day:
-            target_row = r
-            break
+            return True
         # accept 9 or 09
         digits = "".join(ch for ch in v if ch.isdigit())
-        if digits and f"DAY{int(digits):02d}" == day:
-            target_row = r
-            break
-    if target_row is None:
-        # append new row
-        target_row = ws.max_row + 1
-        ws.cell(row=target_row, column=day_col, value=day)
-    ws.cell(row=target_row, column=col["mood"], value=mood)
-    ws.cell(row=target_row, column=col["color"], value=color)
-    ws.cell(row=target_row, column=col["price"], value=price)
-    ws.cell(row=target_row, column=col["cta"], value=cta)
-    wb.save(out_xlsx)
+        return bool(digits) and f"DAY{int(digits):02d}" == day
+    data = read_workbook(src_xlsx)
+    data = with_row_values(data, sheet, "day", day, {"mood": mood, "color": color, "price": price, "cta": cta}, match=same_day)
+    write_workbook(data, out_xlsx)
 
 # ---------- generation via patched run_generate.py ----------
 def locate_day_png(out_dir: Path, day: str) -> Optional[Path]:
-    m = sorted(out_dir.rglob(f"{day}*.png"))
+    """The day's square card under out_dir, in whatever --image_format the generator wrote."""
+    suffixes = {suffix for suffix, _ in FORMATS.values()}
+    m = sorted(p for p in out_dir.rglob(f"{day}*") if p.suffix.lower() in suffixes
+               and not p.stem.endswith(("_BASE", "_9x16")))
     return m[0] if m else None
 
-def generate_bonus_day(day: str, platform: str, override_xlsx: Path) -> Path:
+def generate_bonus_day(day: str, platform: str, override_xlsx: Path, out_root: Optional[Path] = None) -> Path:
+    """out_root: where the run folder goes (default BONUS_OUT_DIR)."""
     if not RUN_GENERATE.exists():
         raise RuntimeError(f"run_generate.py not found at {RUN_GENERATE}")
-    out_dir = BONUS_OUT_DIR / f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{platform}"
+    out_dir = (out_root or BONUS_OUT_DIR) / f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{platform}"
+    fmt = "reels" if platform=="instagram" else "shorts"
+    if RUN_GENERATE.resolve() == BUNDLED_RUN_GENERATE:
+        # in-process library call: no interpreter start-up, no output scraping;
+        # only=day renders just this card (1 image request, not thumbnail + DAY01..DAYnn)
+        from run_generate import GenerateConfig, generate
+        res = generate(GenerateConfig(
+            BONUS_SEASON, override_xlsx, platform=platform, format=fmt, mode="paid",
+            days=int(day.replace("DAY","")), only=day, sheet="Cards", thumb_pick="A",
+            base_url="https://example.com/buyer", utm_campaign="bonus_gen",
+            font_path=FONT_PATH or "", out_dir=out_dir,
+            # one card: render inline, no nested process pool; base art fetched on this thread so it
+            # reuses the keep-alive session warm_render_worker() opened (http_session() is per thread)
+            options={"render_workers": 1, "gen_workers": 0},
+        ))
+        png = res.find(day)
+        if not png:
+            raise RuntimeError(f"run_generate produced no {day} card under {res.out_root}")
+        return png
+
+    # RUN_GENERATE_PATH points at another generator script: run it as before
     cmd = [
         sys.executable, str(RUN_GENERATE),
         "--season", BONUS_SEASON,
         "--platform", platform,
-        "--format", "reels" if platform=="instagram" else "shorts",
+        "--format", fmt,
         "--mode", "paid",
         "--days", str(int(day.replace("DAY",""))),
         "--xlsx", str(override_xlsx),
@@ -577,6 +589,66 @@ def generate_bonus_day(day: str, platform: str, override_xlsx: Path) -> Path:
         raise RuntimeError(f"Could not locate generated image for {day} under {out_dir}")
     return png
 
+# ---------- warm render workers ----------
+def warm_render_worker() -> Dict[str, Any]:
+    """WorkerPool warm-up, once per worker process: what every bonus card needs, before the first buyer."""
+    import run_generate  # generator + PIL / qrcode / openpyxl import chain
+    fonts = preload_preset_fonts() + preload_fonts(FONT_PATH, run_generate.RENDER_FONT_SIZES)
+    qr_tile("https://example.com/buyer", run_generate.CTA_QR_SIZE)  # qrcode tables + image factory
+    try:
+        # open the keep-alive connection now, on the thread that runs pool jobs (gen_workers=0 fetches there)
+        http_session().head(OPENAI_BASE_URL, timeout=5)
+        connected = True
+    except Exception:
+        connected = False
+    return {"presets": len(PRESETS), "fonts": fonts, "api_connected": connected}
+
+def render_template_base(day: str, mood: str, color: str, price: str, out_png: Path) -> Path:
+    """Pool job: base art for day with the Cards row patched to mood/color/price -> out_png."""
+    # --- 핵심: 임시 xlsx overwrite로 prompt까지 반영 ---
+    # xlsx, run folder and ZIP live in a scratch dir: only out_png is kept
+    work = Path(tempfile.mkdtemp(prefix=f"template_{day}_"))
+    try:
+        tmp = work / "cards.xlsx"
+        override_cards_xlsx(CARDS_XLSX, tmp, "Cards", day, mood, color, price, "")
+        raw = generate_bonus_day(day, "instagram", tmp, out_root=work)  # square art does not depend on platform
+        shutil.copyfile(raw, out_png)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return out_png
+
+POOL = WorkerPool(warm_render_worker)
+
+# ---------- pre-rendered base art (template_pool.py) ----------
+TONE_PRICE = {"light": "3900", "premium": "4900"}  # one price per build_prompt() tier
+
+def recommended_template_keys() -> List[TemplateKey]:
+    """Every (mood, color) in Segment_Recommendations (+ find_reco default) x price tone x bonus day."""
+    combos = [(RECO_DEFAULT["mood"], RECO_DEFAULT["color"])]
+    if TRACKER_XLSX.exists():
+        try:
+            wb = openpyxl.load_workbook(TRACKER_XLSX, read_only=True)
+            if "Segment_Recommendations" in wb.sheetnames:
+                rows = wb["Segment_Recommendations"].iter_rows(values_only=True)
+                idx = {h:i for i,h in enumerate(safe_str(c) for c in next(rows, ())) if h}
+                def get(row, name):
+                    i = idx.get(name, None)
+                    return safe_str(row[i]) if i is not None and i < len(row) else ""
+                for r in rows:
+                    combos.append((get(r,"mood") or RECO_DEFAULT["mood"], get(r,"color") or RECO_DEFAULT["color"]))
+            wb.close()
+        except Exception as e:
+            print("template keys: tracker read failed:", e, file=sys.stderr)
+    days = sorted({day for day, _ in BONUS_JOB_KINDS.values()})
+    # both tones: the price A/B test can hand any buyer either price
+    return [TemplateKey(BONUS_SEASON, day, mood, color, tone)
+            for mood, color in dict.fromkeys(combos) for day in days for tone in TONE_PRICE]
+
+def render_template(key: TemplateKey, out_png: Path) -> None:
+    POOL.run(render_template_base, key.day, key.mood, key.color, TONE_PRICE[key.tone], out_png)
+
+TEMPLATES = TemplatePool(render_template, recommended_template_keys)
+
 # ---------- Upload adapters ----------
 def upload_to_s3(local_path: Path) -> Optional[str]:
     bucket = os.environ.get("S3_BUCKET","").strip()
@@ -599,7 +671,8 @@ def upload_adapter(local_path: Path) -> str:
     return f"https://cdn.example.com/{local_path.name}"
 
 # ---------- Tracking + tracker writeback ----------
-def issue_tracking_link(day: str, buyer_id: str, platform: str, target_url: str, base_url: str) -> str:
+def issue_tracking_link(day: str, buyer_id: str, platform: str, target_url: str, base_url: str,
+                        season: str = "", offer_days: int = 0, price_variant: str = "", offer_code: str = "") -> str:
     token = secrets.token_urlsafe(12)
     con = db()
     con.execute("INSERT OR REPLACE INTO bonus_links(token,buyer_id,day,target_url,platform,created_at,clicks) VALUES(?,?,?,?,?,?,0)",
@@ -616,6 +689,8 @@ def issue_tracking_link(day: str, buyer_id: str, platform: str, target_url: str,
             con.execute(stmt)
         except Exception:
             pass
+    con.execute("UPDATE bonus_links SET season=?, offer_days=?, price_variant=?, offer_code=? WHERE token=?",
+                (season, int(offer_days or 0), price_variant, offer_code, token))
 
     con.commit()
     con.close()
@@ -977,8 +1052,8 @@ def update_offer_stats_for_month(tracker_path: Path, year: int, month: int):
                             break
                     else:
                         if offer_days == 0 or parse_offer_days_from_product(pn) == offer_days:
-                        ok = True
-                        break
+                            ok = True
+                            break
                 else:
                     ok = True
                     break
@@ -992,7 +1067,7 @@ def update_offer_stats_for_month(tracker_path: Path, year: int, month: int):
         ev_links = price * conv_rate_links
         ev_clickers = price * click_cvr
 
-        rows_out.append([seg, platform, wd, season, offer_days, price, month_key, links_issued, clicks, unique_clickers, conversions_total,
+        rows_out.append([seg, platform, wd, season, offer_code, offer_days, price, month_key, links_issued, clicks, unique_clickers, conversions_total,
                          round(conv_rate_links,6), round(click_cvr,6), round(ev_links,6), round(ev_clickers,6)])
 
     con.close()
@@ -1036,7 +1111,7 @@ def monthly_worker_loop():
                 key = f"{y:04d}-{m:02d}"
                 if key != last_ran_month:
                     update_price_ab_stats_for_month(TRACKER_XLSX, y, m)
-        update_offer_stats_for_month(TRACKER_XLSX, y, m)
+                    update_offer_stats_for_month(TRACKER_XLSX, y, m)
                     last_ran_month = key
         except Exception as e:
             print("monthly stats loop failed:", e, file=sys.stderr)
@@ -1078,20 +1153,18 @@ async def webhook_event(req: Request):
     con.commit(); con.close()
     return JSONResponse({"ok": True})
 
-@APP.post("/webhook/purchase")
-async def webhook_purchase(req: Request):
-    payload = await req.json()
-    buyer_id = safe_str(payload.get("buyer_id","")) or f"buyer_{int(time.time())}"
-    buyer_name = safe_str(payload.get("buyer_name","")) or None
-    platform = (safe_str(payload.get("platform","instagram")) or "instagram").lower()
+# purchase -> DAY09 (preset fallback top), review -> DAY10 (preset fallback middle)
+BONUS_JOB_KINDS = {"purchase": ("DAY09", "top"), "review": ("DAY10", "middle")}
 
-    con = db()
-    con.execute("INSERT OR IGNORE INTO buyers(buyer_id,buyer_name,created_at) VALUES(?,?,?)", (buyer_id, buyer_name, time.time()))
-    if buyer_name:
-        con.execute("UPDATE buyers SET buyer_name=? WHERE buyer_id=?", (buyer_name, buyer_id))
-    con.execute("INSERT INTO events(buyer_id,event_type,platform,order_id,product_name,created_at) VALUES(?,?,?,?,?,?)",
-                (buyer_id, "purchase", platform, safe_str(payload.get("order_id","")), safe_str(payload.get("product_name","알록이 달록이 카드")), time.time()))
-    con.commit(); con.close()
+def run_bonus_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    JobQueue worker: personalization (tracker xlsx), Cards override, generation, overlay,
+    upload and tracking link for one bonus card. Returns what the webhook used to answer.
+    """
+    kind, payload = job["kind"], job["payload"]
+    buyer_id, platform = job["buyer_id"], job["platform"]
+    day, preset_fallback = BONUS_JOB_KINDS[kind]
+    season = BONUS_SEASON
 
     seg = summarize_buyer(buyer_id)["segment"]
     wday = weekday_kor(date.today())
@@ -1106,7 +1179,7 @@ async def webhook_purchase(req: Request):
     if price_payload:
         price = price_payload
         price_variant = "MANUAL"
-        price_tone = "premium" if int("".join(ch for ch in price if ch.isdigit()) or 0) >= 4900 else "light"
+        price_tone = price_tone_of(price)
     else:
         v, p, t = get_or_assign_price_variant(buyer_id, seg, platform, wday, season)
         price_variant, price, price_tone = v, str(p), t
@@ -1121,30 +1194,56 @@ async def webhook_purchase(req: Request):
         offer_code = "D21" if offer_days==21 else ("D14" if offer_days==14 else "D7")
     else:
         offer_code, offer_days = choose_offer(buyer_id, seg, platform, wday, season) or (DEFAULT_PRESET_INSTAGRAM if platform=="instagram" else DEFAULT_PRESET_TIKTOK)
-    if preset not in PRESETS: preset = "top"
-
-    # --- 핵심: 임시 xlsx overwrite로 prompt까지 반영 ---
-    tmp = BONUS_OUT_DIR / f"tmp_cards_{buyer_id}_{int(time.time())}.xlsx"
-    override_cards_xlsx(CARDS_XLSX, tmp, "Cards", "DAY09", mood, color, price, cta)
-
-    raw = generate_bonus_day("DAY09", platform, tmp)
-    main_text = make_personalized_copy("DAY09", buyer_id)
+    if preset not in PRESETS: preset = preset_fallback
 
-    out_png = BONUS_OUT_DIR / f"DAY09_{buyer_id}_{int(time.time())}.png"
-    overlay_with_preset(raw, out_png, main_text, preset, mood, color, price, cta)
+    # pooled base art for (season, day, mood, color, tone); a miss is rendered now and kept
+    base = TEMPLATES.get_or_fill(TemplateKey(season, day, mood, color, price_tone))
+    main_text = make_personalized_copy(day, buyer_id)
+    out_png = BONUS_OUT_DIR / f"{day}_{buyer_id}_{int(time.time())}.png"
+    overlay_with_preset(base, out_png, main_text, preset, mood, color, price, cta)
 
     target_url = upload_adapter(out_png)
-    base_url = str(req.base_url).rstrip("/")
-    track = issue_tracking_link("DAY09", buyer_id, platform, target_url, base_url, season=season, offer_days=offer_days, price_variant=price_variant, offer_code=offer_code)
+    track = issue_tracking_link(day, buyer_id, platform, target_url, job["base_url"], season=season, offer_days=offer_days, price_variant=price_variant, offer_code=offer_code)
 
-    return JSONResponse({
+    res = {
         "ok": True,
         "segment": seg,
         "personalization": {"season": season, "offer_code": offer_code, "offer_days": offer_days, "mood": mood, "color": color, "price": price, "price_variant": price_variant, "price_tone": price_tone, "cta": cta, "preset": preset},
-        "day09_tracking_link": track,
-        "coupon": f"ALLD-10-{secrets.token_hex(2).upper()}",
-        "note": "요일·플랫폼 최적 mood/color 자동 + price A/B 분기 + 프롬프트 톤 분기(v16)"
-    })
+        f"{day.lower()}_tracking_link": track,
+    }
+    if kind == "purchase":
+        res["coupon"] = f"ALLD-10-{secrets.token_hex(2).upper()}"
+    res["note"] = "요일·플랫폼 최적 mood/color 자동 + price A/B 분기 + 프롬프트 톤 분기(v16)"
+    return res
+
+JOBS = JobQueue({kind: run_bonus_job for kind in BONUS_JOB_KINDS})
+
+def enqueue_bonus(kind: str, buyer_id: str, platform: str, payload: Dict[str, Any], req: Request) -> JSONResponse:
+    """Event is recorded; the bonus itself is a queued job -> 202 + job id (poll /jobs/{id} or callback_url)."""
+    base_url = str(req.base_url).rstrip("/")
+    try:
+        job_id = JOBS.submit(kind, {"kind": kind, "buyer_id": buyer_id, "platform": platform, "base_url": base_url, "payload": payload},
+                             callback_url=safe_str(payload.get("callback_url","")))
+    except QueueFull as e:
+        return JSONResponse({"ok": False, "error": f"busy: {e}"}, status_code=503, headers={"Retry-After": "30"})
+    return JSONResponse({"ok": True, "job_id": job_id, "status": "queued", "status_url": f"{base_url}/jobs/{job_id}"}, status_code=202)
+
+@APP.post("/webhook/purchase")
+async def webhook_purchase(req: Request):
+    payload = await req.json()
+    buyer_id = safe_str(payload.get("buyer_id","")) or f"buyer_{int(time.time())}"
+    buyer_name = safe_str(payload.get("buyer_name","")) or None
+    platform = (safe_str(payload.get("platform","instagram")) or "instagram").lower()
+
+    con = db()
+    con.execute("INSERT OR IGNORE INTO buyers(buyer_id,buyer_name,created_at) VALUES(?,?,?)", (buyer_id, buyer_name, time.time()))
+    if buyer_name:
+        con.execute("UPDATE buyers SET buyer_name=? WHERE buyer_id=?", (buyer_name, buyer_id))
+    con.execute("INSERT INTO events(buyer_id,event_type,platform,order_id,product_name,created_at) VALUES(?,?,?,?,?,?)",
+                (buyer_id, "purchase", platform, safe_str(payload.get("order_id","")), safe_str(payload.get("product_name","알록이 달록이 카드")), time.time()))
+    con.commit(); con.close()
+
+    return enqueue_bonus("purchase", buyer_id, platform, payload, req)
 
 @APP.post("/webhook/review")
 async def webhook_review(req: Request):
@@ -1160,55 +1259,27 @@ async def webhook_review(req: Request):
                 (buyer_id, "review", platform, safe_str(payload.get("order_id","")), safe_str(payload.get("product_name","알록이 달록이 카드")), time.time()))
     con.commit(); con.close()
 
-    seg = summarize_buyer(buyer_id)["segment"]
-    wday = weekday_kor(date.today())
-    reco = find_reco(TRACKER_XLSX, seg, platform, wday)
-
-    mood = safe_str(payload.get("mood","")) or reco["mood"]
-    color = safe_str(payload.get("color","")) or reco["color"]
-    cta  = safe_str(payload.get("cta",""))  or reco["cta"]
-
-    price_payload = safe_str(payload.get("price",""))
-    if price_payload:
-        price = price_payload
-        price_variant = "MANUAL"
-        price_tone = "premium" if int("".join(ch for ch in price if ch.isdigit()) or 0) >= 4900 else "light"
-    else:
-        v, p, t = get_or_assign_price_variant(buyer_id, seg, platform, wday, season)
-        price_variant, price, price_tone = v, str(p), t
+    return enqueue_bonus("review", buyer_id, platform, payload, req)
 
-    preset = safe_str(payload.get("preset",""))
-    offer_code = safe_str(payload.get("offer_code","")) or ""
-    offer_days_in = int(payload.get("offer_days") or 0)
-    if offer_code:
-        offer_days = offer_code_to_days(offer_code)
-    elif offer_days_in:
-        offer_days = offer_days_in
-        offer_code = "D21" if offer_days==21 else ("D14" if offer_days==14 else "D7")
-    else:
-        offer_code, offer_days = choose_offer(buyer_id, seg, platform, wday, season) or (DEFAULT_PRESET_INSTAGRAM if platform=="instagram" else DEFAULT_PRESET_TIKTOK)
-    if preset not in PRESETS: preset = "middle"
-
-    tmp = BONUS_OUT_DIR / f"tmp_cards_{buyer_id}_{int(time.time())}.xlsx"
-    override_cards_xlsx(CARDS_XLSX, tmp, "Cards", "DAY10", mood, color, price, cta)
+@APP.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return JSONResponse({"ok": False, "error": "unknown job"}, status_code=404)
+    return JSONResponse({"ok": True, **job})
 
-    raw = generate_bonus_day("DAY10", platform, tmp)
-    main_text = make_personalized_copy("DAY10", buyer_id)
+@APP.get("/jobs")
+async def job_stats():
+    return JSONResponse({"ok": True, **JOBS.stats()})
 
-    out_png = BONUS_OUT_DIR / f"DAY10_{buyer_id}_{int(time.time())}.png"
-    overlay_with_preset(raw, out_png, main_text, preset, mood, color, price, cta)
+@APP.get("/pool")
+async def pool_stats():
+    # size, queue depth, warm-up time and per-job latency of the render workers
+    return JSONResponse({"ok": True, **POOL.stats()})
 
-    target_url = upload_adapter(out_png)
-    base_url = str(req.base_url).rstrip("/")
-    track = issue_tracking_link("DAY10", buyer_id, platform, target_url, base_url, season=season, offer_days=offer_days, price_variant=price_variant, offer_code=offer_code)
-
-    return JSONResponse({
-        "ok": True,
-        "segment": seg,
-        "personalization": {"season": season, "offer_code": offer_code, "offer_days": offer_days, "mood": mood, "color": color, "price": price, "price_variant": price_variant, "price_tone": price_tone, "cta": cta, "preset": preset},
-        "day10_tracking_link": track,
-        "note": "요일·플랫폼 최적 mood/color 자동 + price A/B 분기 + 프롬프트 톤 분기(v16)"
-    })
+@APP.get("/templates")
+async def template_stats():
+    return JSONResponse({"ok": True, **TEMPLATES.stats()})
 
 @APP.get("/r/{day}/{token}")
 async def redirect_day(day: str, token: str, req: Request):
@@ -1240,6 +1311,13 @@ async def redirect_day(day: str, token: str, req: Request):
 
 def main():
     init_db()
+    preload_preset_fonts()
+    # start + warm the render workers (forkserver/spawn: this module is re-imported there, main() is not run);
+    # a failed warm-up does not stop the server, jobs retry it after a back-off (GET /pool shows the error)
+    if not POOL.start():
+        print("render pool warm-up failed:", POOL.stats().get("warm_error"), file=sys.stderr)
+    JOBS.start()
+    TEMPLATES.start()  # background: render every recommended combination not on disk yet
     if AUTO_MONTHLY_STATS:
         t = threading.Thread(target=monthly_worker_loop, daemon=True)
         t.start()
@@ -0,0 +1,106 @@
+"""
+stage_timer.py
+- run_generate.py --profile: wall time per stage, per card and in aggregate -> <out_root>/timings.json
+- Stages: openai_img, render_square_card, add_qr_price_cta_square, square_to_story,
+  make_cta_t1_mp4, upload, zip (any other name works too).
+- Disabled by default: stage() is then a no-op context manager, so call sites stay in place.
+- Render workers (render_stage.py) run in other processes: render_card() times its own stages
+  into a fresh StageTimer and returns the samples; main() merges them with extend().
+- --profile_render: cProfile of every render_card() call, merged into <out_root>/render.prof
+  (python -m pstats render.prof).
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+import json
+import math
+import statistics
+import time
+
+Sample = Tuple[str, str, float]  # (stage, card, seconds)
+
+
+def _pct(xs: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return xs[max(0, math.ceil(p / 100.0 * len(xs)) - 1)]
+
+
+class StageTimer:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.samples: List[Sample] = []  # list.append is atomic: safe from BaseArtStage threads
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, card: str = "") -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append((name, card, time.perf_counter() - t))
+
+    def add(self, name: str, card: str, seconds: float) -> None:
+        if self.enabled:
+            self.samples.append((name, card, seconds))
+
+    def extend(self, samples: Iterable[Sample]) -> None:
+        if self.enabled:
+            self.samples.extend(tuple(s) for s in samples)
+
+    def report(self) -> dict:
+        by_stage: Dict[str, List[float]] = {}
+        by_card: Dict[str, Dict[str, float]] = {}
+        for name, card, sec in self.samples:
+            by_stage.setdefault(name, []).append(sec)
+            if card:
+                c = by_card.setdefault(card, {})
+                c[name] = round(c.get(name, 0.0) + sec, 4)
+        stages = {}
+        for name, xs in by_stage.items():
+            xs = sorted(xs)
+            stages[name] = {
+                "count": len(xs),
+                "total_s": round(sum(xs), 3),
+                "p50_ms": round(statistics.median(xs) * 1000, 1),
+                "p95_ms": round(_pct(xs, 95) * 1000, 1),
+                "max_ms": round(xs[-1] * 1000, 1),
+            }
+        for c in by_card.values():
+            c["total_s"] = round(sum(c.values()), 4)
+        return {"wall_s": round(time.perf_counter() - self.t0, 3), "stages": stages, "cards": by_card}
+
+    def write(self, path: Path) -> Path:
+        path = Path(path)
+        path.write_text(json.dumps(self.report(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+
+_CURRENT = StageTimer()
+
+
+def set_stage_timer(timer: StageTimer) -> None:
+    global _CURRENT
+    _CURRENT = timer
+
+
+def stage_timer() -> StageTimer:
+    return _CURRENT
+
+
+def merge_profiles(paths: Iterable[Path], out_path: Path) -> Path:
+    """Merge per-card cProfile dumps into one pstats file; the per-card files are removed."""
+    import pstats
+    paths = [Path(p) for p in paths if Path(p).exists()]
+    if not paths:
+        return Path(out_path)
+    stats = pstats.Stats(str(paths[0]))
+    for p in paths[1:]:
+        stats.add(str(p))
+    stats.dump_stats(str(out_path))
+    for p in paths:
+        p.unlink(missing_ok=True)
+    return Path(out_path)
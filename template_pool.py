@@ -0,0 +1,189 @@
+"""
+template_pool.py
+- Pre-rendered base art for personalized bonus cards (server_v22.py DAY09/DAY10).
+- A bonus card's base art depends only on (season, day, mood, color, price tone): the buyer's
+  copy, price, CTA and preset are drawn on top by overlay_with_preset(). Every recommended
+  combination is rendered ahead of time, so a webhook only picks its base and overlays it
+  (milliseconds) instead of running the generator (minutes).
+- Files: TEMPLATE_DIR/<season>/<day>_<tone>_<hash(mood|color)>.png, written atomically;
+  a file on disk is a ready template, so the pool survives restarts with no index.
+- Background refill thread: every TEMPLATE_REFILL_SECONDS (or when a miss is reported) it asks
+  keys() for the wanted set (e.g. Segment_Recommendations) and renders what is missing or
+  older than TEMPLATE_MAX_AGE_DAYS.
+- get_or_fill(key): a miss is rendered on the caller's thread (same result as before, no
+  worse than the old per-buyer generation) and kept for the next buyer.
+
+env
+- TEMPLATE_DIR              (default ./bonus_templates)
+- TEMPLATE_REFILL_SECONDS   (default 600)
+- TEMPLATE_MAX_AGE_DAYS     (default 0 = never re-render) : e.g. after prompt / Cards text changes
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import os
+import sys
+import threading
+import time
+
+TEMPLATE_DIR = Path(os.environ.get("TEMPLATE_DIR", "./bonus_templates"))
+TEMPLATE_REFILL_SECONDS = float(os.environ.get("TEMPLATE_REFILL_SECONDS", "600"))
+TEMPLATE_MAX_AGE_DAYS = float(os.environ.get("TEMPLATE_MAX_AGE_DAYS", "0"))
+
+
+def price_tone(price: str) -> str:
+    """run_generate.build_prompt() tiers: >= 4900 -> premium, anything else -> light."""
+    digits = "".join(ch for ch in str(price or "") if ch.isdigit())
+    return "premium" if digits and int(digits) >= 4900 else "light"
+
+
+@dataclass(frozen=True)
+class TemplateKey:
+    season: str
+    day: str
+    mood: str
+    color: str
+    tone: str  # "premium" | "light"
+
+    def filename(self) -> str:
+        h = hashlib.sha1(f"{self.mood}|{self.color}".encode("utf-8")).hexdigest()[:12]
+        return f"{self.day}_{self.tone}_{h}.png"
+
+
+class TemplatePool:
+    def __init__(self, render: Callable[[TemplateKey, Path], None], keys: Callable[[], Iterable[TemplateKey]],
+                 root: Path = TEMPLATE_DIR, refill_seconds: float = TEMPLATE_REFILL_SECONDS,
+                 max_age_days: float = TEMPLATE_MAX_AGE_DAYS):
+        """
+        render(key, out_png): writes the base art of key to out_png (e.g. through the warm WorkerPool).
+        keys(): the combinations that should always be ready.
+        """
+        self.render = render
+        self.keys = keys
+        self.root = Path(root)
+        self.refill_seconds = float(refill_seconds)
+        self.max_age_s = float(max_age_days) * 86400
+        self._lock = threading.Lock()
+        self._key_locks: Dict[TemplateKey, Tuple[threading.Lock, int]] = {}  # key -> (lock, callers); dropped at 0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._wanted: List[TemplateKey] = []
+        self._hits = 0
+        self._misses = 0
+        self._rendered = 0
+        self._failed = 0
+        self._last_refill = 0.0
+
+    def path(self, key: TemplateKey) -> Path:
+        return self.root / key.season / key.filename()
+
+    def _fresh(self, p: Path) -> bool:
+        if not p.exists():
+            return False
+        return not self.max_age_s or time.time() - p.stat().st_mtime < self.max_age_s
+
+    def get(self, key: TemplateKey) -> Optional[Path]:
+        p = self.path(key)
+        ok = p.exists()  # a stale template still beats generating on the buyer's path
+        with self._lock:
+            if ok:
+                self._hits += 1
+            else:
+                self._misses += 1
+        if not ok:
+            self._wake.set()
+        return p if ok else None
+
+    def fill(self, key: TemplateKey, force: bool = False) -> Path:
+        """Render key now unless a fresh template exists (one render per key at a time)."""
+        with self._lock:
+            klock, callers = self._key_locks.get(key) or (threading.Lock(), 0)
+            self._key_locks[key] = (klock, callers + 1)
+        try:
+            with klock:
+                return self._fill_locked(key, force)
+        finally:
+            with self._lock:
+                klock, callers = self._key_locks[key]
+                if callers == 1:
+                    del self._key_locks[key]  # nobody else waits on this key: don't keep one lock per key ever seen
+                else:
+                    self._key_locks[key] = (klock, callers - 1)
+
+    def _fill_locked(self, key: TemplateKey, force: bool) -> Path:
+        p = self.path(key)
+        if not force and self._fresh(p):
+            return p
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f".{p.stem}.{os.getpid()}.{threading.get_ident()}.tmp.png")
+        try:
+            self.render(key, tmp)
+            os.replace(tmp, p)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            tmp.unlink(missing_ok=True)
+        with self._lock:
+            self._rendered += 1
+        return p
+
+    def get_or_fill(self, key: TemplateKey) -> Path:
+        return self.get(key) or self.fill(key)
+
+    # ---------- background refill ----------
+    def refill(self) -> int:
+        """Render every wanted key that is missing or stale. Returns number rendered."""
+        wanted = list(dict.fromkeys(self.keys()))
+        with self._lock:
+            self._wanted = wanted
+        n = 0
+        for key in wanted:
+            if self._stop:
+                break
+            if self._fresh(self.path(key)):
+                continue
+            try:
+                self.fill(key)
+                n += 1
+            except Exception as e:
+                print(f"template {key} failed:", e, file=sys.stderr)
+        with self._lock:
+            self._last_refill = time.time()
+        return n
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="template-refill", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop = True
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop:
+            try:
+                self.refill()
+            except Exception as e:
+                print("template refill failed:", e, file=sys.stderr)
+            self._wake.wait(self.refill_seconds)
+            self._wake.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            wanted = list(self._wanted)
+            out: Dict[str, Any] = {
+                "hits": self._hits,
+                "misses": self._misses,
+                "rendered": self._rendered,
+                "failed": self._failed,
+                "last_refill": self._last_refill,
+            }
+        ready = sum(1 for k in wanted if self._fresh(self.path(k)))
+        return {"wanted": len(wanted), "ready": ready, "missing": len(wanted) - ready, **out}
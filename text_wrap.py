@@ -0,0 +1,83 @@
+"""
+text_wrap.py
+- Shared line wrapping for card copy (run_generate.wrap_lines, server_v22.overlay_with_preset).
+- The old loops measured a growing prefix with draw.textlength() for every character: O(n^2)
+  measurements for Hangul copy without spaces.
+- Here glyph advance widths are cached per (font, char); break points come from a binary search
+  over prefix sums, then one or two real measurements confirm the line (kerning/ligatures),
+  so the result matches the per-character loop.
+"""
+from __future__ import annotations
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Callable, Dict, List, Sequence, Tuple
+
+_ADVANCE: Dict[Tuple, float] = {}
+_ADVANCE_MAX = 200_000
+
+
+def _font_key(font) -> Tuple:
+    path = getattr(font, "path", None)
+    if path is not None:
+        return (str(path), getattr(font, "size", None), getattr(font, "index", 0))
+    return ("id", id(font))
+
+
+def advance(font, ch: str) -> float:
+    """Cached advance width of one character."""
+    k = (_font_key(font), ch)
+    w = _ADVANCE.get(k)
+    if w is None:
+        if len(_ADVANCE) >= _ADVANCE_MAX:
+            _ADVANCE.clear()
+        w = _ADVANCE[k] = float(font.getlength(ch))
+    return w
+
+
+def text_width(font, text: str) -> float:
+    """Approximate width from cached advances (no kerning)."""
+    return sum(advance(font, ch) for ch in text)
+
+
+def _greedy(tokens: Sequence[str], join: str, font, max_w: float) -> List[str]:
+    """
+    Greedy fill: as many tokens per line as fit max_w; a token wider than max_w gets a line of its own.
+    """
+    n = len(tokens)
+    if n == 0:
+        return []
+    sep_w = text_width(font, join)
+    # prefix[i] = width of tokens[:i] each followed by a separator
+    prefix = [0.0] + list(accumulate(text_width(font, t) + sep_w for t in tokens))
+    measure: Callable[[int, int], float] = lambda a, b: font.getlength(join.join(tokens[a:b]))
+    lines: List[str] = []
+    start = 0
+    while start < n:
+        # largest end with estimated width of tokens[start:end] <= max_w (trailing separator excluded)
+        end = bisect_right(prefix, prefix[start] + max_w + sep_w) - 1
+        end = min(n, max(end, start + 1))
+        while end > start + 1 and measure(start, end) > max_w:
+            end -= 1
+        while end < n and measure(start, end + 1) <= max_w:
+            end += 1
+        lines.append(join.join(tokens[start:end]))
+        start = end
+    return lines
+
+
+def wrap_chars(text: str, font, max_w: float) -> List[str]:
+    """Break anywhere (Hangul copy); spaces are kept as ordinary characters."""
+    return _greedy(list(text), "", font, max_w)
+
+
+def wrap_words(text: str, font, max_w: float) -> List[str]:
+    """Break at whitespace only (runs of whitespace collapse to one space)."""
+    return _greedy(text.split(), " ", font, max_w)
+
+
+def wrap_text(text: str, font, max_w: float) -> List[str]:
+    """run_generate semantics: word wrap if the text has spaces, otherwise per character."""
+    text = (text or "").strip()
+    if not text:
+        return []
+    return wrap_words(text, font, max_w) if " " in text else wrap_chars(text, font, max_w)
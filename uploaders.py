@@ -1,5 +1,6 @@
 from __future__ import annotations
 from pathlib import Path
+import mimetypes
 import os
 
 def upload_file_s3(local_path: Path, bucket: str, key: str, public_url_base: str = "", presign_seconds: int = 604800) -> str:
@@ -11,7 +12,8 @@ def upload_file_s3(local_path: Path, bucket: str, key: str, public_url_base: str
     """
     import boto3
     s3 = boto3.client("s3")
-    s3.upload_file(str(local_path), bucket, key, ExtraArgs={"ContentType": "image/png"} if local_path.suffix.lower()==".png" else None)
+    ctype = mimetypes.guess_type(local_path.name)[0]  # .png / .webp / .jpg (--image_format)
+    s3.upload_file(str(local_path), bucket, key, ExtraArgs={"ContentType": ctype} if ctype else None)
     if public_url_base:
         base = public_url_base.rstrip("/") + "/"
         return base + key.lstrip("/")
@@ -36,7 +38,7 @@ def upload_file_gdrive_service_account(local_path: Path, folder_id: str, sa_json
     service = build("drive", "v3", credentials=creds)
 
     file_metadata = {"name": local_path.name, "parents": [folder_id]} if folder_id else {"name": local_path.name}
-    media = MediaFileUpload(str(local_path), mimetype="image/png" if local_path.suffix.lower()==".png" else None, resumable=True)
+    media = MediaFileUpload(str(local_path), mimetype=mimetypes.guess_type(local_path.name)[0], resumable=True)
     created = service.files().create(body=file_metadata, media_body=media, fields="id,webViewLink").execute()
     file_id = created["id"]
 
@@ -3,15 +3,24 @@
 """
 Alloki & Dalloki USER Edition
 GUI: streamlit run ui_streamlit.py
-CLI: python user_app.py generate_week --season spring --platforms instagram,tiktok --segments new,repeat
+CLI: python user_app.py generate_week --season spring --platforms instagram,tiktok --segments new,repeat --xlsx ./day_texts.xlsx
+- generate_week runs every platform x segment in this process, sharing one base-art folder:
+  art depends only on season/offer/card prompt, so it is generated once and only the
+  platform/segment overlays (QR/UTM, CTA copy, stories) are rendered per pair.
+  --subprocess restores one run_generate_user.py process per pair.
+- Only flags run_generate.py (or the run_generate_user.py wrapper) parses are forwarded; paths are
+  made absolute because the generator runs with cwd=ROOT.
 """
 from __future__ import annotations
 import argparse
+import os
 import subprocess
 import sys
 from pathlib import Path
 from typing import List
 
+from run_generate_user import run_inprocess
+
 ROOT = Path(__file__).resolve().parent
 
 def _run(cmd: List[str]) -> int:
@@ -21,10 +30,12 @@ def _run(cmd: List[str]) -> int:
 def cmd_generate_week(args) -> int:
     platforms = [p.strip() for p in args.platforms.split(",") if p.strip()]
     segments  = [s.strip() for s in args.segments.split(",") if s.strip()]
-    out_root = Path(args.out_dir)
+    out_root = Path(args.out_dir).resolve()
     out_root.mkdir(parents=True, exist_ok=True)
 
     forward = args.forward_args or []
+    # build_prompt() ignores platform/segment: one base-art folder for the whole grid
+    shared_base = out_root / f"{args.season}" / "base_art"
     rc = 0
     for plat in platforms:
         for seg in segments:
@@ -37,15 +48,18 @@ def cmd_generate_week(args) -> int:
                 "--platform", plat,
                 "--segment", seg,
                 "--days", str(args.days),
-                "--format", args.format,
                 "--mode", args.mode,
                 "--offer_code", args.offer_code,
-                "--assets_dir", str(Path(args.assets_dir)),
+                "--xlsx", str(Path(args.xlsx).resolve()),
+                "--assets_dir", str(Path(args.assets_dir).resolve()),
+                "--out_dir", str(out_dir),
+                "--base_dir", str(shared_base),
                 "--message_out", str(out_dir/"message_payload.json"),
-                "--log_xlsx", str(Path(args.log_xlsx)),
-                "--platform_ev_config", str(Path(args.platform_ev_config)),
+                "--log_xlsx", str(Path(args.log_xlsx).resolve()),
                 "--user_edit", "1",
             ]
+            if args.format in ("story", "both"):
+                cmd += ["--export_story"]
 
             if not args.no_zip:
                 cmd += ["--zip_out", str(out_dir/"package.zip")]
@@ -56,7 +70,7 @@ def cmd_generate_week(args) -> int:
 
             cmd += forward
             print("\n[RUN]", " ".join(cmd))
-            rc = _run(cmd)
+            rc = _run(cmd) if args.subprocess else run_inprocess(cmd[2:])
             if rc != 0:
                 return rc
     return 0
@@ -71,15 +85,16 @@ def build_parser() -> argparse.ArgumentParser:
     g.add_argument("--segments", default="new,repeat")
     g.add_argument("--days", type=int, default=7)
     g.add_argument("--offer_code", default="D7")
-    g.add_argument("--format", default="both", help="square|story|both")
-    g.add_argument("--mode", default="paid", help="paid/free-lock etc (depends on generator)")
+    g.add_argument("--format", choices=["square", "story", "both"], default="both", help="story/both add the 9:16 story cuts")
+    g.add_argument("--mode", choices=["paid", "free"], default="paid")
+    g.add_argument("--xlsx", default=os.environ.get("CARDS_XLSX", "./day_texts.xlsx"), help="Cards workbook (DAYxx copy)")
     g.add_argument("--assets_dir", default="./user_assets", help="where user puts PNGs/backgrounds")
     g.add_argument("--out_dir", default="./out_user")
     g.add_argument("--log_xlsx", default="./performance_log.xlsx")
-    g.add_argument("--platform_ev_config", default="./platform_ev_config.json")
     g.add_argument("--no_zip", action="store_true")
     g.add_argument("--preview_html", action="store_true")
     g.add_argument("--dry_run", action="store_true")
+    g.add_argument("--subprocess", action="store_true", help="one generator process per platform x segment (old behaviour)")
     g.add_argument("forward_args", nargs=argparse.REMAINDER, help="extra args forwarded to generator")
     g.set_defaults(func=cmd_generate_week)
 
@@ -0,0 +1,225 @@
+"""
+worker_pool.py
+- Long-lived, pre-warmed render worker processes for server_v22.py bonus jobs.
+- Every bonus card used to pay start-up cost on the buyer's critical path: importing the
+  generator, loading overlay presets and font files, building the first QR tile and opening a
+  fresh TLS connection to the Images API. Pool processes do that once in warm() when the
+  server starts and then take jobs from the executor's queue.
+- Each job runs alone in its process, so run_generate's process-wide export codec / stage
+  timer are never shared by two concurrent bonus runs.
+- run(fn, *args) blocks the calling thread (a job_queue worker) until fn returns in a pool
+  process; fn and warm must be module-level functions of an importable module (they are
+  pickled by reference and the workers import it; a script's __main__ is re-imported under
+  its guard, so module level must not start the server).
+- Workers start with the forkserver method (spawn where it is missing), never a plain fork:
+  the server is multi-threaded by the time a crashed pool is rebuilt, and forking a process
+  with running threads can copy a held lock into the child.
+- A crashed worker (BrokenProcessPool) fails only its job; the pool is rebuilt and warmed again.
+- start() never raises: if warm() fails in a worker (or inline), the pool is torn down, the error
+  goes to stats() and the next warm-up waits BONUS_POOL_RETRY_S, doubling per failure up to
+  BONUS_POOL_RETRY_MAX_S. Jobs submitted meanwhile fail fast with RuntimeError (job_queue retries
+  them); they are not rendered inline, which would share run_generate's process-wide state.
+- stats(): pool size, queue depth, running, done/failed, warm-up time and per-job latency
+  (queue wait + run) percentiles over the last BONUS_POOL_LATENCY_WINDOW jobs.
+- workers=0 runs jobs inline in the calling thread (development, no worker processes).
+
+env
+- BONUS_POOL_WORKERS         (default 2)
+- BONUS_POOL_LATENCY_WINDOW  (default 500)
+- BONUS_POOL_START_METHOD    (default forkserver, or spawn where forkserver is unavailable)
+- BONUS_POOL_RETRY_S         (default 5)   first back-off after a failed warm-up
+- BONUS_POOL_RETRY_MAX_S     (default 300)
+"""
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+BONUS_POOL_WORKERS = int(os.environ.get("BONUS_POOL_WORKERS", "2"))
+BONUS_POOL_LATENCY_WINDOW = int(os.environ.get("BONUS_POOL_LATENCY_WINDOW", "500"))
+BONUS_POOL_START_METHOD = os.environ.get("BONUS_POOL_START_METHOD") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+BONUS_POOL_RETRY_S = float(os.environ.get("BONUS_POOL_RETRY_S", "5"))
+BONUS_POOL_RETRY_MAX_S = float(os.environ.get("BONUS_POOL_RETRY_MAX_S", "300"))
+
+_WARM: Dict[str, Any] = {}  # per process: what warm() reported
+
+
+def _pct(xs: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return xs[max(0, math.ceil(p / 100.0 * len(xs)) - 1)]
+
+
+def _init(warm: Optional[Callable[..., Dict[str, Any]]], warm_args: Tuple[Any, ...]) -> None:
+    t0 = time.perf_counter()
+    info = warm(*warm_args) if warm else {}
+    _WARM.update(info or {}, pid=os.getpid(), warm_s=round(time.perf_counter() - t0, 3))
+
+
+def _ping() -> Dict[str, Any]:
+    time.sleep(0.05)  # hold this worker so the other pings go to the others
+    return dict(_WARM)
+
+
+def _call(fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[float, Any]:
+    started = time.time()  # wall clock: comparable with the parent's submit time
+    return started, fn(*args, **kwargs)
+
+
+class WorkerPool:
+    def __init__(self, warm: Optional[Callable[..., Dict[str, Any]]] = None, warm_args: Tuple[Any, ...] = (),
+                 workers: int = BONUS_POOL_WORKERS, window: int = BONUS_POOL_LATENCY_WINDOW,
+                 start_method: str = BONUS_POOL_START_METHOD):
+        """warm(*warm_args) runs once in every worker process; returns a small JSON-able report."""
+        self.warm = warm
+        self.start_method = start_method
+        self.warm_args = tuple(warm_args)
+        self.workers = max(0, int(workers))
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.warm_info: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._done = 0
+        self._failed = 0
+        self._restarts = 0
+        self._warm_failures = 0
+        self._warm_streak = 0  # consecutive failed warm-ups, drives the back-off
+        self._warm_error = ""
+        self._retry_at = 0.0
+        self._latency: Deque[Tuple[float, float]] = deque(maxlen=max(1, int(window)))  # (wait_s, run_s)
+
+    def start(self) -> bool:
+        """
+        Start and warm every worker now (idempotent); safe from any thread, the workers are
+        not forked from this process. Returns False while warm-up is failing (see stats()).
+        """
+        with self._lock:
+            if self.pool is not None:
+                return True
+            if self.workers == 0 and self.warm_info:
+                return True
+            if time.monotonic() < self._retry_at:
+                return False
+            if self.workers == 0:
+                try:
+                    _init(self.warm, self.warm_args)
+                except Exception as e:
+                    self._warm_failed(e)
+                    return False
+                self.warm_info = [_ping()]
+                self._warm_streak = 0
+                return True
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method),
+                                            initializer=_init, initargs=(self.warm, self.warm_args))
+            pool = self.pool
+        # the executor launches workers on the first submits and each runs _init before taking a job;
+        # waiting until every worker answered a ping means the pool is warm before the first real job
+        # (a worker that warmed up first may take several pings while the others still start)
+        seen: Dict[int, Dict[str, Any]] = {}
+        deadline = time.monotonic() + 600
+        try:
+            while len(seen) < self.workers and time.monotonic() < deadline:
+                for f in [pool.submit(_ping) for _ in range(self.workers)]:
+                    w = f.result()
+                    seen[w["pid"]] = w
+        except Exception as e:  # BrokenProcessPool: warm() raised (or a worker died) in _init
+            with self._lock:
+                if self.pool is pool:
+                    self.pool = None
+                self._warm_failed(e)
+            pool.shutdown(wait=False, cancel_futures=True)
+            return False
+        with self._lock:
+            self.warm_info = list(seen.values())
+            self._warm_streak = 0
+        return True
+
+    def _warm_failed(self, e: BaseException) -> None:
+        """Record a failed warm-up and schedule the next attempt; caller holds self._lock."""
+        self._warm_failures += 1
+        self._warm_streak += 1
+        self._warm_error = f"{type(e).__name__}: {e}"
+        self._retry_at = time.monotonic() + min(BONUS_POOL_RETRY_MAX_S, BONUS_POOL_RETRY_S * 2 ** (self._warm_streak - 1))
+
+    def stop(self) -> None:
+        with self._lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        ready = self.start()
+        submitted = time.time()
+        with self._lock:
+            self._in_flight += 1
+            pool = self.pool
+            warm_error = self._warm_error
+        ok = False
+        try:
+            if not ready:
+                raise RuntimeError(f"render workers not available, warm-up failed: {warm_error}")
+            if pool is None:
+                started, result = _call(fn, args, kwargs)
+            else:
+                try:
+                    started, result = pool.submit(_call, fn, args, kwargs).result()
+                except BrokenProcessPool as e:
+                    self._rebuild(pool)
+                    raise RuntimeError(f"render worker died: {e}") from e
+            ok = True
+        finally:
+            finished = time.time()
+            with self._lock:
+                self._in_flight -= 1
+                if ok:
+                    self._done += 1
+                    self._latency.append((max(0.0, started - submitted), finished - started))
+                else:
+                    self._failed += 1
+        return result
+
+    def _rebuild(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self.pool is not broken:
+                return  # another job already rebuilt it
+            self.pool = None
+            self._restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight, lat = self._in_flight, list(self._latency)
+            out: Dict[str, Any] = {
+                "workers": self.workers,
+                "started": self.pool is not None or (self.workers == 0 and bool(self.warm_info)),
+                # jobs beyond the pool size wait in the executor queue (inline: never queued)
+                "queued": max(0, in_flight - self.workers) if self.workers else 0,
+                "running": min(in_flight, self.workers) if self.workers else in_flight,
+                "done": self._done,
+                "failed": self._failed,
+                "restarts": self._restarts,
+                "warm_s": [w.get("warm_s") for w in self.warm_info],
+                "warm_failures": self._warm_failures,
+            }
+            if self._warm_streak:
+                out["warm_error"] = self._warm_error
+                out["warm_retry_in_s"] = round(max(0.0, self._retry_at - time.monotonic()), 1)
+        if lat:
+            waits = sorted(w for w, _ in lat)
+            totals = sorted(w + r for w, r in lat)
+            out["latency"] = {
+                "jobs": len(lat),
+                "p50_ms": round(_pct(totals, 50) * 1000, 1),
+                "p95_ms": round(_pct(totals, 95) * 1000, 1),
+                "max_ms": round(totals[-1] * 1000, 1),
+                "wait_p50_ms": round(_pct(waits, 50) * 1000, 1),
+                "wait_p95_ms": round(_pct(waits, 95) * 1000, 1),
+            }
+        return out